@@ -0,0 +1,32 @@
+"""
+Benchmarks for the Effect library.
+
+Each module in this package can be run as a script, e.g.::
+
+    python -m benchmarks.bench_loop
+
+and prints one line per measurement.
+"""
+
+from __future__ import print_function
+
+import time
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def best_of(func, repeat=5):
+    """Call func ``repeat`` times and return the fastest run, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = _clock()
+        func()
+        timings.append(_clock() - start)
+    return min(timings)
+
+
+def report(name, seconds, count):
+    """Print a timing for ``count`` operations taking ``seconds``."""
+    print("%-50s %10.1f us/op %12.0f ops/s"
+          % (name, seconds / count * 1e6, count / seconds))
@@ -0,0 +1,81 @@
+"""
+Per-intent cost of combining dispatchers with a
+:class:`effect.compose.ComposedDispatcher`, compared to trying each
+dispatcher in turn and catching :class:`effect.NoEffectHandlerError` from the
+ones that don't handle the intent.
+
+    python -m benchmarks.bench_compose
+"""
+
+from __future__ import print_function
+
+from effect import Effect, NoEffectHandlerError, sync_perform
+from effect.compose import ComposedDispatcher, TypeDispatcher
+
+from . import best_of, report
+
+
+COUNT = 20000
+MISSES = [0, 1, 4]
+
+
+class Work(object):
+    """The intent being performed."""
+
+
+class Other(object):
+    """An intent type handled by the dispatchers that miss."""
+
+
+def _performed(dispatcher, intent, box):
+    box.succeed(None)
+
+
+def raising_dispatcher(handled):
+    """A dispatcher function which raises NoEffectHandlerError on a miss."""
+    def dispatcher(intent, box):
+        if type(intent) is not handled:
+            raise NoEffectHandlerError(intent)
+        box.succeed(None)
+    return dispatcher
+
+
+def fallthrough(dispatchers):
+    """Try each dispatcher in turn, as code without ComposedDispatcher did."""
+    def dispatcher(intent, box):
+        for d in dispatchers:
+            try:
+                d(intent, box)
+            except NoEffectHandlerError:
+                continue
+            return
+        box.fail((NoEffectHandlerError, NoEffectHandlerError(intent), None))
+    return dispatcher
+
+
+def chain():
+    """An effect which performs COUNT intents one after another."""
+    def step(n):
+        if n == COUNT:
+            return n
+        return Effect(Work()).on(success=lambda _: step(n + 1))
+    return Effect(Work()).on(success=lambda _: step(1))
+
+
+def main():
+    for misses in MISSES:
+        raising = [raising_dispatcher(Other) for _ in range(misses)]
+        raising.append(raising_dispatcher(Work))
+        raising = fallthrough(raising)
+        composed = [TypeDispatcher({Other: _performed})
+                    for _ in range(misses)]
+        composed.append(TypeDispatcher({Work: _performed}))
+        composed = ComposedDispatcher(composed)
+        report("exception fallthrough, %d misses" % (misses,),
+               best_of(lambda: sync_perform(chain(), raising)), COUNT)
+        report("ComposedDispatcher, %d misses" % (misses,),
+               best_of(lambda: sync_perform(chain(), composed)), COUNT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Cost of a 1000-step workflow written with :func:`effect.do.do` compared to
+the equivalent hand-written chain of ``.on`` callbacks returning Effects.
+
+    python -m benchmarks.bench_do
+"""
+
+from __future__ import print_function
+
+from effect import Effect, ConstantIntent, sync_perform
+from effect.do import do, do_return
+
+from . import best_of, report
+
+
+STEPS = 1000
+
+
+@do
+def do_workflow():
+    total = 0
+    for i in range(STEPS):
+        total += yield Effect(ConstantIntent(i))
+    yield do_return(total)
+
+
+def on_workflow(i=0, total=0):
+    if i == STEPS:
+        return total
+    return Effect(ConstantIntent(i)).on(
+        success=lambda r: on_workflow(i + 1, total + r))
+
+
+def main():
+    assert sync_perform(do_workflow()) == sync_perform(
+        Effect(ConstantIntent(None)).on(success=lambda r: on_workflow()))
+    report("@do: %d steps" % (STEPS,),
+           best_of(lambda: sync_perform(do_workflow())), STEPS)
+    report(".on chain: %d steps" % (STEPS,),
+           best_of(lambda: sync_perform(Effect(ConstantIntent(None)).on(
+               success=lambda r: on_workflow()))),
+           STEPS)
+
+
+if __name__ == '__main__':
+    main()
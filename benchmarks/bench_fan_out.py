@@ -0,0 +1,81 @@
+"""
+Memory and time used to perform parallel effects with very many children
+under :mod:`effect.twisted`: the compact fan-out used by
+:class:`effect.twisted.TwistedDispatcher`, compared to
+:func:`effect.twisted.perform_parallel`, which wraps each child in its own
+Deferred and gathers them with ``gatherResults``.
+
+Each child's intent results in a Deferred which is only fired once every
+child has been started, so all of the children are in flight at once. The
+peak memory allocated while performing the parallel effect is measured with
+:mod:`tracemalloc`, not counting the children's Effects and intents, or the
+Deferreds their performers return.
+
+    python -m benchmarks.bench_fan_out
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import tracemalloc
+
+from twisted.internet.defer import Deferred
+
+from effect import Effect, ParallelEffects, parallel
+from effect.twisted import TwistedDispatcher, perform, perform_parallel
+
+from . import _clock
+
+
+SIZES = [10000, 100000, 1000000]
+
+
+class Pending(object):
+    """An intent whose performer returns an existing Deferred."""
+
+    def __init__(self, deferred):
+        self.deferred = deferred
+
+    def perform_effect(self, dispatcher):
+        return self.deferred
+
+
+def gather_results(dispatcher, intent):
+    return perform_parallel(intent, dispatcher.reactor)
+
+
+def measure(children, dispatcher):
+    deferreds = [Deferred() for _ in range(children)]
+    eff = parallel([Effect(Pending(d)) for d in deferreds])
+    results = []
+    gc.collect()
+    tracemalloc.start()
+    start = _clock()
+    perform(None, eff, dispatcher=dispatcher).addCallback(results.append)
+    for d in deferreds:
+        d.callback(None)
+    elapsed = _clock() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(results[0]) == children
+    return peak, elapsed
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    sizes = [int(arg) for arg in argv] or SIZES
+    for children in sizes:
+        for name, dispatcher in [
+                ('gatherResults', TwistedDispatcher(
+                    None, {ParallelEffects: gather_results})),
+                ('fan-out', TwistedDispatcher(None))]:
+            peak, elapsed = measure(children, dispatcher)
+            print("%-30s %10.0f KiB %8.0f B/child %8.1f us/child"
+                  % ("%s: %d children" % (name, children), peak / 1024.0,
+                     float(peak) / children, elapsed / children * 1e6))
+
+
+if __name__ == '__main__':
+    main()
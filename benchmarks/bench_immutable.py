@@ -0,0 +1,89 @@
+"""
+Hashing, comparing and storing intents made with
+:func:`effect.immutable.immutable`, compared to ``characteristic.attributes``.
+
+    python -m benchmarks.bench_immutable
+"""
+
+from __future__ import print_function
+
+import tracemalloc
+
+from characteristic import attributes
+
+from effect.immutable import immutable
+
+from . import best_of, report
+
+
+COUNT = 100000
+URL = 'http://example.com/api/v1/items'
+
+
+@attributes(['method', 'url', 'headers'], apply_with_init=False)
+class Characteristic(object):
+    def __init__(self, method, url, headers):
+        self.method = method
+        self.url = url
+        self.headers = headers
+
+
+@immutable(['method', 'url', 'headers'])
+class Immutable(object):
+    pass
+
+
+@immutable(['method', 'url', 'headers'], intern=True)
+class Interned(object):
+    pass
+
+
+def make(cls):
+    return [cls('GET', URL, (('Accept', 'application/json'),))
+            for _ in range(COUNT)]
+
+
+def hashing(intents):
+    for intent in intents:
+        hash(intent)
+
+
+def comparing(intents):
+    first = intents[0]
+    for intent in intents:
+        first == intent
+
+
+def lookup(intents):
+    cache = {intents[0]: 'cached'}
+    for intent in intents:
+        cache[intent]
+
+
+def memory(cls):
+    tracemalloc.start()
+    intents = make(cls)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del intents
+    return size
+
+
+def main():
+    for cls in [Characteristic, Immutable, Interned]:
+        name = cls.__name__
+        report("%s: construct" % (name,), best_of(lambda: make(cls)), COUNT)
+        intents = make(cls)
+        report("%s: hash" % (name,), best_of(lambda: hashing(intents)),
+               COUNT)
+        report("%s: compare equal" % (name,),
+               best_of(lambda: comparing(intents)), COUNT)
+        report("%s: dict lookup" % (name,), best_of(lambda: lookup(intents)),
+               COUNT)
+        print("%-50s %10.0f B/intent"
+              % ("%s: memory, %d identical" % (name, COUNT),
+                 memory(cls) / COUNT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+How long importing the core and each integration takes, as reported by
+``python -X importtime`` in a fresh interpreter, so that short-lived
+processes which only use :func:`effect.sync_perform` don't pay for modules
+they never use.
+
+The cumulative time of each module's import is the best of several fresh
+interpreters, and includes everything it imports that wasn't already
+imported by the interpreter itself.
+
+    python -m benchmarks.bench_import [module ...]
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+
+MODULES = ['effect', 'effect.fan_out', 'effect.do', 'effect.testing',
+           'effect.twisted']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module):
+    """
+    Import a module in a fresh interpreter, and return the cumulative
+    import time of the module, in seconds, and the names of the modules
+    its import loaded.
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=ROOT, stderr=subprocess.STDOUT, universal_newlines=True)
+    loaded = []
+    cumulative = None
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, total, name = line[len('import time:'):].split('|')
+        if not total.strip().isdigit():
+            # The header.
+            continue
+        name = name.strip()
+        loaded.append(name)
+        if name == module:
+            cumulative = int(total) / 1e6
+    return cumulative, loaded
+
+
+def main(modules):
+    for module in modules:
+        results = [import_time(module) for _ in range(5)]
+        seconds = min(seconds for seconds, _ in results)
+        loaded = results[0][1]
+        third_party = sorted(
+            set(name.split('.')[0] for name in loaded) & set(
+                ['six', 'characteristic', 'twisted', 'zope']))
+        print("%-50s %10.1f ms %6d modules  %s"
+              % ("import " + module, seconds * 1e3, len(loaded),
+                 ", ".join(third_party)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or MODULES)
@@ -0,0 +1,73 @@
+"""
+Throughput of :mod:`effect.loop` compared to :mod:`effect.twisted`, for many
+concurrent effect trees that each sleep, fan out, and run a few callbacks.
+
+    python -m benchmarks.bench_loop
+"""
+
+from __future__ import print_function
+
+from effect import Effect, ConstantIntent, Delay, parallel
+from effect import loop as effect_loop
+
+from . import _clock, best_of, report
+
+
+TREES = 2000
+FAN_OUT = 4
+REPEAT = 5
+
+
+def tree():
+    children = [Effect(ConstantIntent(j)).on(success=lambda r: r + 1)
+                for j in range(FAN_OUT)]
+    return Effect(Delay(0)).on(success=lambda r: parallel(children)).on(
+        success=sum)
+
+
+def run_loop():
+    loop = effect_loop.EventLoop()
+    for i in range(TREES):
+        effect_loop.perform(loop, tree())
+    loop.run()
+
+
+def bench_twisted():
+    """
+    Time the same workload under effect.twisted with the global reactor.
+    The reactor can't be restarted, so all repetitions happen in one run.
+    """
+    from twisted.internet.defer import gatherResults, inlineCallbacks
+    from twisted.internet.task import react
+    from effect.twisted import perform
+
+    timings = []
+
+    @inlineCallbacks
+    def go(reactor):
+        for _ in range(REPEAT):
+            start = _clock()
+            yield gatherResults([perform(reactor, tree())
+                                 for i in range(TREES)])
+            timings.append(_clock() - start)
+
+    try:
+        react(go, [])
+    except SystemExit:
+        pass
+    return min(timings)
+
+
+def main():
+    report("effect.loop: %d trees" % (TREES,),
+           best_of(run_loop, REPEAT), TREES)
+    try:
+        import twisted  # noqa
+    except ImportError:
+        print("Twisted is not installed; skipping effect.twisted.")
+        return
+    report("effect.twisted: %d trees" % (TREES,), bench_twisted(), TREES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Overhead of recording intents with :class:`effect.record.RecordingDispatcher`,
+and throughput of replaying them with :class:`effect.record.ReplayDispatcher`.
+
+    python -m benchmarks.bench_record
+"""
+
+from __future__ import print_function
+
+import os
+import tempfile
+
+from effect import Effect, ConstantIntent, default_dispatcher, sync_perform
+from effect.record import RecordingDispatcher, ReplayDispatcher
+
+from . import best_of, report
+
+
+INTENTS = 10000
+
+
+def perform_all(dispatcher):
+    for i in range(INTENTS):
+        sync_perform(Effect(ConstantIntent(i)), dispatcher)
+
+
+def main():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        report("default_dispatcher", best_of(
+            lambda: perform_all(default_dispatcher)), INTENTS)
+
+        def record():
+            with open(path, 'wb') as log_file:
+                perform_all(RecordingDispatcher(log_file, default_dispatcher))
+        report("RecordingDispatcher", best_of(record), INTENTS)
+        print("log size: %d bytes for %d intents"
+              % (os.path.getsize(path), INTENTS))
+
+        def replay():
+            dispatcher = ReplayDispatcher(path)
+            perform_all(dispatcher)
+            dispatcher.close()
+        report("ReplayDispatcher (including indexing)", best_of(replay),
+               INTENTS)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
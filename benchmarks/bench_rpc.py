@@ -0,0 +1,81 @@
+"""
+Throughput of :class:`effect.rpc.RPCDispatcher`, pipelining requests over a
+pool of persistent connections, compared to opening a new connection to the
+worker for every intent.
+
+    python -m benchmarks.bench_rpc
+"""
+
+from __future__ import print_function
+
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from functools import partial
+
+from effect import Effect, ConstantIntent, ParallelEffects, parallel
+from effect.loop import EventLoop, perform_parallel, run
+from effect.rpc import RPCDispatcher, _FRAME, _frames, _make_socket
+
+from . import best_of, report
+
+
+INTENTS = 5000
+
+
+def one_connection_per_intent(address, intent, box):
+    """Send one intent to the worker on a new connection, and wait for it."""
+    sock = _make_socket(address)
+    sock.connect(address)
+    try:
+        payload = pickle.dumps(intent, pickle.HIGHEST_PROTOCOL)
+        sock.sendall(_FRAME.pack(1, False, len(payload)) + payload)
+        buffer = bytearray()
+        while True:
+            buffer += sock.recv(65536)
+            for _, is_error, payload in _frames(buffer):
+                box.succeed(pickle.loads(payload))
+                return
+    finally:
+        sock.close()
+
+
+def run_all(rpc, loop=None):
+    def dispatcher(loop, intent, box):
+        if type(intent) is ParallelEffects:
+            perform_parallel(intent, partial(dispatcher, loop), box)
+        else:
+            rpc(intent, box)
+    effects = [Effect(ConstantIntent(i)) for i in range(INTENTS)]
+    assert run(parallel(effects), dispatcher, loop) == list(range(INTENTS))
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    address = os.path.join(directory, 'worker.sock')
+    worker = subprocess.Popen([sys.executable, '-m', 'effect.rpc', address],
+                              stdout=subprocess.PIPE)
+    try:
+        worker.stdout.readline()
+        report("one connection per intent", best_of(
+            lambda: run_all(partial(one_connection_per_intent, address)),
+            repeat=3), INTENTS)
+        for connections in [1, 4]:
+            loop = EventLoop()
+            rpc = RPCDispatcher(loop, address, connections)
+            report("pipelined, %d connection(s)" % (connections,),
+                   best_of(lambda: run_all(rpc, loop), repeat=3), INTENTS)
+            rpc.close()
+    finally:
+        worker.kill()
+        worker.wait()
+        worker.stdout.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Overhead of recording runtime statistics with :mod:`effect.stats`, and of
+profiling callbacks with :mod:`effect.profiling`, for effects performed with
+:func:`effect.perform` and :func:`effect.sync_perform`.
+
+    python -m benchmarks.bench_stats
+"""
+
+from __future__ import print_function
+
+from effect import Effect, ConstantIntent, perform, sync_perform
+from effect.profiling import disable_profiling, enable_profiling
+from effect.stats import disable_stats, enable_stats
+
+from . import best_of, report
+
+
+COUNT = 20000
+
+
+def chain():
+    return Effect(ConstantIntent(1)).on(
+        success=lambda r: Effect(ConstantIntent(r + 1))).on(
+        success=lambda r: r * 2)
+
+
+def main():
+    effects = [chain() for _ in range(COUNT)]
+    for name, run in [('perform', lambda: [perform(e) for e in effects]),
+                      ('sync_perform',
+                       lambda: [sync_perform(e) for e in effects])]:
+        report("%s: stats disabled" % (name,), best_of(run), COUNT)
+        enable_stats()
+        try:
+            report("%s: stats enabled" % (name,), best_of(run), COUNT)
+        finally:
+            disable_stats()
+        enable_profiling()
+        try:
+            report("%s: callback profiling enabled" % (name,), best_of(run),
+                   COUNT)
+        finally:
+            disable_profiling()
+
+
+if __name__ == '__main__':
+    main()
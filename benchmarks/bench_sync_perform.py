@@ -0,0 +1,52 @@
+"""
+Cost of :func:`effect.sync_perform`'s synchronous loop compared to running
+the same effects through the general, trampolined :func:`effect.perform`.
+
+    python -m benchmarks.bench_sync_perform
+"""
+
+from __future__ import print_function
+
+from effect import Effect, ConstantIntent, perform, sync_perform
+
+from . import best_of, report
+
+
+COUNT = 20000
+
+
+def general_sync_perform(effect):
+    """What sync_perform used to do: perform, and collect the result."""
+    results = []
+    perform(effect.on(success=results.append))
+    return results[0]
+
+
+def single():
+    return Effect(ConstantIntent(1))
+
+
+def with_callbacks():
+    return Effect(ConstantIntent(1)).on(success=lambda r: r + 1).on(
+        success=lambda r: r * 2)
+
+
+def nested():
+    return Effect(ConstantIntent(1)).on(
+        success=lambda r: Effect(ConstantIntent(r + 1)))
+
+
+def main():
+    for name, make in [('single intent', single),
+                       ('two callbacks', with_callbacks),
+                       ('callback returning an effect', nested)]:
+        effects = [make() for _ in range(COUNT)]
+        report("sync_perform: %s" % (name,),
+               best_of(lambda: [sync_perform(e) for e in effects]), COUNT)
+        report("general interpreter: %s" % (name,),
+               best_of(lambda: [general_sync_perform(e) for e in effects]),
+               COUNT)
+
+
+if __name__ == '__main__':
+    main()
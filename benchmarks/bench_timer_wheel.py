@@ -0,0 +1,94 @@
+"""
+Performing many :obj:`effect.Delay` intents with a
+:class:`effect.timer_wheel.TimerWheel`, compared to a ``deferLater`` (and so
+a reactor DelayedCall) per delay, with the real reactor.
+
+Scheduling and cancelling are timed with delays spread over a minute, so
+that the timers are all pending at once. Firing is timed with delays spread
+over a fifth of a second, counting only the CPU time spent, not the time
+spent waiting for the timers to come due.
+
+    python -m benchmarks.bench_timer_wheel [count ...]
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import time
+import tracemalloc
+
+from twisted.internet import reactor
+from twisted.internet.task import deferLater
+
+from effect import Delay
+from effect.timer_wheel import TimerWheel
+
+from . import _clock, report
+
+
+COUNTS = [10000, 100000]
+
+
+def defer_later(delay):
+    return deferLater(reactor, delay.delay, lambda: None)
+
+
+def schedule(perform_delay, delays):
+    start = _clock()
+    deferreds = [perform_delay(Delay(d)) for d in delays]
+    return deferreds, _clock() - start
+
+
+def cancel(deferreds):
+    start = _clock()
+    for d in deferreds:
+        d.addErrback(lambda f: None)
+        d.cancel()
+    return _clock() - start
+
+
+def fire(perform_delay, delays):
+    fired = []
+    for d in delays:
+        perform_delay(Delay(d)).addCallback(fired.append)
+    start = time.process_time()
+    while len(fired) < len(delays):
+        reactor.iterate(reactor.timeout() or 0)
+    return time.process_time() - start
+
+
+def memory(perform_delay, delays):
+    tracemalloc.start()
+    deferreds, _ = schedule(perform_delay, delays)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    cancel(deferreds)
+    return size
+
+
+def main(counts):
+    for count in counts:
+        rng = random.Random(count)
+        long_delays = [rng.uniform(1, 60) for _ in range(count)]
+        short_delays = [rng.uniform(0, 0.2) for _ in range(count)]
+        wheel = TimerWheel(reactor, resolution=0.01)
+        for name, perform_delay in [
+                ('deferLater', defer_later),
+                ('TimerWheel', lambda d: wheel.perform_delay(None, d))]:
+            deferreds, seconds = schedule(perform_delay, long_delays)
+            report("%s: schedule, %d pending" % (name, count),
+                   seconds, count)
+            report("%s: cancel, %d pending" % (name, count),
+                   cancel(deferreds), count)
+            report("%s: fire %d" % (name, count),
+                   fire(perform_delay, short_delays), count)
+            print("%-50s %10.0f B/delay"
+                  % ("%s: memory, %d pending" % (name, count),
+                     memory(perform_delay, long_delays) / count))
+        # Let the cancelled DelayedCalls and the wheel's wakeup go.
+        reactor.iterate(0)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or COUNTS)
@@ -0,0 +1,82 @@
+"""
+Memory kept alive by failed effects under each traceback policy in
+:mod:`effect.tracebacks`.
+
+A retry loop makes a number of attempts, each of which fails while a large
+local variable (standing in for a response body) is in scope, and its error
+handler keeps every error it sees. The memory still allocated once the loop
+has finished is measured with :mod:`tracemalloc`.
+
+    python -m benchmarks.bench_tracebacks
+"""
+
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+from effect import Effect, ConstantIntent, FuncIntent, sync_perform
+from effect.retry import retry
+from effect.tracebacks import (
+    clear_locals, full, set_traceback_policy, trimmed)
+
+
+ATTEMPTS = 100
+BODY_SIZE = 100000
+
+
+def parse(body):
+    check_header(body[:16])
+
+
+def check_header(header):
+    raise ValueError("Unexpected response: %r" % (header,))
+
+
+def attempt():
+    body = b'x' * BODY_SIZE
+    parse(body)
+
+
+def run():
+    errors = []
+
+    def should_retry(e):
+        errors.append(e)
+        return Effect(ConstantIntent(len(errors) < ATTEMPTS))
+
+    try:
+        sync_perform(retry(Effect(FuncIntent(attempt)), should_retry))
+    except ValueError:
+        pass
+    return errors
+
+
+def retained(policy):
+    old = set_traceback_policy(policy)
+    try:
+        gc.collect()
+        tracemalloc.start()
+        errors = run()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        set_traceback_policy(old)
+    assert len(errors) == ATTEMPTS
+    return size
+
+
+def main():
+    for name, policy in [('full', full),
+                         ('trimmed(1)', trimmed(1)),
+                         ('trimmed(0)', trimmed(0)),
+                         ('clear_locals', clear_locals)]:
+        size = retained(policy)
+        print("%-50s %10.1f KiB %8.1f KiB/error"
+              % ("%s: %d errors kept" % (name, ATTEMPTS),
+                 size / 1024.0, size / 1024.0 / ATTEMPTS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-intent overhead of :class:`effect.twisted.TwistedDispatcher` compared to
+the old dispatcher function, which built new partials for every intent and
+attached callbacks to every Deferred.
+
+    python -m benchmarks.bench_twisted_dispatch
+"""
+
+from __future__ import print_function
+
+import sys
+
+from functools import partial
+
+from twisted.internet.defer import Deferred, succeed
+
+from effect import (
+    Effect, ConstantIntent, Delay, ParallelEffects, dispatch_method)
+from effect.twisted import (
+    TwistedDispatcher, deferred_to_box, perform, perform_delay,
+    perform_parallel)
+
+from . import best_of, report
+
+
+COUNT = 20000
+
+
+def partial_dispatcher(reactor, intent, box):
+    """What twisted_dispatcher used to do for every intent."""
+    dispatcher = partial(partial_dispatcher, reactor)
+    if type(intent) is ParallelEffects:
+        func = partial(perform_parallel, intent, reactor)
+    elif type(intent) is Delay:
+        func = partial(perform_delay, intent, reactor)
+    else:
+        func = partial(dispatch_method, intent, dispatcher)
+
+    try:
+        result = func()
+    except:
+        box.fail(sys.exc_info())
+    else:
+        if isinstance(result, Deferred):
+            deferred_to_box(result, box)
+        else:
+            box.succeed(result)
+
+
+def chain(make_result):
+    """An effect which performs COUNT intents one after another."""
+    def step(n):
+        if n == COUNT:
+            return n
+        return Effect(ConstantIntent(make_result(n + 1))).on(success=step)
+    return Effect(ConstantIntent(make_result(0))).on(success=step)
+
+
+def run(effect, dispatcher):
+    results = []
+    perform(None, effect, dispatcher=dispatcher).addCallback(results.append)
+    assert results == [COUNT], results
+
+
+def main():
+    for name, make_result in [('plain results', lambda n: n),
+                              ('fired Deferreds', succeed)]:
+        report("partial per intent: %s" % (name,),
+               best_of(lambda: run(chain(make_result), partial_dispatcher)),
+               COUNT)
+        report("TwistedDispatcher: %s" % (name,),
+               best_of(lambda: run(chain(make_result),
+                                   TwistedDispatcher(None))),
+               COUNT)
+
+
+if __name__ == '__main__':
+    main()
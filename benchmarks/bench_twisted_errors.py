@@ -0,0 +1,67 @@
+"""
+Error-heavy workloads under :mod:`effect.twisted`, with and without the
+``lightweight_errors`` option of :class:`effect.twisted.TwistedDispatcher`:
+many effects failing one after another, an error handler that retries once
+and fails again, and parallel effects whose children all fail.
+
+    python -m benchmarks.bench_twisted_errors
+"""
+
+from __future__ import print_function
+
+from effect import Effect, parallel
+from effect.twisted import TwistedDispatcher, perform
+
+from . import best_of, report
+
+
+COUNT = 10000
+FAN_OUT = 10
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Shed(object):
+    """An intent which fails, like a request shed under load."""
+
+    def perform_effect(self, dispatcher):
+        raise Overloaded()
+
+
+def failing():
+    return Effect(Shed())
+
+
+def retried():
+    return Effect(Shed()).on(error=lambda e: Effect(Shed()))
+
+
+def fan_out():
+    return parallel([Effect(Shed()) for _ in range(FAN_OUT)])
+
+
+def run(make, dispatcher, count):
+    failures = []
+    for _ in range(count):
+        perform(None, make(), dispatcher=dispatcher).addErrback(
+            failures.append)
+    assert len(failures) == count
+
+
+def main():
+    for name, make, count in [('failing intent', failing, COUNT),
+                              ('retried once', retried, COUNT),
+                              ('parallel, all children failing', fan_out,
+                               COUNT // FAN_OUT)]:
+        for mode, lightweight in [('full errors', False),
+                                  ('lightweight errors', True)]:
+            dispatcher = TwistedDispatcher(None,
+                                           lightweight_errors=lightweight)
+            report("%s: %s" % (mode, name),
+                   best_of(lambda: run(make, dispatcher, count)), count)
+
+
+if __name__ == '__main__':
+    main()
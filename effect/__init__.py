@@ -14,15 +14,26 @@ TODO: integration with other asynchronous libraries like asyncio, trollius,
 from __future__ import print_function
 
 import sys
+import threading
 
-from characteristic import attributes
+from . import profiling, stats, tracebacks
+from ._attributes import attributes
+from .continuation import drain, isolate, restore, schedule
 
-import six
 
-from .continuation import trampoline
+if sys.version_info[0] >= 3:
+    def _reraise(exc_type, value, tb):
+        try:
+            raise value.with_traceback(tb)
+        finally:
+            # Don't keep the traceback alive through this frame.
+            value = tb = None
+else:
+    exec("def _reraise(exc_type, value, tb):\n"
+         "    raise exc_type, value, tb\n")
 
 
-@attributes(['intent', 'callbacks'], apply_with_init=False)
+@attributes(['intent', 'callbacks'])
 class Effect(object):
     """
     Wrap an object that describes how to perform some effect (called an
@@ -75,7 +86,7 @@ def default_dispatcher(intent, box):
     If the perform_effect method can't be found, raise NoEffectHandlerError.
 
     If you're using Twisted Deferreds, you should look at
-    :func:`effect.twisted.twisted_dispatcher`.
+    :class:`effect.twisted.TwistedDispatcher`.
     """
     try:
         box.succeed(dispatch_method(intent, default_dispatcher))
@@ -95,14 +106,48 @@ class _Box(object):
         """
         Indicate that the effect has succeeded, and the result is available.
         """
-        self._bouncer.bounce(self._more, (False, result))
+        # Let go of the rest of the callback chain, in case the dispatcher
+        # keeps the box.
+        more, self._more = self._more, None
+        self._bouncer.bounce(more, (False, result))
 
     def fail(self, result):
         """
         Indicate that the effect has failed to be met. result must be an
         exc_info tuple.
         """
-        self._bouncer.bounce(self._more, (True, result))
+        more, self._more = self._more, None
+        self._bouncer.bounce(more, (True, tracebacks.policy(result)))
+
+
+class _TrackedBox(_Box):
+    """
+    The box used while statistics are enabled, which records when the intent
+    it was made for is finished.
+    """
+    waiting = False
+    done = False
+
+    def __init__(self, bouncer, more, runtime, intent_type):
+        self._bouncer = bouncer
+        self._more = more
+        self._runtime = runtime
+        self._intent_type = intent_type
+
+    def succeed(self, result):
+        self._finished()
+        _Box.succeed(self, result)
+
+    def fail(self, result):
+        self._finished()
+        _Box.fail(self, result)
+
+    def _finished(self):
+        if not self.done:
+            self.done = True
+            self._runtime.intent_finished(self._intent_type)
+            if self.waiting:
+                self._runtime.waiting -= 1
 
 
 def perform(effect, dispatcher=default_dispatcher):
@@ -114,36 +159,61 @@ def perform(effect, dispatcher=default_dispatcher):
     is an object that lets the dispatcher specify the result (optionally
     asynchronously). See :func:`_Box.succeed` and :func:`_Box.fail`.
 
+    If this is called while a trampoline is already running in this thread
+    (for example, from a performer that runs child effects), the effect is
+    queued on that trampoline instead of starting a new one, so that nesting
+    doesn't grow the stack. See :func:`effect.continuation.schedule`.
+
     Note that this function does _not_ return the final result of the effect.
     You may instead want to use :func:`sync_perform` or
     :func:`effect.twisted.perform`.
 
     :returns: None
     """
-
-    def _run_callbacks(bouncer, chain, result):
-        is_error, value = result
-        if type(value) is Effect:
-            bouncer.bounce(
-                _perform,
-                Effect(value.intent, callbacks=value.callbacks + chain))
-            return
-        if not chain:
-            return
-        cb = chain[0][is_error]
-        if cb is not None:
-            result = guard(cb, value)
-        chain = chain[1:]
-        bouncer.bounce(_run_callbacks, chain, result)
-
-    def _perform(bouncer, effect):
-        dispatcher(
-            effect.intent,
-            _Box(bouncer,
-                 lambda bouncer, result:
-                     _run_callbacks(bouncer, effect.callbacks, result)))
-
-    trampoline(_perform, effect)
+    runtime = stats.current
+    if runtime is not None:
+        runtime.effects_started += 1
+    schedule(_perform, effect, dispatcher)
+
+
+def _run_callbacks(bouncer, chain, result, dispatcher):
+    is_error, value = result
+    if type(value) is Effect:
+        bouncer.bounce(
+            _perform,
+            Effect(value.intent, callbacks=value.callbacks + chain),
+            dispatcher)
+        return
+    if not chain:
+        runtime = stats.current
+        if runtime is not None:
+            runtime.effects_completed += 1
+            runtime.effects_failed += is_error
+        return
+    cb = chain[0][is_error]
+    if cb is not None:
+        result = guard(cb, value)
+    chain = chain[1:]
+    bouncer.bounce(_run_callbacks, chain, result, dispatcher)
+
+
+def _perform(bouncer, effect, dispatcher):
+    callbacks = effect.callbacks
+
+    def more(bouncer, result):
+        _run_callbacks(bouncer, callbacks, result, dispatcher)
+
+    runtime = stats.current
+    if runtime is None:
+        dispatcher(effect.intent, _Box(bouncer, more))
+        return
+    intent_type = type(effect.intent)
+    runtime.intent_started(intent_type)
+    box = _TrackedBox(bouncer, more, runtime, intent_type)
+    dispatcher(effect.intent, box)
+    if not box.done:
+        box.waiting = True
+        runtime.waiting += 1
 
 
 def guard(f, *args, **kwargs):
@@ -151,12 +221,19 @@ def guard(f, *args, **kwargs):
     Run a function.
 
     Return (is_error, result), where is_error is a boolean indicating whether
-    it raised an exception. In that case result will be sys.exc_info().
+    it raised an exception. In that case result will be sys.exc_info(), with
+    the traceback policy applied (see :mod:`effect.tracebacks`).
+
+    While callback profiling is enabled (see :mod:`effect.profiling`), the
+    time the function takes is recorded.
     """
+    profiler = profiling.current
     try:
-        return (False, f(*args, **kwargs))
+        if profiler is None:
+            return (False, f(*args, **kwargs))
+        return (False, profiler.call(f, args, kwargs))
     except:
-        return (True, sys.exc_info())
+        return (True, tracebacks.policy(sys.exc_info()))
 
 
 class NoEffectHandlerError(Exception):
@@ -165,7 +242,7 @@ class NoEffectHandlerError(Exception):
     """
 
 
-@attributes(['effects'], apply_with_init=False)
+@attributes(['effects'])
 class ParallelEffects(object):
     """
     An effect intent that asks for a number of effects to be run in parallel,
@@ -193,7 +270,7 @@ def parallel(effects):
     return Effect(ParallelEffects(list(effects)))
 
 
-@attributes(['delay'], apply_with_init=False)
+@attributes(['delay'])
 class Delay(object):
     """
     An effect which represents a delay in time.
@@ -218,28 +295,118 @@ def sync_perform(effect, dispatcher=default_dispatcher):
     This requires that the effect (and all effects returned from any of its
     callbacks) to be synchronous. If this is not the case, NotSynchronousError
     will be raised.
+
+    Rather than using :func:`perform` and its trampoline, this dispatches
+    intents and runs callbacks in a simple loop. If the dispatcher doesn't
+    provide a result before returning, NotSynchronousError is raised, and if
+    the result turns up later, the remaining callbacks are run by the general
+    interpreter as :func:`perform` would have.
+
+    Work scheduled while the effect is being performed, such as the children
+    of a parallel effect, or effects passed to :func:`perform` by performers
+    and callbacks, is run to completion before sync_perform returns, even if
+    it's called while a trampoline is already running in this thread.
+    """
+    queue, outer = isolate()
+    try:
+        return _sync_perform(effect, dispatcher, queue)
+    finally:
+        restore(outer)
+
+
+def _sync_perform(effect, dispatcher, queue):
+    runtime = stats.current
+    if runtime is not None:
+        runtime.effects_started += 1
+    intent = effect.intent
+    chain = effect.callbacks
+    while True:
+        box = _SyncBox()
+        if runtime is not None:
+            intent_type = type(intent)
+            runtime.intent_started(intent_type)
+        dispatcher(intent, box)
+        if queue:
+            drain(queue)
+        if box.result is None:
+            if runtime is not None:
+                box.tracked = (runtime, intent_type)
+            box.late = (chain, dispatcher)
+            # The result may be arriving from another thread right now.
+            if box.result is None or not box._claim():
+                if runtime is not None:
+                    runtime.waiting += 1
+                raise NotSynchronousError(
+                    "Performing %r was not synchronous!" % (effect,))
+        if runtime is not None:
+            runtime.intent_finished(intent_type)
+        is_error, value = box.result
+        i = 0
+        while type(value) is not Effect:
+            if i == len(chain):
+                if runtime is not None:
+                    runtime.effects_completed += 1
+                    runtime.effects_failed += is_error
+                if queue:
+                    drain(queue)
+                if is_error:
+                    _reraise(*value)
+                return value
+            cb = chain[i][is_error]
+            i += 1
+            if cb is not None:
+                is_error, value = guard(cb, value)
+        if queue:
+            drain(queue)
+        intent = value.intent
+        chain = value.callbacks + chain[i:]
+
+
+class _SyncBox(object):
+    """
+    The box used by :func:`sync_perform`. A result that arrives after
+    sync_perform has given up waiting for it is handed to the general
+    interpreter, along with the rest of the callback chain.
     """
-    successes = []
-    errors = []
+    result = None
+    late = None
+    tracked = None
+    claimed = False
+    _lock = threading.Lock()
 
-    def success(x):
-        successes.append(x)
+    def succeed(self, result):
+        self._complete((False, result))
 
-    def error(x):
-        errors.append(x)
+    def fail(self, result):
+        self._complete((True, tracebacks.policy(result)))
 
-    effect = effect.on(success=success, error=error)
-    perform(effect, dispatcher=dispatcher)
-    if successes:
-        return successes[0]
-    elif errors:
-        six.reraise(*errors[0])
-    else:
-        raise NotSynchronousError("Performing %r was not synchronous!"
-                                  % (effect,))
+    def _claim(self):
+        """
+        Called by sync_perform, or by whatever completes the box, when each
+        has seen the other's write: the result and ``late`` are each written
+        before the other is read, so at least one of them sees both, and if
+        both do, only the first to claim the box deals with the result.
+        """
+        with self._lock:
+            if self.claimed:
+                return False
+            self.claimed = True
+            return True
+
+    def _complete(self, result):
+        self.result = result
+        if self.late is None or not self._claim():
+            return
+        if self.tracked is not None:
+            runtime, intent_type = self.tracked
+            runtime.intent_finished(intent_type)
+            runtime.waiting -= 1
+        chain, dispatcher = self.late
+        self.late = self.result = None
+        schedule(_run_callbacks, chain, result, dispatcher)
 
 
-@attributes(['result'], apply_with_init=False)
+@attributes(['result'])
 class ConstantIntent(object):
     """An intent that returns a pre-specified result when performed."""
     def __init__(self, result):
@@ -249,7 +416,7 @@ class ConstantIntent(object):
         return self.result
 
 
-@attributes(['exception'], apply_with_init=False)
+@attributes(['exception'])
 class ErrorIntent(object):
     """An intent that raises a pre-specified exception when performed."""
     def __init__(self, exception):
@@ -259,7 +426,7 @@ class ErrorIntent(object):
         raise self.exception
 
 
-@attributes(['func'], apply_with_init=False)
+@attributes(['func'])
 class FuncIntent(object):
     """
     An intent that returns the result of the specified function.
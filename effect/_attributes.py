@@ -0,0 +1,52 @@
+"""
+A dependency-free stand-in for ``characteristic.attributes``, so that the
+core of the library can be imported without any third-party packages.
+
+Only what the core uses is supported: comparison, hashing and a repr based
+on a list of attribute names, which the class's own ``__init__`` sets.
+"""
+
+from __future__ import absolute_import
+
+import operator
+
+
+def attributes(names):
+    """
+    A class decorator which behaves like ``characteristic.attributes(names,
+    apply_with_init=False)``: instances compare, order and hash like tuples
+    of the named attributes, but only with instances of the same class, and
+    have a repr like ``<Name(a=1, b=2)>``.
+
+    :param names: A list of attribute names.
+    """
+    names = tuple(names)
+
+    def as_tuple(obj):
+        return tuple([getattr(obj, name) for name in names])
+
+    def comparison(op):
+        def compare(self, other):
+            if other.__class__ is self.__class__:
+                return op(as_tuple(self), as_tuple(other))
+            return NotImplemented
+        return compare
+
+    def hash_(self):
+        return hash(as_tuple(self))
+
+    def repr_(self):
+        return "<%s(%s)>" % (
+            self.__class__.__name__,
+            ", ".join("%s=%r" % (name, getattr(self, name))
+                      for name in names))
+
+    def wrap(cls):
+        for method, op in [('__eq__', operator.eq), ('__ne__', operator.ne),
+                           ('__lt__', operator.lt), ('__le__', operator.le),
+                           ('__gt__', operator.gt), ('__ge__', operator.ge)]:
+            setattr(cls, method, comparison(op))
+        cls.__hash__ = hash_
+        cls.__repr__ = repr_
+        return cls
+    return wrap
@@ -0,0 +1,56 @@
+"""
+Fixtures shared by the tests.
+"""
+
+from __future__ import absolute_import
+
+from . import ParallelEffects, default_dispatcher
+from .fan_out import fan_out
+
+
+class FakeClock(object):
+    """
+    A clock, for an :class:`effect.loop.EventLoop` or anything else that
+    takes a function returning the time, which only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class Later(object):
+    """An intent whose box is kept, to be completed by the test."""
+
+    def __init__(self, name=None, priority=None):
+        """
+        :param name: Something to tell intents apart by.
+        :param priority: The intent's priority class; see
+            :mod:`effect.priority`.
+        """
+        self.name = name
+        self.priority = priority
+
+
+def keeping_dispatcher(boxes, dispatcher=default_dispatcher, keep_all=False):
+    """
+    Return a dispatcher which appends the boxes of :class:`Later` intents to
+    a list, for the test to complete, performs parallel effects with
+    :func:`effect.fan_out.fan_out`, and other intents with another
+    dispatcher.
+
+    :param list boxes: The list to append the boxes to.
+    :param dispatcher: The dispatcher to perform other intents with.
+    :param keep_all: Whether to append the boxes of every intent, rather than
+        only those of Later intents.
+    """
+    def keeping(intent, box):
+        if keep_all or type(intent) is Later:
+            boxes.append(box)
+        if type(intent) is ParallelEffects:
+            fan_out(intent, keeping, box)
+        elif type(intent) is not Later:
+            dispatcher(intent, box)
+    return keeping
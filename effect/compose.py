@@ -0,0 +1,159 @@
+"""
+Composing dispatchers without exceptions for intents they don't handle.
+
+A dispatcher can say which intents it handles by having a
+``lookup(intent_type)`` method, which returns a performer for intents of that
+type, or None if it doesn't handle them. A performer is a function taking the
+dispatcher an intent is being performed with, the intent, and a box, so
+performers can perform further effects with the whole composed dispatcher.
+
+:class:`ComposedDispatcher` tries a list of dispatchers in order, resolving
+each intent type to a performer once, the first time an intent of that type
+is performed, and using the cached performer after that. A miss costs a
+method call while resolving, not a raised and caught
+:class:`effect.NoEffectHandlerError` on every intent::
+
+    dispatcher = ComposedDispatcher([
+        TypeDispatcher({ParallelEffects: parallel_performer,
+                        ReadFile: perform_read_file}),
+        http_pool,
+        default_dispatcher,
+    ])
+
+Dispatchers without a ``lookup`` method, such as plain functions, are assumed
+to handle every intent, so they belong at the end of the list.
+
+A :class:`effect.priority.WithPriority` intent goes to the first dispatcher
+that handles the type of the intent it wraps. If that dispatcher's lookup
+also returns a performer for WithPriority, the performer is given the
+WithPriority intent, so it can honor the priority; otherwise it's given the
+wrapped intent, and the priority is ignored.
+"""
+
+from __future__ import absolute_import
+
+import sys
+
+from . import NoEffectHandlerError
+from .fan_out import fan_out
+from .priority import WithPriority
+
+
+def parallel_performer(dispatcher, intent, box):
+    """
+    A performer for :obj:`effect.ParallelEffects`, which performs the children
+    with the composed dispatcher using :func:`effect.fan_out.fan_out`.
+    """
+    fan_out(intent, dispatcher, box)
+
+
+def _no_handler(dispatcher, intent, box):
+    box.fail((NoEffectHandlerError, NoEffectHandlerError(intent), None))
+
+
+def _calling(function):
+    """Adapt a dispatcher function to a performer."""
+    def call_dispatcher(dispatcher, intent, box):
+        function(intent, box)
+    return call_dispatcher
+
+
+def _unwrapping(performer):
+    """
+    Adapt a performer to perform the intent wrapped by a WithPriority, without
+    its priority.
+    """
+    def perform_wrapped(dispatcher, intent, box):
+        performer(dispatcher, intent.intent, box)
+    return perform_wrapped
+
+
+class TypeDispatcher(object):
+    """
+    A dispatcher which performs intents with performers looked up by the
+    exact type of the intent. Exceptions raised by performers fail the box.
+    """
+
+    def __init__(self, performers):
+        """
+        :param performers: A dict mapping intent types to performers, which
+            take a dispatcher, an intent and a box.
+        """
+        self.performers = performers
+
+    def lookup(self, intent_type):
+        return self.performers.get(intent_type)
+
+    def __call__(self, intent, box):
+        performer = self.performers.get(type(intent), _no_handler)
+        try:
+            performer(self, intent, box)
+        except:
+            box.fail(sys.exc_info())
+
+
+class ComposedDispatcher(object):
+    """
+    A dispatcher which performs each intent with the first of a list of
+    dispatchers that handles its type. Intents that none of them handle fail
+    with :class:`effect.NoEffectHandlerError`, and exceptions raised by
+    performers fail the box.
+
+    The performer for each intent type is cached, so the dispatchers must
+    decide what they handle by type alone, and shouldn't change their minds.
+    """
+
+    def __init__(self, dispatchers):
+        """
+        :param dispatchers: A list of dispatchers, which either have a
+            ``lookup`` method or handle every intent.
+        """
+        self.dispatchers = dispatchers
+        self._cache = {}
+        # Performers for WithPriority intents, by the wrapped intent's type.
+        self._priority_cache = {}
+
+    def lookup(self, intent_type):
+        performer = self._resolve(intent_type)
+        return None if performer is _no_handler else performer
+
+    def _resolve(self, intent_type):
+        try:
+            return self._cache[intent_type]
+        except KeyError:
+            pass
+        if intent_type is WithPriority:
+            performer = self._perform_with_priority
+        else:
+            performer = self._find(intent_type, False)
+        self._cache[intent_type] = performer
+        return performer
+
+    def _find(self, intent_type, with_priority):
+        for dispatcher in self.dispatchers:
+            lookup = getattr(dispatcher, 'lookup', None)
+            if lookup is None:
+                return _calling(dispatcher)
+            found = lookup(intent_type)
+            if found is not None:
+                if not with_priority:
+                    return found
+                return lookup(WithPriority) or _unwrapping(found)
+        return _no_handler
+
+    def _perform_with_priority(self, dispatcher, intent, box):
+        intent_type = type(intent.intent)
+        performer = self._priority_cache.get(intent_type)
+        if performer is None:
+            performer = self._priority_cache[intent_type] = self._find(
+                intent_type, True)
+        performer(dispatcher, intent, box)
+
+    def __call__(self, intent, box):
+        performer = self._cache.get(type(intent))
+        if performer is None:
+            performer = self._resolve(type(intent))
+        try:
+            performer(self, intent, box)
+        except:
+            box.fail(sys.exc_info())
@@ -1,9 +1,64 @@
-"""An asynchronous trampoline."""
+"""
+An asynchronous trampoline.
+
+Bouncers may be bounced from any thread. Whether the work is run by the
+trampoline that made the bouncer, or has to be started afresh, is settled
+under a lock, so work bounced from another thread just as the trampoline is
+finishing is neither dropped nor run twice.
+
+Work bounced after its trampoline has finished is started in the thread that
+bounced it, unless it's bounced from another thread and a resume executor has
+been set with :func:`set_resume_executor`, in which case it's handed to that
+executor, e.g. to run it in the reactor or event loop thread.
+"""
+
+import threading
+
+from collections import deque
+from functools import partial
+
+try:
+    from threading import get_ident
+except ImportError:
+    from thread import get_ident
+
+
+# Holds the run queue of the trampoline currently running in each thread.
+_running = threading.local()
+
+# Settles races between bounce and the trampoline finishing with a bouncer.
+_lock = threading.Lock()
+
+resume_executor = None
+
+# What a bouncer's work is replaced with once it has been picked up, so that
+# the bouncer doesn't keep the function and arguments (and so the result
+# being delivered) alive, but can't be bounced again either.
+_TAKEN = ('taken',)
+
+
+def set_resume_executor(executor):
+    """
+    Set the executor to hand work over to when it's bounced from a thread
+    other than the one whose trampoline made the bouncer, after that
+    trampoline has finished with it. This applies to all threads.
+
+    :param executor: A function which takes a function, and arranges for it
+        to be called with no arguments, like ``reactor.callFromThread``,
+        ``loop.call_soon_threadsafe`` or ``ThreadPoolExecutor.submit``; or
+        None, to run such work in the thread that bounced it.
+    :return: The previous executor.
+    """
+    global resume_executor
+    old, resume_executor = resume_executor, executor
+    return old
 
 
 class Bouncer(object):
     work = None
     _asynchronous = False
+    # The ident of the thread whose trampoline made this bouncer.
+    _owner = None
 
     def bounce(self, func, *args, **kwargs):
         """
@@ -11,19 +66,89 @@ class Bouncer(object):
         trampoline that the given function should be run. It will be passed a
         new bouncer and the args and kwargs specified.
 
-        If the calling trampoline has finished, the function will be run
-        synchronously in a new trampoline.
+        If the calling trampoline has finished, the function will be handed to
+        :func:`schedule`: it is queued on whatever trampoline is running in
+        this thread, or run synchronously in a new trampoline if there is none.
+        If it's bounced from another thread, and a resume executor is set, it
+        is scheduled by the executor instead.
 
-        This method may only be called once, to enforce a tail-call style.
+        This method may only be called once, to enforce a tail-call style. It
+        may be called from any thread.
         """
+        if not self._asynchronous and self._owner == get_ident():
+            # The function the trampoline is running in this thread bounced,
+            # so the trampoline picks the work up once it returns, and no
+            # other thread can be finishing with this bouncer.
+            if self.work is None:
+                self.work = (func, args, kwargs)
+                return
+        _lock.acquire()
+        try:
+            self._set_work(func, args, kwargs)
+            if not self._asynchronous:
+                return
+            self.work = _TAKEN
+        finally:
+            _lock.release()
+        executor = resume_executor
+        if executor is None or self._owner == get_ident():
+            schedule(func, *args, **kwargs)
+        else:
+            executor(partial(schedule, func, *args, **kwargs))
+
+    def _set_work(self, func, args, kwargs):
         if self.work is not None:
             raise RuntimeError(
-                "Already specified work %r, refusing to set to (%r %r %r)"
-                % (self.work, func, args, kwargs))
+                "Already bounced, refusing to set work to (%r %r %r)"
+                % (func, args, kwargs))
         self.work = (func, args, kwargs)
-        if self._asynchronous:
-            trampoline(func, *args, **kwargs)
-            return
+
+
+def schedule(f, *args, **kwargs):
+    """
+    Run f with a new Bouncer on the trampoline that is currently running in
+    this thread, after the function that trampoline is currently running
+    returns. If no trampoline is running, start one and run f immediately.
+
+    This is what keeps the stack depth constant when work is started from
+    inside other work: asynchronous completions that happen to fire
+    synchronously, and effects performed from inside performers (such as the
+    children of a ParallelEffects), are queued instead of recursing.
+    """
+    queue = getattr(_running, 'queue', None)
+    if queue is None:
+        trampoline(f, *args, **kwargs)
+    else:
+        queue.append((f, args, kwargs))
+
+
+def isolate():
+    """
+    Give this thread a new, empty run queue, so that work scheduled from now
+    on is queued there rather than on the trampoline that's already running,
+    if there is one. The queued work is run with :func:`drain`.
+
+    :return: The new queue, and the previous one, to pass to :func:`restore`
+        once done.
+    """
+    outer = getattr(_running, 'queue', None)
+    queue = _running.queue = deque()
+    return queue, outer
+
+
+def drain(queue):
+    """
+    Run the work in a queue made by :func:`isolate`, each piece in a
+    trampoline of its own, until the queue is empty.
+    """
+    while queue:
+        f, args, kwargs = queue.popleft()
+        trampoline(f, *args, **kwargs)
+
+
+def restore(outer):
+    """Put back the run queue that :func:`isolate` replaced."""
+    _running.queue = outer
 
 
 def trampoline(f, *args, **kwargs):
@@ -37,25 +162,48 @@ def trampoline(f, *args, **kwargs):
     function by the time that 'f' returns, then the function passed
     will be called immediately.
 
-    If the function returns without calling bounce, then the trampoline
-    returns.
+    If the function returns without calling bounce, then any work queued with
+    :func:`schedule` while this trampoline was running is run, and once there
+    is none left the trampoline returns.
 
     The interesting difference from a typical trampoline, however, is that the
     bounce method can be called *after* f returns -- in other words, the
     bounce method can be called asynchronously, assuming it stashes the bouncer
     object away somewhere, and something else triggers a call to it. Of course,
-    by then this trampoline will no longer be running. In that case,
+    by then this trampoline may no longer be running. In that case,
     :func:`Bouncer.bounce` will immediately start up another trampoline and
     call the passed function.
 
     Given this asynchronous nature, return values of functions disappear into
     the void. This trampoline is for intrinsically side-effecting operations.
     """
-    while True:
-        bouncer = Bouncer()
-        f(bouncer, *args, **kwargs)
-        if bouncer.work is not None:
-            f, args, kwargs = bouncer.work
-        else:
-            bouncer._asynchronous = True
-            return
+    outer = getattr(_running, 'queue', None)
+    queue = _running.queue = deque()
+    owner = get_ident()
+    try:
+        while True:
+            bouncer = Bouncer()
+            bouncer._owner = owner
+            f(bouncer, *args, **kwargs)
+            work = bouncer.work
+            if work is None:
+                # Another thread may be bouncing right now; whichever of us
+                # takes the lock second deals with the work.
+                _lock.acquire()
+                work = bouncer.work
+                if work is None:
+                    bouncer._asynchronous = True
+                else:
+                    bouncer.work = _TAKEN
+                _lock.release()
+            else:
+                bouncer.work = _TAKEN
+            if work is not None:
+                f, args, kwargs = work
+                work = None
+            else:
+                if not queue:
+                    return
+                f, args, kwargs = queue.popleft()
+    finally:
+        _running.queue = outer
@@ -0,0 +1,84 @@
+"""
+Deadlines for performing effects.
+
+A deadline belongs to the dispatcher an effect is performed with, so it's
+inherited by everything performed with that dispatcher: the effects returned
+by callbacks and performers, and the children of parallel effects. Intents
+that would be started after the deadline fail straight away with
+:class:`DeadlineExceeded`, instead of doing work whose result nobody is
+waiting for::
+
+    from effect.deadline import with_timeout
+    sync_perform(eff, with_timeout(dispatcher, 0.2))
+
+:class:`effect.twisted.TwistedDispatcher` takes a ``deadline`` too, and also
+cancels the Deferreds of intents still in progress when it passes.
+"""
+
+from __future__ import absolute_import
+
+import time
+
+from . import ParallelEffects
+from .fan_out import fan_out
+
+
+class DeadlineExceeded(Exception):
+    """
+    The deadline passed before an intent was started, or while it was being
+    performed.
+
+    :ivar intent: The intent, if known.
+    """
+
+    def __init__(self, intent=None):
+        Exception.__init__(self, intent)
+        self.intent = intent
+
+
+def deadline_exceeded(intent=None):
+    """Return an exc_info tuple for a :class:`DeadlineExceeded` error."""
+    return (DeadlineExceeded, DeadlineExceeded(intent), None)
+
+
+class DeadlineDispatcher(object):
+    """
+    A dispatcher which performs intents with another dispatcher until a
+    deadline, and fails them with :class:`DeadlineExceeded` after it.
+
+    Parallel effects are performed with :func:`effect.fan_out.fan_out`, with
+    this dispatcher, so that their children are held to the deadline too.
+    Intents already in progress when the deadline passes are left to finish,
+    since there's no general way to cancel them.
+    """
+
+    def __init__(self, dispatcher, deadline, clock=time.time):
+        """
+        :param dispatcher: The dispatcher to perform intents with.
+        :param float deadline: The time after which no more intents are
+            started, as returned by ``clock``.
+        :param clock: A function returning the current time.
+        """
+        self.dispatcher = dispatcher
+        self.deadline = deadline
+        self.clock = clock
+
+    def remaining(self):
+        """Return the number of seconds until the deadline."""
+        return self.deadline - self.clock()
+
+    def __call__(self, intent, box):
+        if self.clock() >= self.deadline:
+            box.fail(deadline_exceeded(intent))
+        elif type(intent) is ParallelEffects:
+            fan_out(intent, self, box)
+        else:
+            self.dispatcher(intent, box)
+
+
+def with_timeout(dispatcher, timeout, clock=time.time):
+    """
+    Return a :class:`DeadlineDispatcher` whose deadline is ``timeout``
+    seconds from now.
+    """
+    return DeadlineDispatcher(dispatcher, clock() + timeout, clock)
@@ -0,0 +1,90 @@
+"""
+An imperative-looking notation for Effectful code, using generators.
+
+Instead of nesting ``.on(success=...)`` callbacks, write a generator which
+yields Effects and is sent their results::
+
+    @do
+    def get_orgs_repos(name):
+        org_names = yield get_orgs(name)
+        repo_lists = yield parallel(map(get_org_repos, org_names))
+        yield do_return(reduce(operator.add, repo_lists))
+
+Calling a decorated function returns an Effect. Each yielded Effect gets
+exactly one callback attached, which resumes the generator; when that
+callback returns the next yielded Effect, the interpreter flattens it into the
+remaining callback chain as usual, so every step costs one dispatch and the
+chain never grows with the number of steps.
+"""
+
+from __future__ import absolute_import
+
+from functools import wraps
+
+import six
+
+from . import Effect, FuncIntent
+
+
+def do(f):
+    """
+    A decorator which turns a generator function into a function returning an
+    Effect of the generator's result.
+
+    The generator must yield Effects. The result of each Effect is sent back
+    into the generator as the value of the ``yield`` expression; if the Effect
+    fails, its exception is raised from the ``yield`` expression instead.
+
+    The result of the whole Effect is the value passed to :func:`do_return`
+    (or returned with ``return`` on Python 3), or None.
+
+    The generator is only created when the Effect is performed, so the Effect
+    can be performed any number of times.
+    """
+    @wraps(f)
+    def do_wrapper(*args, **kwargs):
+        def start():
+            return _do(f(*args, **kwargs), False, None)
+        return Effect(FuncIntent(start))
+    return do_wrapper
+
+
+class _ReturnSentinel(object):
+    def __init__(self, result):
+        self.result = result
+
+
+def do_return(val):
+    """
+    Specify the result of a :func:`do`-decorated generator. This is only
+    necessary on Python 2, where generators can't ``return`` values; on
+    Python 3 a plain ``return`` works too.
+
+    Note that unlike ``return``, you must ``yield`` the result of this
+    function for it to have any effect::
+
+        yield do_return(value)
+    """
+    return _ReturnSentinel(val)
+
+
+def _do(generator, is_error, result):
+    try:
+        if not is_error:
+            val = generator.send(result)
+        elif six.PY2:
+            val = generator.throw(*result)
+        else:
+            val = generator.throw(result[1])
+    except StopIteration as stop:
+        return getattr(stop, 'value', None)
+    if type(val) is _ReturnSentinel:
+        generator.close()
+        return val.result
+    elif type(val) is Effect:
+        return val.on(success=lambda r: _do(generator, False, r),
+                      error=lambda e: _do(generator, True, e))
+    else:
+        raise TypeError(
+            "@do-decorated generators must yield Effects or the result of "
+            "do_return, not %r" % (val,))
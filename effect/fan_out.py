@@ -0,0 +1,193 @@
+"""
+A compact way to perform the children of a :obj:`effect.ParallelEffects`.
+
+:func:`fan_out` is used by :class:`effect.twisted.TwistedDispatcher` and
+:func:`effect.loop.perform_parallel`, and can be used by any other dispatcher
+to perform parallel effects without help from an asynchronous framework.
+
+All of the children of one parallel effect share a single group object,
+holding a preallocated list of results and a count of the children still
+running. Children that have no callbacks of their own have their intents
+dispatched directly, with a small box that writes the result into the
+child's slot; only children with callbacks are performed as effects in their
+own right. So there's no Deferred, Effect, closure or trampoline per child.
+
+Children may complete from any thread: the group's bookkeeping is done under
+a lock, so exactly one of them completes the group.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+
+from . import Effect, perform, stats, tracebacks
+from .continuation import schedule
+
+
+# Guards the bookkeeping of every group, since children may complete from
+# other threads. It's only held for a few assignments.
+_lock = threading.Lock()
+
+
+class _Group(object):
+    """The shared state of the children of one parallel effect."""
+
+    __slots__ = ('effects', 'dispatcher', 'box', 'wrap_error', 'results',
+                 'remaining', 'failed', 'runtime')
+
+    def __init__(self, effects, dispatcher, box, wrap_error, runtime):
+        self.effects = effects
+        self.dispatcher = dispatcher
+        self.box = box
+        self.wrap_error = wrap_error
+        self.results = [None] * len(effects)
+        self.remaining = len(effects)
+        self.failed = False
+        self.runtime = runtime
+
+    def start(self, bouncer):
+        """Perform every child."""
+        dispatcher = self.dispatcher
+        runtime = self.runtime
+        effects = self.effects
+        self.effects = None
+        for index, effect in enumerate(effects):
+            if effect.callbacks:
+                slot = _Slot(self, index)
+                perform(effect.on(success=slot.succeed, error=slot.fail),
+                        dispatcher)
+                continue
+            if runtime is None:
+                slot = _Slot(self, index)
+            else:
+                runtime.intent_started(type(effect.intent))
+                slot = _TrackedSlot(self, index, type(effect.intent))
+            try:
+                dispatcher(effect.intent, slot)
+            except:
+                # Dispatchers are meant to report errors through the box, but
+                # this mustn't stop the other children from being performed.
+                slot.fail(sys.exc_info())
+
+    def succeed(self, index, result):
+        _lock.acquire()
+        if self.runtime is not None:
+            self.runtime.parallel_children -= 1
+        if self.failed:
+            _lock.release()
+            return
+        self.results[index] = result
+        self.remaining -= 1
+        if self.remaining:
+            _lock.release()
+            return
+        if self.runtime is not None:
+            self.runtime.parallel_groups -= 1
+        results, self.results = self.results, None
+        box, self.box = self.box, None
+        _lock.release()
+        schedule(_complete, box.succeed, results)
+
+    def fail(self, index, exc_info):
+        _lock.acquire()
+        if self.runtime is not None:
+            self.runtime.parallel_children -= 1
+        if self.failed:
+            _lock.release()
+            return
+        self.failed = True
+        # Children still running keep the group, but not the results of the
+        # others, or the box.
+        self.results = None
+        box, self.box = self.box, None
+        if self.runtime is not None:
+            self.runtime.parallel_groups -= 1
+        _lock.release()
+        if self.wrap_error is not None:
+            exc_info = self.wrap_error(exc_info, index)
+        schedule(_complete, box.fail, exc_info)
+
+
+def _complete(bouncer, complete, result):
+    """
+    Complete the box of a group. This is scheduled on the trampoline, rather
+    than done directly, so that when the box is a slot of an enclosing group,
+    nested groups completing one after another don't grow the stack.
+    """
+    complete(result)
+
+
+class _Slot(object):
+    """
+    The box a child's intent is dispatched with, which puts its result in
+    the child's slot in the group's results.
+    """
+
+    __slots__ = ('_group', '_index')
+
+    def __init__(self, group, index):
+        self._group = group
+        self._index = index
+
+    def succeed(self, result):
+        if type(result) is Effect:
+            # A performer resulted in another effect, so perform that.
+            perform(result.on(success=self.succeed, error=self.fail),
+                    self._group.dispatcher)
+        else:
+            self._group.succeed(self._index, result)
+
+    def fail(self, exc_info):
+        self._group.fail(self._index, tracebacks.policy(exc_info))
+
+
+class _TrackedSlot(_Slot):
+    """A slot used while statistics are enabled."""
+
+    __slots__ = ('_intent_type',)
+
+    def __init__(self, group, index, intent_type):
+        _Slot.__init__(self, group, index)
+        self._intent_type = intent_type
+
+    def succeed(self, result):
+        self._finished()
+        _Slot.succeed(self, result)
+
+    def fail(self, exc_info):
+        self._finished()
+        _Slot.fail(self, exc_info)
+
+    def _finished(self):
+        if self._intent_type is not None:
+            self._group.runtime.intent_finished(self._intent_type)
+            self._intent_type = None
+
+
+def fan_out(parallel, dispatcher, box, wrap_error=None):
+    """
+    Perform a ParallelEffects intent by performing all of its children with
+    the given dispatcher, and succeed the box with a list of their results,
+    in order, once they've all completed.
+
+    If any child fails, the box is failed with that child's error straight
+    away, and the results of the other children are ignored.
+
+    The children are started from the trampoline that's running, after the
+    current step, so parallel effects can be nested arbitrarily deeply.
+
+    :param wrap_error: An optional function which is passed the exc_info of
+        the first child to fail and the child's index, and returns the
+        exc_info to fail the box with.
+    """
+    effects = parallel.effects
+    if not effects:
+        box.succeed([])
+        return
+    runtime = stats.current
+    if runtime is not None:
+        runtime.parallel_groups += 1
+        runtime.parallel_children += len(effects)
+    group = _Group(effects, dispatcher, box, wrap_error, runtime)
+    schedule(group.start)
@@ -0,0 +1,161 @@
+"""
+Interoperability with :mod:`concurrent.futures`.
+
+:class:`FutureDispatcher` is like :func:`effect.default_dispatcher`, except
+that performers may return a :class:`concurrent.futures.Future`, whose result
+becomes the intent's result once it's done, so existing code built on thread
+pools can be used in effects::
+
+    @attributes(['url'])
+    class Fetch(object):
+        def perform_effect(self, dispatcher):
+            return pool.submit(requests.get, self.url)
+
+:func:`perform_future` goes the other way, performing an effect and returning
+a Future of its result, so effects can be driven from thread-pool services
+without a reactor, and without blocking on :func:`effect.sync_perform`.
+
+A Future's done-callbacks are run in the thread that completes it, which
+may be a worker thread, while the thread that dispatched the intent is still
+running the trampoline, or while other workers complete the Futures of
+sibling intents. So a FutureDispatcher hands completions over safely: by
+default, it holds a lock (its ``lock`` attribute) while completing a box and
+running whatever that leads to, and :func:`perform_future` holds the same
+lock while it starts performing, so only one thread at a time ever works on
+the effects performed with the dispatcher. The work done by the Futures
+themselves is still concurrent. Your callbacks run in whichever thread holds
+the lock, so they shouldn't block.
+
+Alternatively, pass a ``hand_off`` function, like
+``reactor.callFromThread``, which is called with a function and its
+arguments and has to arrange for it to be called in the thread that performs
+the effects.
+
+On Python 2, this module needs the ``futures`` backport.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+
+from concurrent.futures import CancelledError, Future
+
+from functools import partial
+
+from . import ParallelEffects, dispatch_method, perform as base_perform
+from .fan_out import fan_out
+
+
+def future_to_box(future, box, hand_off=None):
+    """
+    Complete the given box with the result of a Future once it's done.
+
+    :param hand_off: An optional function to hand the completion over to,
+        as described in the module docstring. Without one, the box is
+        completed in the thread that completes the Future, so this is only
+        safe if nothing else can be working on the box's effect at the time.
+    """
+    future.add_done_callback(partial(_future_done, box, hand_off))
+
+
+def _future_done(box, hand_off, future):
+    if hand_off is None:
+        _complete(box, future)
+    else:
+        hand_off(_complete, box, future)
+
+
+def _complete(box, future):
+    if future.cancelled():
+        box.fail((CancelledError, CancelledError(), None))
+        return
+    if hasattr(future, 'exception_info'):
+        # The Python 2 backport keeps the traceback separately.
+        exception, tb = future.exception_info()
+    else:
+        exception = future.exception()
+        tb = getattr(exception, '__traceback__', None)
+    if exception is None:
+        box.succeed(future.result())
+    else:
+        box.fail((type(exception), exception, tb))
+
+
+class FutureDispatcher(object):
+    """
+    A dispatcher which performs intents with their ``perform_effect``
+    methods, or with performers looked up by the type of the intent, and
+    accepts :class:`concurrent.futures.Future` results from them.
+
+    Parallel effects are performed with :func:`effect.fan_out.fan_out`, so
+    the Futures of their children are all waited for at once.
+    """
+
+    def __init__(self, performers=None, hand_off=None):
+        """
+        :param performers: An optional dict mapping intent types to functions
+            which take this dispatcher and an intent, and return a result or
+            a Future.
+        :param hand_off: An optional function to hand the completion of
+            Futures over to, as described in the module docstring. Defaults
+            to completing them while holding :attr:`lock`.
+        """
+        self.performers = performers or {}
+        self.lock = threading.RLock()
+        self.hand_off = self._locked if hand_off is None else hand_off
+
+    def _locked(self, f, *args):
+        with self.lock:
+            f(*args)
+
+    def __call__(self, intent, box):
+        if type(intent) is ParallelEffects:
+            fan_out(intent, self, box)
+            return
+        performer = self.performers.get(type(intent))
+        try:
+            if performer is None:
+                result = dispatch_method(intent, self)
+            else:
+                result = performer(self, intent)
+        except:
+            box.fail(sys.exc_info())
+            return
+        if isinstance(result, Future):
+            future_to_box(result, box, self.hand_off)
+        else:
+            box.succeed(result)
+
+
+def perform_future(effect, dispatcher=None):
+    """
+    Perform an effect, and return a :class:`concurrent.futures.Future` of its
+    ultimate result.
+
+    :param dispatcher: The dispatcher to perform the effect with. Defaults to
+        a new :class:`FutureDispatcher`. If it has a ``lock`` attribute, the
+        lock is held while performing starts.
+    """
+    if dispatcher is None:
+        dispatcher = FutureDispatcher()
+    future = Future()
+    future.set_running_or_notify_cancel()
+    effect = effect.on(success=future.set_result,
+                       error=lambda e: _set_exception(future, e))
+    lock = getattr(dispatcher, 'lock', None)
+    if lock is None:
+        base_perform(effect, dispatcher)
+    else:
+        with lock:
+            base_perform(effect, dispatcher)
+    return future
+
+
+def _set_exception(future, exc_info):
+    exception = exc_info[1]
+    if hasattr(future, 'set_exception_info'):
+        # The Python 2 backport keeps the traceback separately.
+        future.set_exception_info(exception, exc_info[2])
+    else:
+        future.set_exception(exception)
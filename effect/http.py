@@ -0,0 +1,755 @@
+"""
+An HTTP request intent, and a connection-pooling performer for it.
+
+:class:`HTTPRequest` is an inert description of a request. Its result is an
+:class:`HTTPResponse`.
+
+:class:`HTTPConnectionPool` performs HTTPRequests with :mod:`effect.loop`,
+keeping connections to each host open (HTTP/1.1 keep-alive) and reusing them
+for later requests, with a limit on the number of connections to any one host.
+Requests beyond that limit wait for a connection to become free, so a
+``parallel`` fan-out to one host reuses a handful of connections instead of
+opening one per request. Waiting requests are sent highest priority first
+(see :mod:`effect.priority`).
+
+:class:`StreamingHTTPRequest` is like HTTPRequest, except that its result's
+body is a :class:`BodyStream`, which is read a chunk at a time with Effects
+instead of being buffered in memory. Reading from the connection is paused
+while too much of the body is waiting to be read, so a slow consumer applies
+backpressure to the server.
+
+Only plain ``http`` URLs are supported. Host names are resolved with a
+blocking :func:`socket.getaddrinfo`.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import socket
+import sys
+
+from collections import deque
+from characteristic import attributes
+
+from six.moves.urllib.parse import urlsplit
+
+from functools import partial
+
+from . import Effect, NoEffectHandlerError
+from .priority import (
+    PriorityQueue, WithPriority, check_priority, priority_of)
+
+
+_WOULD_BLOCK = frozenset([errno.EAGAIN, errno.EWOULDBLOCK])
+_CONNECTING = frozenset([errno.EINPROGRESS, errno.EWOULDBLOCK])
+
+# Requests which can safely be sent again if a connection turns out to have
+# been closed before the response arrived.
+_IDEMPOTENT = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+
+@attributes(['method', 'url', 'headers', 'data'], apply_with_init=False)
+class HTTPRequest(object):
+    """
+    An intent to make an HTTP request. The result is an :class:`HTTPResponse`;
+    responses with error status codes are still successful results.
+    """
+
+    def __init__(self, method, url, headers=None, data=None, priority=None):
+        """
+        :param method: The method, like ``'get'`` or ``'POST'``.
+        :param url: An ``http`` URL.
+        :param headers: A dict mapping header names to a value or a list of
+            values.
+        :param data: A bytes request body, or None.
+        :param priority: The request's priority class, from
+            :data:`effect.priority.PRIORITIES`, or None for the default. It
+            decides the order that requests waiting for a connection are
+            sent in, and isn't part of the request's equality.
+        """
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.priority = priority
+
+
+@attributes(['method', 'url', 'headers', 'data'], apply_with_init=False)
+class StreamingHTTPRequest(object):
+    """
+    An intent to make an HTTP request, whose result is an
+    :class:`HTTPResponse` with a :class:`BodyStream` as its body. The result
+    is available as soon as the response's head has been received.
+    """
+
+    def __init__(self, method, url, headers=None, data=None, priority=None):
+        """See :class:`HTTPRequest` for the parameters."""
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.data = data
+        self.priority = priority
+
+
+@attributes(['code', 'reason', 'headers', 'body'], apply_with_init=False)
+class HTTPResponse(object):
+    """The result of an :class:`HTTPRequest`."""
+
+    def __init__(self, code, reason, headers, body):
+        """
+        :param int code: The status code.
+        :param reason: The reason phrase.
+        :param headers: A list of (name, value) pairs, in the order they were
+            received.
+        :param body: The body: bytes, or a :class:`BodyStream` for a
+            :class:`StreamingHTTPRequest`.
+        """
+        self.code = code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def get_header(self, name, default=None):
+        """Return the first value of the named header, or ``default``."""
+        return _get_header(self.headers, name, default)
+
+
+def _get_header(headers, name, default=None):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return default
+
+
+@attributes(['stream'], apply_with_init=False)
+class ReadBody(object):
+    """
+    An intent to read the next chunk of a :class:`BodyStream`. The result is
+    a non-empty bytes, or ``b''`` once the whole body has been read.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+
+@attributes(['stream'], apply_with_init=False)
+class CloseBody(object):
+    """
+    An intent to stop reading a :class:`BodyStream`, and close its connection
+    if the body hasn't been received yet. The result is None.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+
+class BodyStream(object):
+    """
+    The body of the response to a :class:`StreamingHTTPRequest`.
+
+    Chunks are read with the Effects returned by :func:`read`, one at a time.
+    Up to ``high_water`` bytes are buffered while waiting to be read; once
+    more than that is buffered, the connection stops being read from until
+    the consumer catches up.
+
+    The connection isn't returned to the pool until the whole body has been
+    read from it, so either read to the end or :func:`close` the stream.
+    """
+
+    def __init__(self, high_water=65536):
+        self.high_water = high_water
+        self._chunks = deque()
+        self._buffered = 0
+        self._waiting = None
+        self._finished = False
+        self._error = None
+        self._connection = None
+        self._paused = False
+
+    def read(self):
+        """Return an Effect of the next chunk, or ``b''`` at the end."""
+        return Effect(ReadBody(self))
+
+    def close(self):
+        """Return an Effect which stops reading the body."""
+        return Effect(CloseBody(self))
+
+    def fold(self, func, initial):
+        """
+        Return an Effect which reads the whole body, calling
+        ``func(accumulator, chunk)`` for each chunk, with the result of the
+        previous call (or ``initial``) as the accumulator. Its result is the
+        final accumulator.
+
+        Only one chunk is held at a time, so this is a good way to process a
+        large body incrementally.
+        """
+        def step(accumulator, chunk):
+            if not chunk:
+                return accumulator
+            return self.read().on(
+                success=partial(step, func(accumulator, chunk)))
+        return self.read().on(success=partial(step, initial))
+
+    def _feed(self, data):
+        if not data:
+            return
+        if self._waiting is not None:
+            box, self._waiting = self._waiting, None
+            box.succeed(data)
+            return
+        self._chunks.append(data)
+        self._buffered += len(data)
+        if self._buffered > self.high_water and not self._paused:
+            self._paused = True
+            self._connection.pause_reading()
+
+    def _finish(self, exc_info):
+        self._finished = True
+        self._error = exc_info
+        # The whole body has been received, so there's nothing left to
+        # resume reading.
+        self._paused = False
+        self._connection = None
+        box, self._waiting = self._waiting, None
+        if box is not None:
+            self._read(box)
+
+    def _read(self, box):
+        if self._chunks:
+            data = self._chunks.popleft()
+            self._buffered -= len(data)
+            if self._paused and self._buffered <= self.high_water:
+                self._paused = False
+                self._connection.resume_reading()
+            box.succeed(data)
+        elif self._error is not None:
+            box.fail(self._error)
+        elif self._finished:
+            box.succeed(b'')
+        elif self._waiting is not None:
+            box.fail((RuntimeError, RuntimeError(
+                "Already reading from %r" % (self,)), None))
+        else:
+            self._waiting = box
+
+    def _close(self, box):
+        if not self._finished:
+            self._chunks.clear()
+            self._buffered = 0
+            self._connection.abort()
+        box.succeed(None)
+
+
+class HTTPProtocolError(Exception):
+    """The server sent something that isn't a valid HTTP response."""
+
+
+class _ResponseParser(object):
+    """
+    An incremental parser for an HTTP/1.x response, which calls
+    ``on_headers(code, reason, headers)``, then ``on_body(data)`` any number of
+    times, and then ``on_complete(reusable)``, where reusable indicates
+    whether the connection can be used for another request.
+    """
+
+    def __init__(self, method, on_headers, on_body, on_complete):
+        self._head_only = method.upper() == 'HEAD'
+        self._on_headers = on_headers
+        self._on_body = on_body
+        self._on_complete = on_complete
+        self._buffer = b''
+        self._state = self._parse_head
+        self._remaining = 0
+        self._keep_alive = True
+        self.received = False
+
+    def feed(self, data):
+        self.received = True
+        self._buffer += data
+        while self._buffer and self._state():
+            pass
+
+    def eof(self):
+        """
+        Handle the connection being closed. Return True if that completed the
+        response, or False if the response was cut short.
+        """
+        if self._state == self._parse_until_close:
+            self._state = None
+            self._on_complete(False)
+            return True
+        return self._state is None
+
+    def _parse_head(self):
+        end = self._buffer.find(b'\r\n\r\n')
+        if end == -1:
+            return False
+        lines = self._buffer[:end].decode('iso-8859-1').split('\r\n')
+        self._buffer = self._buffer[end + 4:]
+        try:
+            version, code, reason = (lines[0].split(' ', 2) + [''])[:3]
+            code = int(code)
+            headers = [tuple(part.strip() for part in line.split(':', 1))
+                       for line in lines[1:]]
+            if not version.startswith('HTTP/') or any(
+                    len(h) != 2 for h in headers):
+                raise ValueError()
+        except ValueError:
+            raise HTTPProtocolError("Invalid response head: %r" % (lines,))
+        if 100 <= code < 200:
+            return True
+        connection = (_get_header(headers, 'connection') or '').lower()
+        if version == 'HTTP/1.0':
+            self._keep_alive = connection == 'keep-alive'
+        else:
+            self._keep_alive = connection != 'close'
+        self._on_headers(code, reason, headers)
+
+        encoding = (_get_header(headers, 'transfer-encoding') or '').lower()
+        length = _get_header(headers, 'content-length')
+        if self._head_only or code in (204, 304):
+            self._finish()
+        elif 'chunked' in encoding:
+            self._state = self._parse_chunk_size
+        elif length is not None:
+            self._remaining = int(length)
+            self._state = self._parse_length
+            if not self._remaining:
+                self._finish()
+        else:
+            self._keep_alive = False
+            self._state = self._parse_until_close
+        return True
+
+    def _parse_length(self):
+        data = self._buffer[:self._remaining]
+        self._buffer = self._buffer[len(data):]
+        self._remaining -= len(data)
+        self._on_body(data)
+        if not self._remaining:
+            self._finish()
+        return True
+
+    def _parse_chunk_size(self):
+        end = self._buffer.find(b'\r\n')
+        if end == -1:
+            return False
+        line = self._buffer[:end].split(b';', 1)[0]
+        self._buffer = self._buffer[end + 2:]
+        try:
+            self._remaining = int(line, 16)
+        except ValueError:
+            raise HTTPProtocolError("Invalid chunk size: %r" % (line,))
+        if self._remaining:
+            self._state = self._parse_chunk
+        else:
+            self._state = self._parse_trailers
+        return True
+
+    def _parse_chunk(self):
+        data = self._buffer[:self._remaining]
+        self._buffer = self._buffer[len(data):]
+        self._remaining -= len(data)
+        self._on_body(data)
+        if not self._remaining:
+            self._state = self._parse_chunk_end
+        return True
+
+    def _parse_chunk_end(self):
+        if len(self._buffer) < 2:
+            return False
+        self._buffer = self._buffer[2:]
+        self._state = self._parse_chunk_size
+        return True
+
+    def _parse_trailers(self):
+        if self._buffer.startswith(b'\r\n'):
+            self._buffer = self._buffer[2:]
+            self._finish()
+            return True
+        end = self._buffer.find(b'\r\n\r\n')
+        if end == -1:
+            return False
+        self._buffer = self._buffer[end + 4:]
+        self._finish()
+        return True
+
+    def _parse_until_close(self):
+        data, self._buffer = self._buffer, b''
+        self._on_body(data)
+        return True
+
+    def _finish(self):
+        self._state = None
+        self._on_complete(self._keep_alive and not self._buffer)
+        self._buffer = b''
+
+
+def _serialize_request(request, host_header):
+    parts = urlsplit(request.url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    lines = ['%s %s HTTP/1.1' % (request.method.upper(), path)]
+    headers = dict((name.lower(), value)
+                   for name, value in (request.headers or {}).items())
+    if 'host' not in headers:
+        lines.append('Host: %s' % (host_header,))
+    if request.data is not None and 'content-length' not in headers:
+        lines.append('Content-Length: %d' % (len(request.data),))
+    for name, value in (request.headers or {}).items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for value in values:
+            lines.append('%s: %s' % (name, value))
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
+    return head + (request.data or b'')
+
+
+class _Connection(object):
+    """A connection to an HTTP server, which makes one request at a time."""
+
+    def __init__(self, loop, sock, host):
+        self._loop = loop
+        self._sock = sock
+        self.host = host
+        self.requests = 0
+        self._outgoing = b''
+        self._parser = None
+        self._done = None
+
+    def request(self, request, on_headers, on_body, done):
+        """
+        Send a request. ``done(is_error, reusable, exc_info, received)`` is
+        called once the whole response has been received, or the request has
+        failed; ``received`` says whether any of the response arrived before
+        a failure.
+        """
+        self.requests += 1
+        self._done = done
+        self._parser = _ResponseParser(request.method, on_headers, on_body,
+                                       self._complete)
+        self._outgoing = _serialize_request(request, self.host.host_header)
+        self._loop.add_writer(self._sock, self._write)
+        self._loop.add_reader(self._sock, self._read)
+
+    def _write(self):
+        if self._sock is None:
+            return
+        try:
+            sent = self._sock.send(self._outgoing)
+        except (IOError, OSError) as e:
+            if e.errno not in _WOULD_BLOCK:
+                self._fail(sys.exc_info())
+            return
+        self._outgoing = self._outgoing[sent:]
+        if not self._outgoing:
+            self._loop.remove_writer(self._sock)
+
+    def _read(self):
+        if self._sock is None:
+            return
+        try:
+            data = self._sock.recv(65536)
+        except (IOError, OSError) as e:
+            if e.errno not in _WOULD_BLOCK:
+                self._fail(sys.exc_info())
+            return
+        try:
+            if data:
+                self._parser.feed(data)
+            elif not self._parser.eof():
+                raise HTTPProtocolError(
+                    "Connection closed before the response was complete")
+        except Exception:
+            self._fail(sys.exc_info())
+
+    def _complete(self, reusable):
+        self._loop.remove_reader(self._sock)
+        self._loop.remove_writer(self._sock)
+        if not reusable:
+            self.close()
+        done, self._done = self._done, None
+        self._parser = None
+        done(False, reusable, None, True)
+
+    def _fail(self, exc_info):
+        received = self._parser.received
+        self.close()
+        done, self._done = self._done, None
+        self._parser = None
+        done(True, False, exc_info, received)
+
+    def pause_reading(self):
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock)
+
+    def resume_reading(self):
+        if self._sock is not None:
+            self._loop.add_reader(self._sock, self._read)
+
+    def abort(self):
+        """Give up on the current response, and close the connection."""
+        try:
+            raise HTTPProtocolError("Response aborted")
+        except HTTPProtocolError:
+            self._fail(sys.exc_info())
+
+    def close(self):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock)
+        self._loop.remove_writer(self._sock)
+        self._sock.close()
+        self._sock = None
+
+
+_POOL_INTENTS = frozenset([HTTPRequest, StreamingHTTPRequest, ReadBody,
+                           CloseBody])
+
+
+class _Host(object):
+    """The connections and queued requests for one (host, port)."""
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.host_header = host if port == 80 else '%s:%d' % (host, port)
+        self.idle = []
+        self.open = 0
+        self.active = 0
+        self.queue = PriorityQueue()
+
+
+class HTTPConnectionPool(object):
+    """
+    A dispatcher which performs :class:`HTTPRequest`,
+    :class:`StreamingHTTPRequest`, :class:`ReadBody` and :class:`CloseBody`
+    intents with an :class:`effect.loop.EventLoop`, reusing connections to
+    each host.
+
+    Other intents fail with :class:`effect.NoEffectHandlerError`, so this is
+    usually wrapped in a dispatcher that passes it only those intents, such
+    as a :class:`effect.compose.ComposedDispatcher`, which uses
+    :meth:`lookup` to find out which they are.
+
+    Idle connections aren't watched by the loop, so they don't stop
+    :func:`effect.loop.EventLoop.run` from returning. If a server has closed
+    an idle connection by the time it's reused, an idempotent request (GET,
+    HEAD, OPTIONS, PUT, DELETE or TRACE) is retried on another connection;
+    others fail, since the server may have acted on them.
+    """
+
+    def __init__(self, loop, max_per_host=4, high_water=65536):
+        """
+        :param loop: The :class:`effect.loop.EventLoop` to do I/O with.
+        :param max_per_host: The most connections to have open to any one
+            host at once.
+        :param high_water: How many bytes of a :class:`BodyStream` to buffer
+            before pausing reading from its connection.
+        """
+        self.loop = loop
+        self.max_per_host = max_per_host
+        self.high_water = high_water
+        self._hosts = {}
+        self._connections_opened = 0
+        self._requests = 0
+        self._reused = 0
+
+    def lookup(self, intent_type):
+        """
+        Return a performer for the intents this pool handles, or None. See
+        :mod:`effect.compose`. The pool also handles
+        :class:`effect.priority.WithPriority` intents wrapping those intents.
+        """
+        if intent_type in _POOL_INTENTS or intent_type is WithPriority:
+            return self._perform
+        return None
+
+    def _perform(self, dispatcher, intent, box):
+        self(intent, box)
+
+    def __call__(self, intent, box):
+        priority = None
+        if type(intent) is WithPriority:
+            priority, intent = intent.priority, intent.intent
+        if type(intent) is ReadBody:
+            intent.stream._read(box)
+            return
+        elif type(intent) is CloseBody:
+            intent.stream._close(box)
+            return
+        elif type(intent) is StreamingHTTPRequest:
+            self._stream(intent, box, priority)
+            return
+        elif type(intent) is not HTTPRequest:
+            box.fail((NoEffectHandlerError, NoEffectHandlerError(intent),
+                      None))
+            return
+        response = []
+        body = []
+
+        def on_headers(code, reason, headers):
+            response[:] = [code, reason, headers]
+
+        def done(is_error, exc_info):
+            if is_error:
+                box.fail(exc_info)
+            else:
+                box.succeed(HTTPResponse(response[0], response[1],
+                                         response[2], b''.join(body)))
+
+        self.request(intent, on_headers, body.append, done,
+                     priority=priority)
+
+    def _stream(self, intent, box, priority):
+        stream = BodyStream(self.high_water)
+        started = []
+
+        def on_headers(code, reason, headers):
+            started.append(True)
+            box.succeed(HTTPResponse(code, reason, headers, stream))
+
+        def done(is_error, exc_info):
+            if not started:
+                box.fail(exc_info)
+            else:
+                stream._finish(exc_info if is_error else None)
+
+        self.request(intent, on_headers, stream._feed, done, stream,
+                     priority)
+
+    def request(self, request, on_headers, on_body, done, stream=None,
+                priority=None):
+        """
+        Make a request, calling ``on_headers(code, reason, headers)`` once the
+        response's head has been received, ``on_body(data)`` with each piece
+        of the body, and ``done(is_error, exc_info)`` once the response has
+        been received or the request has failed.
+
+        This is the lower-level interface used by the dispatcher; it's useful
+        for performers that want to process the body as it arrives. If a
+        :class:`BodyStream` is passed, it's attached to the connection the
+        request is sent on, so that it can pause reading.
+
+        Requests waiting for a connection are sent highest priority first;
+        ``priority`` defaults to the request's own priority class. Requests
+        whose priority isn't one of :data:`effect.priority.PRIORITIES` fail
+        with ValueError.
+        """
+        try:
+            parts = urlsplit(request.url)
+            if parts.scheme.lower() != 'http':
+                raise ValueError("Only http URLs are supported, not %r"
+                                 % (request.url,))
+            key = (parts.hostname, parts.port or 80)
+            if priority is None:
+                priority = priority_of(request)
+            else:
+                check_priority(priority)
+        except Exception:
+            done(True, sys.exc_info())
+            return
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(*key)
+        self._requests += 1
+        host.queue.push((request, on_headers, on_body, done, stream, priority),
+                        priority)
+        self._service(host)
+
+    def _service(self, host):
+        while host.queue:
+            if host.idle:
+                connection = host.idle.pop()
+            elif host.open < self.max_per_host:
+                connection = self._connect(host)
+                if connection is None:
+                    continue
+            else:
+                return
+            self._send(host, connection, *host.queue.pop())
+
+    def _connect(self, host):
+        """
+        Start connecting to the host. If that fails immediately, the first
+        queued request fails and None is returned.
+        """
+        sock = None
+        try:
+            family, type_, proto, _, address = socket.getaddrinfo(
+                host.address[0], host.address[1], 0, socket.SOCK_STREAM)[0]
+            sock = socket.socket(family, type_, proto)
+            sock.setblocking(False)
+            if family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            error = sock.connect_ex(address)
+            if error and error not in _CONNECTING:
+                raise socket.error(error, errno.errorcode.get(error, ''))
+        except Exception:
+            if sock is not None:
+                sock.close()
+            done = host.queue.pop()[3]
+            done(True, sys.exc_info())
+            return None
+        host.open += 1
+        self._connections_opened += 1
+        return _Connection(self.loop, sock, host)
+
+    def _send(self, host, connection, request, on_headers, on_body, done,
+              stream, priority):
+        if stream is not None:
+            stream._connection = connection
+        if connection.requests:
+            self._reused += 1
+        host.active += 1
+
+        def finished(is_error, reusable, exc_info, received):
+            host.active -= 1
+            if reusable:
+                host.idle.append(connection)
+            else:
+                host.open -= 1
+            stale = is_error and not received and connection.requests > 1
+            if stale and request.method.upper() in _IDEMPOTENT:
+                # The server probably closed this connection while it was
+                # idle; try again. Each retry either uses up another idle
+                # connection or opens a new one, so this can't go on forever.
+                host.queue.push_front(
+                    (request, on_headers, on_body, done, stream, priority),
+                    priority)
+                self._service(host)
+                return
+            self._service(host)
+            done(is_error, exc_info)
+
+        connection.request(request, on_headers, on_body, finished)
+
+    def stats(self):
+        """
+        Return a dict of statistics about the pool:
+
+        - ``requests``: requests made through the pool
+        - ``connections_opened``: connections opened
+        - ``reused``: requests sent on a connection that was already used
+        - ``open``: connections currently open
+        - ``active``: connections currently busy with a request
+        - ``idle``: connections currently waiting to be reused
+        - ``queued``: requests waiting for a connection
+        """
+        hosts = self._hosts.values()
+        return {
+            'requests': self._requests,
+            'connections_opened': self._connections_opened,
+            'reused': self._reused,
+            'open': sum(h.open for h in hosts),
+            'active': sum(h.active for h in hosts),
+            'idle': sum(len(h.idle) for h in hosts),
+            'queued': sum(len(h.queue) for h in hosts),
+        }
+
+    def close(self):
+        """Close all idle connections."""
+        for host in self._hosts.values():
+            for connection in host.idle:
+                connection.close()
+            host.open -= len(host.idle)
+            host.idle = []
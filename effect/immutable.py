@@ -0,0 +1,212 @@
+"""
+Immutable intents, whose hash is computed only once.
+
+Intents are hashed and compared whenever they're used as dictionary keys,
+by caches and deduplication, and whenever tests compare them.
+:func:`immutable` is a drop-in alternative to ``characteristic.attributes``
+for intent classes which makes that cheap::
+
+    @immutable(['method', 'url'], intern=True)
+    class HTTPGet(object):
+        def perform_effect(self, dispatcher):
+            ...
+
+    HTTPGet('GET', 'http://example.com/') is HTTPGet(
+        'GET', 'http://example.com/')
+
+Instances can't be changed once they're made, so their hash is computed
+once, when they're made, rather than every time they're hashed, and
+equality is checked by identity first, and then by hash, before comparing
+attributes.
+
+Interned classes go further: constructing an instance equal to one that
+already exists returns the existing one, so millions of identical intents
+take the memory of one, and equal instances are usually compared by
+identity alone. Attributes, and the items of tuples and frozensets in them,
+have to be of the same types, as well as equal, for instances to be the
+same, so ``HTTPGet('GET', 1)`` and ``HTTPGet('GET', 1.0)`` are different
+instances, although they're equal, as they would be if they weren't
+interned. Interned instances are held weakly, and are forgotten when nothing
+else refers to them.
+"""
+
+from __future__ import absolute_import
+
+import operator
+import threading
+import weakref
+
+
+_set = object.__setattr__
+
+
+def immutable(names, defaults=None, intern=False):
+    """
+    A class decorator which makes instances of a class immutable, with the
+    named attributes, which are passed to the constructor by position or by
+    name. Instances compare, order and hash like tuples of the attributes,
+    but only with instances of the same class, and have a repr like
+    ``<Name(a=1, b=2)>``.
+
+    The class must not define ``__init__`` or ``__new__`` itself.
+
+    :param names: A list of attribute names.
+    :param defaults: An optional dict mapping attribute names to the values
+        they get when they're not passed.
+    :param intern: If true, constructing an instance whose attributes are
+        equal to, and of the same types as (down through tuples and
+        frozensets), those of an existing one of the same class returns the
+        existing one. Instances with unhashable
+        attributes aren't interned.
+    """
+    names = tuple(names)
+    defaults = defaults or {}
+
+    def wrap(cls):
+        table = weakref.WeakValueDictionary() if intern else None
+        # Makes looking up and adding an instance atomic, so no two threads
+        # make equal instances.
+        lock = threading.Lock()
+
+        def __new__(klass, *args, **kwargs):
+            if kwargs or len(args) != len(names):
+                values = _values(klass, names, defaults, args, kwargs)
+            else:
+                values = args
+            try:
+                hash_ = hash(values)
+            except TypeError:
+                hash_ = None
+            interning = (
+                table is not None and klass is cls and hash_ is not None)
+            if not interning:
+                return _make(klass, names, values, hash_)
+            # True, 1 and 1.0 are equal, but mustn't be given for each other.
+            key = (values, _types(values))
+            with lock:
+                self = table.get(key)
+                if self is None:
+                    self = table[key] = _make(klass, names, values, hash_)
+            return self
+
+        cls.__new__ = staticmethod(__new__)
+        cls.__init__ = _init
+        cls.__setattr__ = _setattr
+        cls.__delattr__ = _delattr
+        cls.__eq__ = _eq
+        cls.__ne__ = _ne
+        for method, op in [('__lt__', operator.lt), ('__le__', operator.le),
+                           ('__gt__', operator.gt), ('__ge__', operator.ge)]:
+            setattr(cls, method, _ordering(op))
+        cls.__hash__ = _hash
+        cls.__repr__ = _repr
+        cls.__reduce__ = _reduce
+        cls._effect_names = names
+        return cls
+    return wrap
+
+
+def _types(value):
+    """
+    Return the type of a value, or for tuples and frozensets, the types of
+    their items too, for telling apart equal values of different types.
+    """
+    value_type = type(value)
+    if value_type is tuple:
+        types = tuple(map(type, value))
+        if tuple in types or frozenset in types:
+            return tuple(map(_types, value))
+        return types
+    if value_type is frozenset:
+        return frozenset((item, _types(item)) for item in value)
+    return value_type
+
+
+def _make(cls, names, values, hash_):
+    self = object.__new__(cls)
+    # Setting the attributes in the same order every time lets instances
+    # share their attribute dict's keys.
+    for name, value in zip(names, values):
+        _set(self, name, value)
+    _set(self, '_effect_values', values)
+    _set(self, '_effect_hash', hash_)
+    return self
+
+
+def _values(cls, names, defaults, args, kwargs):
+    """Bind constructor arguments to a tuple of attribute values."""
+    if len(args) > len(names):
+        raise TypeError("%s takes at most %d arguments (%d given)"
+                        % (cls.__name__, len(names), len(args)))
+    values = list(args)
+    for name in names[len(args):]:
+        if name in kwargs:
+            values.append(kwargs.pop(name))
+        elif name in defaults:
+            values.append(defaults[name])
+        else:
+            raise TypeError("%s missing argument %r" % (cls.__name__, name))
+    if kwargs:
+        raise TypeError("%s got unexpected arguments %s"
+                        % (cls.__name__, ", ".join(sorted(kwargs))))
+    return tuple(values)
+
+
+def _init(self, *args, **kwargs):
+    # Everything was done by __new__, which may have returned an existing
+    # instance.
+    pass
+
+
+def _setattr(self, name, value):
+    raise AttributeError("%s instances are immutable"
+                         % (self.__class__.__name__,))
+
+
+def _delattr(self, name):
+    raise AttributeError("%s instances are immutable"
+                         % (self.__class__.__name__,))
+
+
+def _eq(self, other):
+    if self is other:
+        return True
+    if other.__class__ is not self.__class__:
+        return NotImplemented
+    if self._effect_hash != other._effect_hash:
+        return False
+    return self._effect_values == other._effect_values
+
+
+def _ne(self, other):
+    result = _eq(self, other)
+    if result is NotImplemented:
+        return result
+    return not result
+
+
+def _ordering(op):
+    def compare(self, other):
+        if other.__class__ is self.__class__:
+            return op(self._effect_values, other._effect_values)
+        return NotImplemented
+    return compare
+
+
+def _hash(self):
+    hash_ = self._effect_hash
+    if hash_ is None:
+        # Raise the TypeError for the unhashable attribute.
+        return hash(self._effect_values)
+    return hash_
+
+
+def _repr(self):
+    return "<%s(%s)>" % (
+        self.__class__.__name__,
+        ", ".join("%s=%r" % (name, value) for name, value in zip(
+            self._effect_names, self._effect_values)))
+
+
+def _reduce(self):
+    return (self.__class__, self._effect_values)
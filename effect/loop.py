@@ -0,0 +1,332 @@
+"""
+A small, reactor-free event loop for performing effects concurrently.
+
+This lets you run many effect trees at once -- with :obj:`Delay`,
+:obj:`ParallelEffects` and waiting for sockets to become readable or writable
+all handled natively -- without depending on Twisted. It's meant for
+lightweight services and command-line tools; if you're already using Twisted,
+use :mod:`effect.twisted` instead.
+
+The main entry points are :func:`run`, which performs a single effect and
+returns its result (like :func:`effect.sync_perform`, but allowing
+concurrency), and :func:`perform`, which queues an effect on an
+:class:`EventLoop` so that many effects can be run with
+:func:`EventLoop.run`.
+
+On Python 2, this module needs the ``selectors34`` backport.
+"""
+
+from __future__ import absolute_import
+
+import heapq
+import itertools
+import sys
+import time
+
+from collections import deque
+from functools import partial
+
+from characteristic import attributes
+
+import six
+
+try:
+    import selectors
+except ImportError:
+    import selectors34 as selectors
+
+from . import (
+    Delay, ParallelEffects, dispatch_method, perform as base_perform, stats)
+from .fan_out import fan_out
+
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _Timer(object):
+    """A handle for a call scheduled with :func:`EventLoop.call_later`."""
+
+    def __init__(self, when, f, args):
+        self.when = when
+        self.f = f
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevent the call from happening, if it hasn't already."""
+        self.cancelled = True
+        self.f = self.args = None
+
+
+class EventLoop(object):
+    """
+    A minimal event loop, consisting of a run queue of functions to call
+    soon, a heap of timers, and a :mod:`selectors` selector for waiting for
+    file descriptors to become ready.
+    """
+
+    def __init__(self, clock=_monotonic, selector=None):
+        """
+        :param clock: A function returning the current time in seconds.
+        :param selector: A :class:`selectors.BaseSelector`. Defaults to a
+            new :class:`selectors.DefaultSelector`.
+        """
+        self.clock = clock
+        if selector is None:
+            selector = selectors.DefaultSelector()
+        self._selector = selector
+        self._ready = deque()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._stopped = False
+        self._waiting = {}
+
+    def call_soon(self, f, *args):
+        """Call f with args on the next iteration of the loop."""
+        self._ready.append((f, args))
+
+    def call_later(self, delay, f, *args):
+        """
+        Call f with args after at least ``delay`` seconds have passed.
+
+        :return: A timer with a ``cancel`` method.
+        """
+        timer = _Timer(self.clock() + delay, f, args)
+        heapq.heappush(self._timers,
+                       (timer.when, next(self._sequence), timer))
+        return timer
+
+    def add_reader(self, fileobj, f, *args):
+        """Call f with args every time fileobj is readable."""
+        self._add_handler(fileobj, selectors.EVENT_READ, (f, args))
+
+    def add_writer(self, fileobj, f, *args):
+        """Call f with args every time fileobj is writable."""
+        self._add_handler(fileobj, selectors.EVENT_WRITE, (f, args))
+
+    def remove_reader(self, fileobj):
+        """Stop watching fileobj for readability."""
+        self._remove_handler(fileobj, selectors.EVENT_READ)
+
+    def remove_writer(self, fileobj):
+        """Stop watching fileobj for writability."""
+        self._remove_handler(fileobj, selectors.EVENT_WRITE)
+
+    def _add_handler(self, fileobj, event, handler):
+        try:
+            key = self._selector.get_key(fileobj)
+        except KeyError:
+            handlers = {event: handler}
+            self._selector.register(fileobj, event, handlers)
+        else:
+            key.data[event] = handler
+            self._selector.modify(fileobj, key.events | event, key.data)
+
+    def _remove_handler(self, fileobj, event):
+        try:
+            key = self._selector.get_key(fileobj)
+        except KeyError:
+            return
+        key.data.pop(event, None)
+        events = key.events & ~event
+        if events:
+            self._selector.modify(fileobj, events, key.data)
+        else:
+            self._selector.unregister(fileobj)
+
+    def stop(self):
+        """Make :func:`run` return after the current iteration."""
+        self._stopped = True
+
+    def run(self):
+        """
+        Run the loop until there is nothing left to do -- no queued calls,
+        pending timers or watched file descriptors -- or until :func:`stop`
+        is called.
+        """
+        self._stopped = False
+        while not self._stopped and (
+                self._ready or self._timers or self._selector.get_map()):
+            self._run_once()
+
+    def _run_once(self):
+        timers = self._timers
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+
+        if self._ready:
+            timeout = 0
+        elif timers:
+            timeout = max(0, timers[0][0] - self.clock())
+        else:
+            timeout = None
+
+        if self._selector.get_map():
+            for key, events in self._selector.select(timeout):
+                for event in (selectors.EVENT_READ, selectors.EVENT_WRITE):
+                    if events & event and event in key.data:
+                        self._ready.append(key.data[event])
+        elif timeout:
+            time.sleep(timeout)
+
+        now = self.clock()
+        while timers and timers[0][0] <= now:
+            timer = heapq.heappop(timers)[2]
+            if not timer.cancelled:
+                self._ready.append((timer.f, timer.args))
+
+        # Only run what's ready now; anything queued by these calls waits
+        # for the next iteration, so timers and I/O can't be starved.
+        ready = self._ready
+        for _ in range(len(ready)):
+            f, args = ready.popleft()
+            f(*args)
+
+
+@attributes(['fileobj'], apply_with_init=False)
+class WaitReadable(object):
+    """
+    An intent that results in None once the given file object (anything with
+    a ``fileno`` method, or a file descriptor) is readable. Any number of
+    these may wait for the same file object at once.
+
+    Only :func:`loop_dispatcher` knows how to perform this intent.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+
+@attributes(['fileobj'], apply_with_init=False)
+class WaitWritable(object):
+    """
+    An intent that results in None once the given file object (anything with
+    a ``fileno`` method, or a file descriptor) is writable. Any number of
+    these may wait for the same file object at once.
+
+    Only :func:`loop_dispatcher` knows how to perform this intent.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+
+def loop_dispatcher(loop, intent, box):
+    """
+    Very similar to :func:`effect.default_dispatcher`, except that these
+    intents are performed natively with the given :class:`EventLoop`:
+
+    - :obj:`ParallelEffects`, with :func:`perform_parallel`,
+    - :obj:`Delay`, with a timer,
+    - :obj:`WaitReadable` and :obj:`WaitWritable`, with the loop's selector.
+    """
+    dispatcher = partial(loop_dispatcher, loop)
+    if type(intent) is ParallelEffects:
+        perform_parallel(intent, dispatcher, box)
+    elif type(intent) is Delay:
+        runtime = stats.current
+        if runtime is None:
+            loop.call_later(intent.delay, box.succeed, None)
+        else:
+            runtime.delays_pending += 1
+            loop.call_later(intent.delay, _delay_fired, runtime, box)
+    elif type(intent) is WaitReadable:
+        _wait(loop, selectors.EVENT_READ, intent.fileobj, box)
+    elif type(intent) is WaitWritable:
+        _wait(loop, selectors.EVENT_WRITE, intent.fileobj, box)
+    else:
+        try:
+            box.succeed(dispatch_method(intent, dispatcher))
+        except:
+            box.fail(sys.exc_info())
+
+
+def _delay_fired(runtime, box):
+    runtime.delays_pending -= 1
+    box.succeed(None)
+
+
+def _wait(loop, event, fileobj, box):
+    # A file descriptor has only one handler per event, so every intent
+    # waiting for the same one is woken by it.
+    try:
+        key = (_fileno(fileobj), event)
+    except:
+        box.fail(sys.exc_info())
+        return
+    boxes = loop._waiting.get(key)
+    if boxes is not None:
+        boxes.append(box)
+        return
+    boxes = loop._waiting[key] = [box]
+    if event == selectors.EVENT_READ:
+        add, remove = loop.add_reader, loop.remove_reader
+    else:
+        add, remove = loop.add_writer, loop.remove_writer
+
+    def ready():
+        remove(fileobj)
+        del loop._waiting[key]
+        for box in boxes:
+            box.succeed(None)
+    try:
+        add(fileobj, ready)
+    except:
+        del loop._waiting[key]
+        box.fail(sys.exc_info())
+
+
+def _fileno(fileobj):
+    if isinstance(fileobj, six.integer_types):
+        return fileobj
+    return fileobj.fileno()
+
+
+def perform_parallel(parallel, dispatcher, box):
+    """
+    Perform a ParallelEffects intent by performing all of the child effects
+    with the given dispatcher, and succeeding the box with a list of their
+    results once they've all completed. See :func:`effect.fan_out.fan_out`.
+
+    If any child fails, the box is failed with that child's exception, and
+    the results of the other children are ignored.
+    """
+    fan_out(parallel, dispatcher, box)
+
+
+def perform(loop, effect, dispatcher=loop_dispatcher):
+    """
+    Queue an effect to be performed when the given :class:`EventLoop` runs.
+    Attach callbacks to the effect to find out about its result.
+
+    Defaults to using :func:`loop_dispatcher` as the dispatcher.
+    """
+    loop.call_soon(base_perform, effect, partial(dispatcher, loop))
+
+
+def run(effect, dispatcher=loop_dispatcher, loop=None):
+    """
+    Perform an effect on an :class:`EventLoop`, run the loop until the
+    effect completes, and return its ultimate result. If the final result is
+    an error, the exception will be raised.
+
+    :param loop: The loop to use. Defaults to a new :class:`EventLoop`.
+    """
+    if loop is None:
+        loop = EventLoop()
+    results = []
+
+    def finished(is_error, result):
+        results.append((is_error, result))
+        loop.stop()
+
+    perform(loop,
+            effect.on(success=partial(finished, False),
+                      error=partial(finished, True)),
+            dispatcher=dispatcher)
+    loop.run()
+    if not results:
+        raise RuntimeError("The event loop ran out of work before %r "
+                           "completed" % (effect,))
+    is_error, result = results[0]
+    if is_error:
+        six.reraise(*result)
+    return result
@@ -0,0 +1,262 @@
+"""
+Priority classes for intents, honored by dispatchers that limit concurrency.
+
+An intent's priority class is its ``priority`` attribute if it has one and
+it isn't None, or :data:`NORMAL`. A priority class is one of the ints in
+:data:`PRIORITIES`; dispatchers fail intents with any other priority with
+ValueError. Any effect can be given a priority class with
+:func:`with_priority`, which wraps its intent in a :class:`WithPriority`::
+
+    from effect.priority import HIGH, with_priority
+    eff = with_priority(Effect(HTTPRequest('get', url)), HIGH)
+
+Priority only matters where intents have to wait for each other:
+:class:`BoundedDispatcher` performs a limited number of intents at once, and
+:class:`effect.http.HTTPConnectionPool` a limited number of requests per host.
+Intents queued in those are started highest priority first, so under load
+user-facing work doesn't wait behind bulk background work.
+
+Strict priority would let a steady stream of high priority intents keep lower
+priority ones waiting forever, so a :class:`PriorityQueue` serves one item
+from a waiting class once ``starvation_limit`` items of higher classes have
+been served ahead of it. Background work keeps progressing at no less than
+about one item in every ``starvation_limit + 1``.
+"""
+
+from __future__ import absolute_import
+
+import sys
+
+from collections import deque
+
+from characteristic import attributes
+
+from . import Effect
+
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+PRIORITIES = (HIGH, NORMAL, LOW)
+
+
+@attributes(['intent', 'priority'], apply_with_init=False)
+class WithPriority(object):
+    """
+    An intent which is another intent, performed with the given priority
+    class. Dispatchers that know about priority unwrap it; others perform the
+    wrapped intent as it is, since this intent results in an Effect of it.
+    """
+
+    def __init__(self, intent, priority):
+        """
+        :param intent: The intent to perform.
+        :param priority: One of :data:`PRIORITIES`.
+        """
+        self.intent = intent
+        self.priority = priority
+
+    def perform_effect(self, dispatcher):
+        return Effect(self.intent)
+
+
+def with_priority(effect, priority):
+    """
+    Return an Effect like the given one, but whose intent is performed with
+    the given priority class.
+    """
+    return Effect(WithPriority(effect.intent, priority),
+                  callbacks=effect.callbacks)
+
+
+def check_priority(priority):
+    """
+    Return a priority class, if it's one of :data:`PRIORITIES`.
+
+    :raise ValueError: If it isn't.
+    """
+    if type(priority) is not int or not HIGH <= priority <= LOW:
+        raise ValueError("Not a priority class: %r" % (priority,))
+    return priority
+
+
+def priority_of(intent):
+    """
+    Return the priority class of an intent: its ``priority`` attribute, or
+    :data:`NORMAL` if it doesn't have one or it's None.
+
+    :raise ValueError: If the attribute isn't one of :data:`PRIORITIES`.
+    """
+    priority = getattr(intent, 'priority', None)
+    return NORMAL if priority is None else check_priority(priority)
+
+
+def unwrap(intent):
+    """
+    Return an intent's priority class and the intent to actually perform,
+    unwrapping a :class:`WithPriority`.
+
+    :raise ValueError: If the priority isn't one of :data:`PRIORITIES`.
+    """
+    if type(intent) is WithPriority:
+        return check_priority(intent.priority), intent.intent
+    return priority_of(intent), intent
+
+
+class PriorityQueue(object):
+    """
+    A FIFO queue for each priority class, from which the highest priority
+    item is taken first, except that a class that's been passed over
+    ``starvation_limit`` times in a row is served next.
+    """
+
+    def __init__(self, starvation_limit=16):
+        """
+        :param int starvation_limit: How many items may be served ahead of a
+            waiting item of a lower priority class before one of that class
+            is served.
+        """
+        self.starvation_limit = starvation_limit
+        self._queues = [deque() for _ in PRIORITIES]
+        self._passed = [0] * len(PRIORITIES)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def push(self, item, priority=NORMAL):
+        """
+        Add an item to the back of its priority class's queue.
+
+        :raise ValueError: If the priority isn't one of :data:`PRIORITIES`.
+        """
+        self._queues[check_priority(priority)].append(item)
+        self._length += 1
+
+    def push_front(self, item, priority=NORMAL):
+        """
+        Add an item to the front of its priority class's queue, for an item
+        that was taken and has to be put back.
+        """
+        self._queues[check_priority(priority)].appendleft(item)
+        self._length += 1
+
+    def pop(self):
+        """
+        Remove and return the next item to be served.
+
+        :raise IndexError: If the queue is empty.
+        """
+        if not self._length:
+            raise IndexError("pop from an empty PriorityQueue")
+        queues = self._queues
+        passed = self._passed
+        chosen = None
+        for priority, queue in enumerate(queues):
+            if queue and passed[priority] >= self.starvation_limit:
+                chosen = priority
+                break
+        if chosen is None:
+            for priority, queue in enumerate(queues):
+                if queue:
+                    chosen = priority
+                    break
+        passed[chosen] = 0
+        for priority in range(chosen + 1, len(queues)):
+            if queues[priority]:
+                passed[priority] += 1
+        self._length -= 1
+        return queues[chosen].popleft()
+
+    def lengths(self):
+        """Return a list of the number of items queued in each class."""
+        return [len(queue) for queue in self._queues]
+
+
+class _Released(object):
+    """
+    The box a :class:`BoundedDispatcher` dispatches with, which frees the
+    intent's place once it has a result.
+    """
+
+    __slots__ = ('_bounded', '_box', '_done')
+
+    def __init__(self, bounded, box):
+        self._bounded = bounded
+        self._box = box
+        self._done = False
+
+    def succeed(self, result):
+        if self._release():
+            self._box.succeed(result)
+
+    def fail(self, exc_info):
+        if self._release():
+            self._box.fail(exc_info)
+
+    def _release(self):
+        if self._done:
+            return False
+        self._done = True
+        self._bounded._finished()
+        return True
+
+
+class BoundedDispatcher(object):
+    """
+    A dispatcher which performs intents with another dispatcher, no more than
+    ``limit`` at a time. Intents beyond the limit wait in a
+    :class:`PriorityQueue` until others finish.
+
+    Use it for the intents that compete for a limited resource, e.g.
+    ``parallel`` requests to a backend that shouldn't get more than a few at
+    once, by routing only those intents to it.
+
+    Intents whose priority isn't one of :data:`PRIORITIES` fail with
+    ValueError.
+    """
+
+    def __init__(self, dispatcher, limit, starvation_limit=16):
+        """
+        :param dispatcher: The dispatcher to perform intents with.
+        :param int limit: How many intents may be in progress at once.
+        :param int starvation_limit: See :class:`PriorityQueue`.
+        """
+        self.dispatcher = dispatcher
+        self.limit = limit
+        self.active = 0
+        self.queue = PriorityQueue(starvation_limit)
+        self._starting = False
+
+    def __call__(self, intent, box):
+        try:
+            priority, intent = unwrap(intent)
+        except ValueError:
+            box.fail(sys.exc_info())
+            return
+        self.queue.push((intent, box), priority)
+        self._start()
+
+    def _finished(self):
+        self.active -= 1
+        self._start()
+
+    def _start(self):
+        # Intents that complete synchronously call back into here; the loop
+        # that's already running starts the next ones, so the stack doesn't
+        # grow with the length of the queue.
+        if self._starting:
+            return
+        self._starting = True
+        try:
+            while self.queue and self.active < self.limit:
+                intent, box = self.queue.pop()
+                self.active += 1
+                box = _Released(self, box)
+                try:
+                    self.dispatcher(intent, box)
+                except:
+                    box.fail(sys.exc_info())
+        finally:
+            self._starting = False
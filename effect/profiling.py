@@ -0,0 +1,256 @@
+"""
+Profiling the callbacks of effects.
+
+Callbacks run synchronously, in whatever thread delivers the result of the
+effect they're attached to, so an expensive one -- parsing a large JSON
+response, say -- blocks everything else that thread would be doing, such as
+running the reactor. Intent latency doesn't show this. The callback profiler
+does.
+
+Profiling is off by default. Turn it on with::
+
+    from effect.profiling import enable_profiling
+    profiler = enable_profiling(threshold=0.05)
+
+and later::
+
+    print(profiler.report())
+
+Once enabled, every callback run by the interpreter (through
+:func:`effect.guard`) is timed, and its wall clock and CPU time are added to
+the totals for its qualified name: the module and qualified name of the
+function, with the line number for lambdas, so that callbacks defined in
+different places are told apart. Callbacks that take longer than the
+threshold are counted as slow, remembered, and passed to the ``on_slow``
+function, if one is given.
+
+Timing costs a few clock reads per callback. Like :mod:`effect.stats`, the
+totals aren't locked.
+"""
+
+from __future__ import absolute_import
+
+import time
+
+from collections import deque
+
+from .stats import Sample
+
+
+if hasattr(time, 'perf_counter'):
+    _wall_clock = time.perf_counter
+else:
+    _wall_clock = time.time
+
+if hasattr(time, 'thread_time'):
+    _cpu_clock = time.thread_time
+elif hasattr(time, 'process_time'):
+    _cpu_clock = time.process_time
+else:
+    _cpu_clock = time.clock
+
+
+def callback_name(f):
+    """
+    Return the name a callback's time is attributed to.
+    """
+    func = getattr(f, 'func', None)
+    if func is not None and hasattr(f, 'args'):
+        # A functools.partial.
+        return callback_name(func)
+    name = getattr(f, '__qualname__', None) or getattr(f, '__name__', None)
+    if name is None:
+        return repr(type(f))
+    module = getattr(f, '__module__', None)
+    if module is not None:
+        name = '%s.%s' % (module, name)
+    if name.endswith('<lambda>'):
+        code = getattr(f, '__code__', None)
+        if code is not None:
+            name = '%s:%d' % (name, code.co_firstlineno)
+    return name
+
+
+class CallbackStats(object):
+    """
+    The time spent in the callbacks with one name.
+
+    :ivar name: The callbacks' name.
+    :ivar calls: How many times they've been called.
+    :ivar wall: The total wall clock time spent in them, in seconds.
+    :ivar cpu: The total CPU time spent in them, in seconds.
+    :ivar max_wall: The longest they've taken.
+    :ivar slow: How many times they've taken longer than the threshold.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_wall = 0.0
+        self.slow = 0
+
+    def __repr__(self):
+        return ("CallbackStats(%r, calls=%r, wall=%r, cpu=%r, max_wall=%r, "
+                "slow=%r)" % (self.name, self.calls, self.wall, self.cpu,
+                              self.max_wall, self.slow))
+
+
+class CallbackProfiler(object):
+    """
+    Time spent in callbacks, by name.
+
+    :ivar callbacks: A dict mapping callback names to
+        :class:`CallbackStats`.
+    :ivar slow_calls: The most recent calls that took longer than the
+        threshold, as (name, wall clock seconds, CPU seconds) tuples.
+    """
+
+    def __init__(self, threshold=0.1, on_slow=None, keep_slow=100,
+                 clock=_wall_clock, cpu_clock=_cpu_clock):
+        """
+        :param threshold: The number of seconds after which a callback is
+            considered to have blocked for too long.
+        :param on_slow: An optional function to call with the name, wall
+            clock and CPU time of every slow call, e.g. to log it.
+        :param keep_slow: How many slow calls to keep in
+            :attr:`slow_calls`.
+        """
+        self.threshold = threshold
+        self.on_slow = on_slow
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.callbacks = {}
+        self.slow_calls = deque(maxlen=keep_slow)
+        # Names, by code object, so they needn't be worked out every call.
+        self._names = {}
+
+    def call(self, f, args, kwargs):
+        """
+        Call a callback, and record how long it took, whether it returns or
+        raises.
+        """
+        clock = self.clock
+        cpu_clock = self.cpu_clock
+        start = clock()
+        start_cpu = cpu_clock()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self.record(f, clock() - start, cpu_clock() - start_cpu)
+
+    def record(self, f, wall, cpu):
+        """Add a call of a callback that took the given time."""
+        code = getattr(f, '__code__', None)
+        if code is None:
+            name = callback_name(f)
+        else:
+            name = self._names.get(code)
+            if name is None:
+                name = self._names[code] = callback_name(f)
+        stats = self.callbacks.get(name)
+        if stats is None:
+            stats = self.callbacks[name] = CallbackStats(name)
+        stats.calls += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        if wall > stats.max_wall:
+            stats.max_wall = wall
+        if wall > self.threshold:
+            stats.slow += 1
+            self.slow_calls.append((name, wall, cpu))
+            if self.on_slow is not None:
+                self.on_slow(name, wall, cpu)
+
+    def top(self, limit=None):
+        """
+        Return the :class:`CallbackStats` of the callbacks that have taken
+        the most wall clock time in total, most first.
+
+        :param limit: How many to return. Defaults to all of them.
+        """
+        ranked = sorted(self.callbacks.values(),
+                        key=lambda stats: stats.wall, reverse=True)
+        return ranked[:limit]
+
+    def report(self, limit=20):
+        """
+        Return a table of the callbacks that have taken the most wall clock
+        time in total, as text.
+        """
+        lines = ['%10s %12s %12s %12s %6s  %s'
+                 % ('calls', 'wall (s)', 'cpu (s)', 'max wall (s)', 'slow',
+                    'callback')]
+        for stats in self.top(limit):
+            lines.append('%10d %12.6f %12.6f %12.6f %6d  %s'
+                         % (stats.calls, stats.wall, stats.cpu,
+                            stats.max_wall, stats.slow, stats.name))
+        return '\n'.join(lines) + '\n'
+
+    def samples(self):
+        """
+        Return a list of :class:`effect.stats.Sample`\\ s of the time spent
+        in each callback.
+        """
+        samples = []
+        for metric, kind, help, attribute in [
+                ('callback_calls_total', 'counter', 'Callbacks run, by name.',
+                 'calls'),
+                ('callback_wall_seconds_total', 'counter',
+                 'Wall clock time spent in callbacks, by name.', 'wall'),
+                ('callback_cpu_seconds_total', 'counter',
+                 'CPU time spent in callbacks, by name.', 'cpu'),
+                ('callback_slow_total', 'counter',
+                 'Callbacks that blocked for longer than the threshold, by '
+                 'name.', 'slow')]:
+            for name in sorted(self.callbacks):
+                samples.append(Sample(
+                    metric, kind, help,
+                    getattr(self.callbacks[name], attribute),
+                    {'callback': name}))
+        return samples
+
+    def export(self, exporter):
+        """
+        Pass the current samples to an exporter, such as
+        :func:`effect.stats.prometheus_text`, and return its result.
+        """
+        return exporter(self.samples())
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.callbacks = {}
+        self.slow_calls.clear()
+
+
+current = None
+
+
+def enable_profiling(profiler=None, **kwargs):
+    """
+    Start profiling callbacks in all threads.
+
+    :param profiler: The :class:`CallbackProfiler` to record into. Defaults
+        to a new one, made with any keyword arguments given.
+    :return: The :class:`CallbackProfiler` being recorded into.
+    """
+    global current
+    if profiler is None:
+        profiler = CallbackProfiler(**kwargs)
+    current = profiler
+    return profiler
+
+
+def disable_profiling():
+    """Stop profiling callbacks."""
+    global current
+    current = None
+
+
+def get_profiler():
+    """
+    Return the :class:`CallbackProfiler` being recorded into, or None if
+    profiling isn't enabled.
+    """
+    return current
@@ -0,0 +1,282 @@
+"""
+Recording the intents an application performs, and replaying them later.
+
+:class:`RecordingDispatcher` wraps a real dispatcher and appends every intent
+it performs, along with its outcome and timing, to a compact binary log.
+:class:`ReplayDispatcher` serves results from such a log without performing
+any real I/O, so that a production trace can be reproduced offline at full
+CPU speed for benchmarking and debugging.
+
+Intents and results are stored with :mod:`pickle`, so only picklable ones are
+recorded. Exceptions are stored without their tracebacks; those that can't be
+unpickled again (because their ``__init__`` needs arguments they don't pass
+on to ``Exception``, say) are stored as a :class:`RecordedError` instead.
+
+The log starts with a short header, followed by one record per performed
+intent::
+
+    >IIBdd  intent length, outcome length, is_error, start time, duration
+    intent  the pickled intent
+    outcome the pickled result or exception
+"""
+
+from __future__ import absolute_import
+
+import mmap
+import pickle
+import struct
+import sys
+import time
+
+from collections import deque
+
+from . import ParallelEffects
+from .fan_out import fan_out
+
+
+_MAGIC = b'EFFLOG\x00'
+_HEADER = struct.Struct('>7sB')
+_RECORD = struct.Struct('>IIBdd')
+
+
+class NotRecordedError(Exception):
+    """
+    A :class:`ReplayDispatcher` was asked to perform an intent that isn't in
+    its log (or that has already been replayed as many times as it was
+    recorded).
+    """
+
+
+class RecordedError(Exception):
+    """
+    Stands in for a recorded exception that couldn't be pickled and unpickled
+    again.
+
+    :ivar type_name: The qualified name of the original exception's type.
+    :ivar description: The repr of the original exception.
+    """
+
+    def __init__(self, type_name, description):
+        Exception.__init__(self, type_name, description)
+        self.type_name = type_name
+        self.description = description
+
+    def __str__(self):
+        return '%s: %s' % (self.type_name, self.description)
+
+
+def _dump_error(exception, protocol):
+    """
+    Pickle an exception, or a :class:`RecordedError` describing it if it
+    doesn't survive being pickled and unpickled.
+    """
+    try:
+        data = pickle.dumps(exception, protocol)
+        pickle.loads(data)
+        return data
+    except Exception:
+        exc_type = type(exception)
+        return pickle.dumps(
+            RecordedError('%s.%s' % (exc_type.__module__, exc_type.__name__),
+                          repr(exception)),
+            protocol)
+
+
+class Record(object):
+    """A single performed intent read from a log by :func:`read_log`."""
+
+    def __init__(self, intent, is_error, result, start, duration):
+        self.intent = intent
+        self.is_error = is_error
+        self.result = result
+        self.start = start
+        self.duration = duration
+
+    def __repr__(self):
+        return "Record(%r, is_error=%r, result=%r, start=%r, duration=%r)" % (
+            self.intent, self.is_error, self.result, self.start,
+            self.duration)
+
+
+class RecordingDispatcher(object):
+    """
+    A dispatcher which performs intents with another dispatcher, and appends
+    each intent, its outcome and how long it took to a log file.
+
+    Parallel effects are performed with :func:`effect.fan_out.fan_out`, with
+    this dispatcher, so that each of their children is recorded. Intents or
+    results that can't be pickled are performed as usual, but not recorded.
+    Exceptions that can't be are recorded as :class:`RecordedError`\\ s.
+    """
+
+    def __init__(self, log_file, dispatcher, clock=time.time,
+                 protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        :param log_file: A binary file object opened for appending. The
+            header is written if it's empty.
+        :param dispatcher: The dispatcher that actually performs intents.
+        :param clock: A function returning the current time in seconds.
+        """
+        self.log_file = log_file
+        self.dispatcher = dispatcher
+        self.clock = clock
+        self.protocol = protocol
+        if log_file.tell() == 0:
+            log_file.write(_HEADER.pack(_MAGIC, protocol))
+
+    def __call__(self, intent, box):
+        if type(intent) is ParallelEffects:
+            fan_out(intent, self, box)
+            return
+        self.dispatcher(intent, _RecordingBox(self, intent, box, self.clock()))
+
+    def _record(self, intent, is_error, result, start):
+        duration = self.clock() - start
+        try:
+            intent_bytes = pickle.dumps(intent, self.protocol)
+            if is_error:
+                outcome_bytes = _dump_error(result, self.protocol)
+            else:
+                outcome_bytes = pickle.dumps(result, self.protocol)
+        except Exception:
+            return
+        header = _RECORD.pack(len(intent_bytes), len(outcome_bytes),
+                              is_error, start, duration)
+        self.log_file.write(header + intent_bytes + outcome_bytes)
+
+
+class _RecordingBox(object):
+    """A box which records the outcome before passing it on."""
+
+    def __init__(self, recorder, intent, box, start):
+        self._recorder = recorder
+        self._intent = intent
+        self._box = box
+        self._start = start
+
+    def succeed(self, result):
+        self._recorder._record(self._intent, False, result, self._start)
+        self._box.succeed(result)
+
+    def fail(self, result):
+        self._recorder._record(self._intent, True, result[1], self._start)
+        self._box.fail(result)
+
+
+def _open_log(path):
+    with open(path, 'rb') as f:
+        log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, protocol = _HEADER.unpack_from(log, 0)
+    if magic != _MAGIC:
+        log.close()
+        raise ValueError("%r is not an effect log" % (path,))
+    return log, protocol
+
+
+def _scan(log):
+    """
+    Yield (intent_offset, intent_length, outcome_length, is_error, start,
+    duration) for every complete record in a mapped log.
+    """
+    offset = _HEADER.size
+    size = len(log)
+    while offset + _RECORD.size <= size:
+        intent_length, outcome_length, is_error, start, duration = (
+            _RECORD.unpack_from(log, offset))
+        offset += _RECORD.size
+        end = offset + intent_length + outcome_length
+        if end > size:
+            # A record that was only partly written; ignore it.
+            return
+        yield offset, intent_length, outcome_length, is_error, start, duration
+        offset = end
+
+
+def _load_outcome(data, is_error):
+    """
+    Unpickle an outcome. An exception that can't be unpickled (in a log
+    written before they were checked) is replaced by the one raised trying.
+    """
+    if not is_error:
+        return pickle.loads(data)
+    try:
+        return pickle.loads(data)
+    except Exception as e:
+        return e
+
+
+def read_log(path):
+    """
+    Return a list of all of the :class:`Record`\\ s in a log, in order.
+
+    The result of a failed intent whose exception can't be unpickled is the
+    exception raised trying.
+    """
+    log, protocol = _open_log(path)
+    try:
+        return [
+            Record(pickle.loads(log[offset:offset + intent_length]),
+                   bool(is_error),
+                   _load_outcome(
+                       log[offset + intent_length:
+                           offset + intent_length + outcome_length],
+                       is_error),
+                   start, duration)
+            for offset, intent_length, outcome_length, is_error, start,
+            duration in _scan(log)]
+    finally:
+        log.close()
+
+
+class ReplayDispatcher(object):
+    """
+    A dispatcher which performs intents by looking up their outcomes in a log
+    written by :class:`RecordingDispatcher`, without performing any real I/O
+    and without waiting for the recorded durations.
+
+    The log is memory-mapped, and only an index of where each intent's
+    outcomes are stored is kept in memory; outcomes are only unpickled when
+    they're replayed. Intents are matched by their pickled representation,
+    and if the same intent was recorded several times, its outcomes are
+    replayed in the order they were recorded.
+
+    Parallel effects are performed with :func:`effect.fan_out.fan_out`, with
+    this dispatcher, so that each of their children is replayed.
+
+    Intents which aren't in the log fail with :class:`NotRecordedError`, and
+    those whose outcome can't be unpickled fail with the exception raised
+    trying.
+    """
+
+    def __init__(self, path):
+        self._log, self.protocol = _open_log(path)
+        self._index = {}
+        for (offset, intent_length, outcome_length, is_error,
+             start, duration) in _scan(self._log):
+            key = self._log[offset:offset + intent_length]
+            self._index.setdefault(key, deque()).append(
+                (offset + intent_length, outcome_length, is_error))
+
+    def __call__(self, intent, box):
+        if type(intent) is ParallelEffects:
+            fan_out(intent, self, box)
+            return
+        try:
+            outcomes = self._index[pickle.dumps(intent, self.protocol)]
+            offset, length, is_error = outcomes.popleft()
+        except Exception:
+            box.fail((NotRecordedError, NotRecordedError(intent), None))
+            return
+        try:
+            result = pickle.loads(self._log[offset:offset + length])
+        except Exception:
+            box.fail(sys.exc_info())
+            return
+        if is_error:
+            box.fail((type(result), result, None))
+        else:
+            box.succeed(result)
+
+    def close(self):
+        """Unmap the log."""
+        self._log.close()
@@ -0,0 +1,336 @@
+"""
+Performing intents on a separate tier of worker processes.
+
+:class:`RPCDispatcher` is a dispatcher for :mod:`effect.loop` which pickles
+intents and sends them to a worker over a pool of persistent TCP or Unix
+socket connections. Requests are pipelined -- many can be outstanding on one
+connection at once -- and responses are matched back to the right box by
+request ID, so they can arrive in any order.
+
+:func:`serve` runs a worker, which performs the intents it receives with
+:func:`effect.default_dispatcher` (or any other dispatcher) and sends the
+outcomes back. A worker can be started from the command line with::
+
+    python -m effect.rpc /path/to/socket
+    python -m effect.rpc 127.0.0.1:8000
+
+Both ends need to be able to import the intents' classes, and the results
+and exceptions they produce. Exceptions are sent without their tracebacks.
+
+.. warning::
+
+   The worker unpickles whatever it's sent, and unpickling can run
+   arbitrary code, so anyone who can connect to a worker can run code as
+   the worker's user. Only listen on a Unix socket that only trusted users
+   can reach, or on a TCP address on a trusted interface, such as
+   ``127.0.0.1``. Never expose a worker to an untrusted network.
+
+Every message, in either direction, is a ``>QBI`` header (request ID, whether
+the result is an error, payload length) followed by a pickle.
+"""
+
+from __future__ import absolute_import, print_function
+
+import errno
+import pickle
+import socket
+import struct
+import sys
+import threading
+
+from . import Effect, default_dispatcher, perform
+
+
+_FRAME = struct.Struct('>QBI')
+_WOULD_BLOCK = frozenset([errno.EAGAIN, errno.EWOULDBLOCK])
+
+
+class RemoteError(Exception):
+    """
+    A worker failed with an exception (or produced a result) that couldn't be
+    pickled. The argument is its repr.
+    """
+
+
+class ConnectionLost(Exception):
+    """The connection to a worker was lost before it sent a response."""
+
+
+def _make_socket(address):
+    """
+    Make a socket suitable for the address: a string is the path of a Unix
+    socket, and a (host, port) tuple is a TCP address.
+    """
+    if isinstance(address, tuple):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+
+def _frames(buffer):
+    """
+    Yield (request_id, is_error, payload) for each complete message in a
+    bytearray, and remove them from it.
+    """
+    offset = 0
+    while len(buffer) - offset >= _FRAME.size:
+        request_id, is_error, length = _FRAME.unpack_from(buffer, offset)
+        end = offset + _FRAME.size + length
+        if len(buffer) < end:
+            break
+        yield request_id, is_error, bytes(buffer[offset + _FRAME.size:end])
+        offset = end
+    del buffer[:offset]
+
+
+def _dumps_outcome(is_error, result):
+    """Pickle a result or exception, substituting a RemoteError if needed."""
+    try:
+        return is_error, pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return True, pickle.dumps(RemoteError(repr(result)),
+                                  pickle.HIGHEST_PROTOCOL)
+
+
+class _Connection(object):
+    """A connection to a worker, with any number of outstanding requests."""
+
+    def __init__(self, loop, sock, lost):
+        self._loop = loop
+        self._sock = sock
+        self._lost = lost
+        self.pending = {}
+        self._outgoing = bytearray()
+        self._incoming = bytearray()
+
+    def send(self, request_id, payload, box):
+        if not self.pending:
+            self._loop.add_reader(self._sock, self._read)
+        self.pending[request_id] = box
+        if not self._outgoing:
+            self._loop.add_writer(self._sock, self._write)
+        self._outgoing += _FRAME.pack(request_id, False, len(payload))
+        self._outgoing += payload
+
+    def _write(self):
+        if self._sock is None:
+            return
+        try:
+            sent = self._sock.send(self._outgoing)
+        except (IOError, OSError) as e:
+            if e.errno not in _WOULD_BLOCK:
+                self._close(sys.exc_info())
+            return
+        del self._outgoing[:sent]
+        if not self._outgoing:
+            self._loop.remove_writer(self._sock)
+
+    def _read(self):
+        if self._sock is None:
+            return
+        try:
+            data = self._sock.recv(65536)
+        except (IOError, OSError) as e:
+            if e.errno not in _WOULD_BLOCK:
+                self._close(sys.exc_info())
+            return
+        if not data:
+            try:
+                raise ConnectionLost()
+            except ConnectionLost:
+                self._close(sys.exc_info())
+            return
+        self._incoming += data
+        for request_id, is_error, payload in _frames(self._incoming):
+            box = self.pending.pop(request_id)
+            if not self.pending and self._sock is not None:
+                self._loop.remove_reader(self._sock)
+            try:
+                result = pickle.loads(payload)
+            except Exception:
+                box.fail(sys.exc_info())
+                continue
+            if is_error:
+                box.fail((type(result), result, None))
+            else:
+                box.succeed(result)
+
+    def _close(self, exc_info):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock)
+        self._loop.remove_writer(self._sock)
+        self._sock.close()
+        self._sock = None
+        self._lost(self)
+        pending, self.pending = self.pending, {}
+        for box in pending.values():
+            box.fail(exc_info)
+
+
+class RPCDispatcher(object):
+    """
+    A dispatcher which performs intents by sending them to a worker started
+    with :func:`serve`. It must be used with an :class:`effect.loop.EventLoop`.
+
+    Up to ``connections`` persistent connections are opened to the worker, as
+    they're needed; each request is sent on the connection with the fewest
+    outstanding requests, without waiting for earlier responses.
+
+    Intents which can't be pickled fail locally. If a connection is lost, its
+    outstanding requests fail with :class:`ConnectionLost` (or the socket
+    error), and a new connection is made for later requests.
+
+    This dispatcher performs every intent it's given remotely; to only send
+    some intents to workers, wrap it in a dispatcher that picks which ones.
+    """
+
+    def __init__(self, loop, address, connections=4):
+        """
+        :param loop: The :class:`effect.loop.EventLoop` to do I/O with.
+        :param address: The address of the worker: a (host, port) tuple, or
+            the path of a Unix socket.
+        :param connections: The most connections to open to the worker.
+        """
+        self.loop = loop
+        self.address = address
+        self.max_connections = connections
+        self._connections = []
+        self._next_id = 0
+
+    def __call__(self, intent, box):
+        try:
+            payload = pickle.dumps(intent, pickle.HIGHEST_PROTOCOL)
+            connection = self._pick_connection()
+        except Exception:
+            box.fail(sys.exc_info())
+            return
+        self._next_id += 1
+        connection.send(self._next_id, payload, box)
+
+    def _pick_connection(self):
+        connections = self._connections
+        if connections:
+            idlest = min(connections, key=lambda c: len(c.pending))
+            if not idlest.pending:
+                return idlest
+            if len(connections) >= self.max_connections:
+                return idlest
+        return self._connect()
+
+    def _connect(self):
+        sock = _make_socket(self.address)
+        try:
+            sock.connect(self.address)
+        except Exception:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        connection = _Connection(self.loop, sock, self._connections.remove)
+        self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """Close all connections, failing any outstanding requests."""
+        for connection in list(self._connections):
+            try:
+                raise ConnectionLost("Dispatcher closed")
+            except ConnectionLost:
+                connection._close(sys.exc_info())
+
+
+def _serve_connection(sock, dispatcher):
+    lock = threading.Lock()
+
+    def respond(request_id, is_error, result):
+        is_error, payload = _dumps_outcome(is_error, result)
+        header = _FRAME.pack(request_id, is_error, len(payload))
+        with lock:
+            sock.sendall(header + payload)
+
+    buffer = bytearray()
+    try:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            buffer += data
+            for request_id, _, payload in _frames(buffer):
+                try:
+                    intent = pickle.loads(payload)
+                except Exception as e:
+                    respond(request_id, True, e)
+                    continue
+                perform(
+                    Effect(intent).on(
+                        success=lambda r, i=request_id: respond(i, False, r),
+                        error=lambda e, i=request_id: respond(i, True, e[1])),
+                    dispatcher)
+    except (IOError, OSError):
+        return
+    finally:
+        sock.close()
+
+
+def serve(address, dispatcher=default_dispatcher, listening=None):
+    """
+    Run a worker which listens on the given address, and performs the intents
+    sent to it by :class:`RPCDispatcher` with the dispatcher. Each connection
+    is handled in its own thread. This function never returns.
+
+    Anyone who can connect to the address can run arbitrary code in the
+    worker, since requests are unpickled, so only listen on a Unix socket or
+    a trusted interface.
+
+    :param address: A (host, port) tuple, or the path of a Unix socket.
+    :param listening: An optional function which is called with no arguments
+        once the worker is accepting connections.
+    """
+    listener = _make_socket(address)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(address)
+    listener.listen(128)
+    if listening is not None:
+        listening()
+    while True:
+        sock, _ = listener.accept()
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        thread = threading.Thread(target=_serve_connection,
+                                  args=(sock, dispatcher))
+        thread.daemon = True
+        thread.start()
+
+
+def parse_address(text):
+    """
+    Parse a worker address given on the command line: ``HOST:PORT`` for TCP,
+    or anything else as the path of a Unix socket.
+    """
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit() and '/' not in text:
+        return (host, int(port))
+    return text
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) != 1:
+        print("Usage: python -m effect.rpc (HOST:PORT | SOCKET-PATH)\n"
+              "\n"
+              "Warning: requests are unpickled, so anyone who can connect can "
+              "run code\nas this process. Only listen on a Unix socket or a "
+              "trusted interface.",
+              file=sys.stderr)
+        return 2
+
+    def listening():
+        print("listening")
+        sys.stdout.flush()
+    serve(parse_address(argv[0]), listening=listening)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
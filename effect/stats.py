@@ -0,0 +1,182 @@
+"""
+Live statistics about the effects being performed, for monitoring.
+
+Statistics are off by default. Turn them on when your application starts::
+
+    from effect.stats import enable_stats, prometheus_text
+    runtime_stats = enable_stats()
+
+and later, e.g. from a metrics endpoint::
+
+    body = runtime_stats.export(prometheus_text)
+
+Once enabled, the interpreter keeps count of the effects it starts and
+completes, and of the intents in flight, by intent type. Those waiting for a
+result that wasn't provided before their dispatcher returned are counted
+separately. :class:`effect.twisted.TwistedDispatcher` and
+:func:`effect.loop.loop_dispatcher` also count the parallel effects and
+:obj:`effect.Delay` timers they have in progress.
+
+The bookkeeping is a few integer and dict updates per intent, cheap enough to
+leave on in production. It isn't locked, so the numbers may drift slightly if
+effects are performed from several threads at once.
+
+An exporter is any function which takes a list of :class:`Sample`\\ s;
+:func:`prometheus_text` renders them in the Prometheus text format.
+"""
+
+from __future__ import absolute_import
+
+
+class Sample(object):
+    """A single value of a metric."""
+
+    def __init__(self, name, kind, help, value, labels=None):
+        """
+        :param str name: The metric's name.
+        :param str kind: 'counter' or 'gauge'.
+        :param str help: A description of the metric.
+        :param value: The metric's value.
+        :param labels: A dict of label names to values, or None.
+        """
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.value = value
+        self.labels = labels
+
+    def __repr__(self):
+        return "Sample(%r, %r, %r, %r, labels=%r)" % (
+            self.name, self.kind, self.help, self.value, self.labels)
+
+
+class RuntimeStats(object):
+    """
+    Counters and gauges describing the effects being performed.
+
+    :ivar effects_started: The number of effects performed.
+    :ivar effects_completed: The number of effects that have finished running
+        their callbacks.
+    :ivar effects_failed: How many of those finished with an error.
+    :ivar in_flight: A dict mapping intent types to the number of intents of
+        that type being performed.
+    :ivar waiting: The number of intents whose dispatchers returned without
+        providing a result, which are waiting for it to arrive.
+    :ivar parallel_groups: The number of parallel effects in progress.
+    :ivar parallel_children: The number of their children in progress.
+    :ivar delays_pending: The number of Delay timers which haven't fired.
+    """
+
+    def __init__(self):
+        self.effects_started = 0
+        self.effects_completed = 0
+        self.effects_failed = 0
+        self.in_flight = {}
+        self.waiting = 0
+        self.parallel_groups = 0
+        self.parallel_children = 0
+        self.delays_pending = 0
+
+    def intent_started(self, intent_type):
+        self.in_flight[intent_type] = self.in_flight.get(intent_type, 0) + 1
+
+    def intent_finished(self, intent_type):
+        self.in_flight[intent_type] -= 1
+
+    def samples(self):
+        """Return a list of :class:`Sample`\\ s of every statistic."""
+        in_flight = {}
+        for intent_type, count in self.in_flight.items():
+            name = intent_type.__name__
+            in_flight[name] = in_flight.get(name, 0) + count
+        return [
+            Sample('effects_started_total', 'counter',
+                   'Effects performed.', self.effects_started),
+            Sample('effects_completed_total', 'counter',
+                   'Effects that have finished running their callbacks.',
+                   self.effects_completed),
+            Sample('effects_failed_total', 'counter',
+                   'Effects that finished with an error.',
+                   self.effects_failed),
+        ] + [
+            Sample('intents_in_flight', 'gauge',
+                   'Intents being performed, by type.', count,
+                   {'intent': name})
+            for name, count in sorted(in_flight.items())
+        ] + [
+            Sample('intents_waiting', 'gauge',
+                   'Intents waiting for an asynchronous result.',
+                   self.waiting),
+            Sample('parallel_groups_in_flight', 'gauge',
+                   'Parallel effects in progress.', self.parallel_groups),
+            Sample('parallel_children_in_flight', 'gauge',
+                   'Children of parallel effects in progress.',
+                   self.parallel_children),
+            Sample('delays_pending', 'gauge',
+                   'Delay timers which have not fired.', self.delays_pending),
+        ]
+
+    def export(self, exporter):
+        """
+        Pass the current samples to an exporter, and return its result.
+        """
+        return exporter(self.samples())
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def prometheus_text(samples, prefix='effect_'):
+    """
+    Render samples in the Prometheus text exposition format.
+
+    :param prefix: A string to put in front of every metric name.
+    """
+    lines = []
+    described = set()
+    for sample in samples:
+        name = prefix + sample.name
+        if name not in described:
+            described.add(name)
+            lines.append('# HELP %s %s' % (name, sample.help))
+            lines.append('# TYPE %s %s' % (name, sample.kind))
+        if sample.labels:
+            name += '{%s}' % (','.join(
+                '%s="%s"' % (key, _escape(value))
+                for key, value in sorted(sample.labels.items())),)
+        lines.append('%s %s' % (name, sample.value))
+    return '\n'.join(lines) + '\n'
+
+
+current = None
+
+
+def enable_stats(stats=None):
+    """
+    Start recording statistics in all threads.
+
+    :param stats: The :class:`RuntimeStats` to record into. Defaults to a new
+        one.
+    :return: The :class:`RuntimeStats` being recorded into.
+    """
+    global current
+    if stats is None:
+        stats = RuntimeStats()
+    current = stats
+    return stats
+
+
+def disable_stats():
+    """Stop recording statistics."""
+    global current
+    current = None
+
+
+def get_stats():
+    """
+    Return the :class:`RuntimeStats` being recorded into, or None if
+    statistics aren't enabled.
+    """
+    return current
@@ -0,0 +1,339 @@
+"""
+Intents that produce many values over time, with backpressure.
+
+An ordinary intent results in exactly one value. A streaming intent results
+in a :class:`Stream`, whose values its producer emits one at a time, as the
+consumer asks for them. Paginated APIs, database cursors and message
+consumers can be modelled this way, without buffering everything or chaining
+effects by hand.
+
+A producer writes into a :class:`Channel`, which tells it how many more
+values the consumer is ready for. That's the producer's *credit*: it's
+granted through the ``on_request`` function the channel was made with, and
+the producer shouldn't emit more values than it has been granted::
+
+    class ReadRows(object):
+        def perform_effect(self, dispatcher):
+            cursor = db.execute(self.query)
+
+            def on_request(n):
+                for row in cursor.fetchmany(n):
+                    channel.emit(row)
+                if cursor.exhausted:
+                    channel.end()
+
+            channel = Channel(on_request)
+            return Stream(channel)
+
+:func:`from_iterable` does exactly that for any iterable. Producers that emit
+asynchronously, from a Deferred callback or another thread's completion
+handed back to the reactor, call the same methods later.
+
+The consumer describes what to do with the values with effects, so it works
+with any dispatcher::
+
+    Effect(ReadRows('select ...')).on(
+        success=lambda rows: rows.filter(is_active).map(to_user).fold(
+            lambda total, user: total + user.balance, 0))
+
+:meth:`Stream.fold` pulls values a window at a time: besides the values it
+is folding in, at most a window's worth are ever requested from the producer
+or waiting in the channel. The folding function may return an effect, such
+as a write to a database, in which case the next value isn't folded in until
+that effect has completed, and the producer isn't given any more credit in
+the meantime.
+
+Pulling is done with the :class:`Pull` intent, which has to complete
+asynchronously, so it's performed by :func:`perform_pull` with the box,
+rather than with a ``perform_effect`` method. Put :obj:`stream_dispatcher`
+in front of whatever dispatcher is used, with
+:class:`effect.compose.ComposedDispatcher`::
+
+    dispatcher = ComposedDispatcher([stream_dispatcher,
+                                     TwistedDispatcher(reactor)])
+    perform(eff, dispatcher)
+"""
+
+from __future__ import absolute_import
+
+import sys
+
+from collections import deque
+
+from characteristic import attributes
+
+import six
+
+from . import Effect
+from .compose import TypeDispatcher
+
+
+class Channel(object):
+    """
+    The connection between a stream's producer and its consumer: the values
+    emitted but not yet consumed, and the credit the producer has been given.
+
+    :ivar credit: How many more values the producer has been asked for.
+    """
+
+    def __init__(self, on_request=None, on_cancel=None):
+        """
+        :param on_request: A function called with a number of values, when
+            the consumer is ready for that many more. It may emit them
+            straight away, or later.
+        :param on_cancel: A function called if the consumer cancels the
+            stream, so that the producer can stop.
+        """
+        self.on_request = on_request
+        self.on_cancel = on_cancel
+        self.credit = 0
+        self.window = 0
+        self._buffer = deque()
+        self._ended = False
+        self._error = None
+        self._cancelled = False
+        self._waiter = None
+        self._requesting = False
+
+    def emit(self, value):
+        """Emit a value. Called by the producer."""
+        if self._ended or self._cancelled:
+            return
+        self.credit -= 1
+        self._buffer.append(value)
+        if not self._requesting:
+            self._deliver()
+
+    def end(self):
+        """Signal that there are no more values. Called by the producer."""
+        self._ended = True
+        if not self._requesting:
+            self._deliver()
+
+    def fail(self, exc_info):
+        """
+        Fail the stream with an exc_info tuple, once the values already
+        emitted have been consumed. Called by the producer.
+        """
+        if self._ended:
+            return
+        self._ended = True
+        self._error = exc_info
+        if not self._requesting:
+            self._deliver()
+
+    def cancel(self):
+        """
+        Stop the stream, dropping any values not yet consumed. Called by the
+        consumer.
+        """
+        if self._cancelled:
+            return
+        self._cancelled = True
+        self._ended = True
+        self._buffer.clear()
+        if self.on_cancel is not None and self._error is None:
+            self.on_cancel()
+        self._deliver()
+
+    def pull(self, box, window):
+        """
+        Succeed the box with a list of up to ``window`` values, as soon as
+        there are any, or with an empty list once the stream has ended; or
+        fail it with the stream's error.
+
+        The producer is given enough credit that the values it has been
+        asked for and those waiting to be consumed add up to the window.
+        """
+        if self._waiter is not None:
+            box.fail((RuntimeError, RuntimeError(
+                "The stream is already being pulled"), None))
+            return
+        self.window = window
+        self._waiter = box
+        self._request()
+        self._deliver()
+
+    def _request(self):
+        # Producers that emit straight away call back into the channel; their
+        # values are only buffered until on_request returns, and then the
+        # credit is looked at again, rather than recursing.
+        if self._requesting or self.on_request is None:
+            return
+        self._requesting = True
+        try:
+            while not self._ended:
+                wanted = self.window - self.credit - len(self._buffer)
+                if wanted <= 0:
+                    break
+                self.credit += wanted
+                self.on_request(wanted)
+        except:
+            self._ended = True
+            self._error = sys.exc_info()
+        finally:
+            self._requesting = False
+
+    def _deliver(self):
+        box = self._waiter
+        if box is None or not (self._buffer or self._ended):
+            return
+        self._waiter = None
+        buffer = self._buffer
+        values = [buffer.popleft()
+                  for _ in range(min(self.window, len(buffer)))]
+        if values:
+            # Let the producer get on with the next values while these are
+            # consumed.
+            self._request()
+            box.succeed(values)
+        elif self._error is not None:
+            box.fail(self._error)
+        else:
+            box.succeed([])
+
+
+@attributes(['channel', 'window'], apply_with_init=False)
+class Pull(object):
+    """
+    An intent to take up to ``window`` values from a channel: the result is
+    a non-empty list of values, or an empty list once the stream has ended.
+    Performed by :func:`perform_pull`.
+    """
+
+    def __init__(self, channel, window):
+        self.channel = channel
+        self.window = window
+
+
+def perform_pull(dispatcher, intent, box):
+    """Perform a :class:`Pull` intent."""
+    intent.channel.pull(box, intent.window)
+
+
+#: A dispatcher for :class:`Pull` intents, to compose with others.
+stream_dispatcher = TypeDispatcher({Pull: perform_pull})
+
+
+class Stream(object):
+    """
+    A stream of values, emitted into a :class:`Channel` by a producer, and
+    consumed with effects.
+
+    Streams are transformed with :meth:`map` and :meth:`filter`, which make
+    new streams that share the channel, so a stream should be consumed only
+    once, through one of them.
+    """
+
+    def __init__(self, channel, transforms=()):
+        self.channel = channel
+        self._transforms = transforms
+
+    def map(self, f):
+        """Return a stream of the results of calling f with each value."""
+        return Stream(self.channel, self._transforms + ((True, f),))
+
+    def filter(self, predicate):
+        """Return a stream of the values for which predicate is true."""
+        return Stream(self.channel, self._transforms + ((False, predicate),))
+
+    def pull(self, window=16):
+        """
+        Return an effect of a list of up to ``window`` values, as soon as
+        there are any, or an empty list once the stream has ended.
+        """
+        eff = Effect(Pull(self.channel, window))
+        if not self._transforms:
+            return eff
+        return eff.on(success=lambda values: self._transform(values, window))
+
+    def _transform(self, values, window):
+        if not values:
+            return values
+        for is_map, f in self._transforms:
+            if is_map:
+                values = [f(value) for value in values]
+            else:
+                values = [value for value in values if f(value)]
+        if not values:
+            # Everything was filtered out, but the stream hasn't ended.
+            return self.pull(window)
+        return values
+
+    def fold(self, f, initial, window=16):
+        """
+        Return an effect of the result of folding every value of the stream
+        into an accumulator, with ``f(accumulator, value)``, starting with
+        ``initial``.
+
+        If f returns an effect, its result is the new accumulator, and no
+        more values are folded in until it has completed. If anything fails,
+        the stream is cancelled.
+
+        :param window: How many values may be requested from the producer or
+            waiting in the channel at once.
+        """
+        return self._fold(f, initial, window).on(error=self._cancel)
+
+    def _fold(self, f, accumulator, window):
+        return self.pull(window).on(
+            success=lambda values: self._fold_values(
+                f, accumulator, values, 0, window))
+
+    def _fold_values(self, f, accumulator, values, index, window):
+        if not values:
+            return accumulator
+        while index < len(values):
+            accumulator = f(accumulator, values[index])
+            index += 1
+            if type(accumulator) is Effect:
+                return accumulator.on(
+                    success=lambda result: self._fold_values(
+                        f, result, values, index, window))
+        return self._fold(f, accumulator, window)
+
+    def _cancel(self, exc_info):
+        self.channel.cancel()
+        six.reraise(*exc_info)
+
+    def collect(self, window=16):
+        """Return an effect of a list of every value of the stream."""
+        return self.fold(_append, [], window)
+
+    def for_each(self, f, window=16):
+        """
+        Return an effect of calling f with each value of the stream, in
+        turn. If f returns an effect, the next value isn't passed to f until
+        that effect has completed. The result is None.
+        """
+        return self.fold(lambda _, value: f(value), None, window).on(
+            success=lambda _: None)
+
+    def cancel(self):
+        """Stop the producer, and drop any values not yet consumed."""
+        self.channel.cancel()
+
+
+def _append(values, value):
+    values.append(value)
+    return values
+
+
+def from_iterable(iterable):
+    """
+    Return a :class:`Stream` of the values of an iterable, which are only
+    taken from it as the consumer asks for them.
+    """
+    iterator = iter(iterable)
+
+    def on_request(n):
+        for _ in range(n):
+            try:
+                value = next(iterator)
+            except StopIteration:
+                channel.end()
+                return
+            channel.emit(value)
+
+    channel = Channel(on_request)
+    return Stream(channel)
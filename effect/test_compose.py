@@ -0,0 +1,167 @@
+from __future__ import absolute_import
+
+from testtools import TestCase
+
+from . import (
+    Effect, ConstantIntent, NoEffectHandlerError, ParallelEffects,
+    default_dispatcher, parallel, sync_perform)
+from .compose import ComposedDispatcher, TypeDispatcher, parallel_performer
+from .priority import HIGH, WithPriority, with_priority
+
+
+class Ping(object):
+    """An intent only the test dispatchers know about."""
+
+
+class Pong(object):
+    """Another intent only the test dispatchers know about."""
+
+
+class CountingDispatcher(TypeDispatcher):
+    """A TypeDispatcher which counts the lookups made on it."""
+
+    def __init__(self, performers):
+        TypeDispatcher.__init__(self, performers)
+        self.lookups = []
+
+    def lookup(self, intent_type):
+        self.lookups.append(intent_type)
+        return TypeDispatcher.lookup(self, intent_type)
+
+
+def succeed_with(result):
+    def perform(dispatcher, intent, box):
+        box.succeed(result)
+    return perform
+
+
+class TypeDispatcherTests(TestCase):
+    """Tests for :class:`TypeDispatcher`."""
+
+    def test_perform(self):
+        """Intents are performed by the performer for their type."""
+        dispatcher = TypeDispatcher({Ping: succeed_with('pong')})
+        self.assertEqual(sync_perform(Effect(Ping()), dispatcher), 'pong')
+
+    def test_no_handler(self):
+        """Intents of other types fail with NoEffectHandlerError."""
+        dispatcher = TypeDispatcher({})
+        self.assertRaises(NoEffectHandlerError, sync_perform, Effect(Ping()),
+                          dispatcher)
+
+
+class ComposedDispatcherTests(TestCase):
+    """Tests for :class:`ComposedDispatcher`."""
+
+    def test_first_handler(self):
+        """Each intent is performed by the first dispatcher to handle it."""
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({Ping: succeed_with('first')}),
+            TypeDispatcher({Ping: succeed_with('second'),
+                            Pong: succeed_with('pong')})])
+        self.assertEqual(sync_perform(Effect(Ping()), dispatcher), 'first')
+        self.assertEqual(sync_perform(Effect(Pong()), dispatcher), 'pong')
+
+    def test_cached(self):
+        """Each intent type is looked up only once."""
+        first = CountingDispatcher({Ping: succeed_with('ping')})
+        second = CountingDispatcher({Pong: succeed_with('pong')})
+        dispatcher = ComposedDispatcher([first, second])
+        for _ in range(3):
+            sync_perform(Effect(Ping()), dispatcher)
+            sync_perform(Effect(Pong()), dispatcher)
+        self.assertEqual((first.lookups, second.lookups),
+                         ([Ping, Pong], [Pong]))
+
+    def test_plain_dispatcher(self):
+        """
+        Dispatchers without a lookup method handle every intent that reaches
+        them.
+        """
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({Ping: succeed_with('ping')}),
+            default_dispatcher])
+        self.assertEqual(
+            sync_perform(Effect(ConstantIntent('c')), dispatcher), 'c')
+
+    def test_no_handler(self):
+        """
+        Intents none of the dispatchers handle fail with NoEffectHandlerError,
+        and the miss is cached too.
+        """
+        inner = CountingDispatcher({})
+        dispatcher = ComposedDispatcher([inner])
+        for _ in range(2):
+            self.assertRaises(NoEffectHandlerError, sync_perform,
+                              Effect(Ping()), dispatcher)
+        self.assertEqual(inner.lookups, [Ping])
+        self.assertIs(dispatcher.lookup(Ping), None)
+
+    def test_nested(self):
+        """
+        A ComposedDispatcher can be composed, and its performers are passed
+        the outermost dispatcher.
+        """
+        def perform_pong(dispatcher, intent, box):
+            box.succeed(Effect(Ping()))
+        inner = ComposedDispatcher([TypeDispatcher({Pong: perform_pong})])
+        dispatcher = ComposedDispatcher([
+            inner, TypeDispatcher({Ping: succeed_with('ping')})])
+        self.assertEqual(sync_perform(Effect(Pong()), dispatcher), 'ping')
+
+    def test_performer_raises(self):
+        """Exceptions raised by performers fail the intent."""
+        def raising(dispatcher, intent, box):
+            raise RuntimeError('bad performer')
+        dispatcher = ComposedDispatcher([TypeDispatcher({Ping: raising})])
+        self.assertRaises(RuntimeError, sync_perform, Effect(Ping()),
+                          dispatcher)
+
+    def test_with_priority(self):
+        """
+        WithPriority intents go to the first dispatcher that handles the
+        intent they wrap, which is given the WithPriority intent if it
+        handles those too, or else the wrapped intent.
+        """
+        def priority(dispatcher, intent, box):
+            box.succeed((intent.priority, type(intent.intent)))
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({Ping: succeed_with('ping')}),
+            TypeDispatcher({Pong: succeed_with('pong'),
+                            WithPriority: priority})])
+        self.assertEqual(
+            sync_perform(with_priority(Effect(Ping()), HIGH), dispatcher),
+            'ping')
+        self.assertEqual(
+            sync_perform(with_priority(Effect(Pong()), HIGH), dispatcher),
+            (HIGH, Pong))
+        self.assertRaises(
+            NoEffectHandlerError, sync_perform,
+            with_priority(Effect(ConstantIntent(1)), HIGH), dispatcher)
+
+    def test_with_priority_plain_dispatcher(self):
+        """
+        Dispatchers without a lookup method are given WithPriority intents as
+        they are.
+        """
+        seen = []
+
+        def plain(intent, box):
+            seen.append(intent)
+            default_dispatcher(intent, box)
+        dispatcher = ComposedDispatcher([TypeDispatcher({}), plain])
+        eff = with_priority(Effect(ConstantIntent(1)), HIGH)
+        self.assertEqual(sync_perform(eff, dispatcher), 1)
+        self.assertEqual(seen[0], WithPriority(ConstantIntent(1), HIGH))
+
+    def test_parallel_performer(self):
+        """
+        parallel_performer performs the children with the composed
+        dispatcher.
+        """
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({ParallelEffects: parallel_performer,
+                            Ping: succeed_with('ping')}),
+            default_dispatcher])
+        eff = parallel([Effect(Ping()), Effect(ConstantIntent('c'))])
+        self.assertEqual(sync_perform(eff, dispatcher), ['ping', 'c'])
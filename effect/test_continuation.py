@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import threading
+
+from six.moves import queue
+
+from testtools import TestCase
+
+from .continuation import schedule, set_resume_executor, trampoline
+
+
+class Worker(object):
+    """A thread which runs the functions it's given, one at a time."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            f = self.queue.get()
+            if f is None:
+                return
+            f()
+
+    def call(self, f, *args):
+        self.queue.put(lambda: f(*args))
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join(10)
+
+
+class TrampolineTests(TestCase):
+    """Tests for :func:`trampoline` and :func:`schedule`."""
+
+    def test_bounce(self):
+        """Work bounced by the function the trampoline runs is run next."""
+        calls = []
+
+        def f(bouncer, n):
+            calls.append(n)
+            if n:
+                bouncer.bounce(f, n - 1)
+        trampoline(f, 3)
+        self.assertEqual(calls, [3, 2, 1, 0])
+
+    def test_schedule(self):
+        """
+        Work scheduled while a trampoline is running is run by it after the
+        current step, instead of recursing.
+        """
+        calls = []
+
+        def f(bouncer, name):
+            calls.append(name)
+            if name == 'a':
+                schedule(f, 'c')
+                calls.append('b')
+        trampoline(f, 'a')
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+    def test_bounce_twice(self):
+        """A bouncer can only be bounced once."""
+        bouncers = []
+        trampoline(bouncers.append)
+        bouncers[0].bounce(lambda bouncer: None)
+        self.assertRaises(RuntimeError,
+                          bouncers[0].bounce, lambda bouncer: None)
+
+    def test_bounce_twice_while_running(self):
+        """A bouncer can only be bounced once, even before f returns."""
+        def f(bouncer):
+            bouncer.bounce(lambda bouncer: None)
+            self.assertRaises(RuntimeError,
+                              bouncer.bounce, lambda bouncer: None)
+        trampoline(f)
+
+    def test_bounce_after_finishing(self):
+        """
+        Work bounced after the trampoline has finished with the bouncer is
+        run straight away, in a new trampoline.
+        """
+        bouncers = []
+        calls = []
+        trampoline(bouncers.append)
+        bouncers[0].bounce(lambda bouncer, x: calls.append(x), 'x')
+        self.assertEqual(calls, ['x'])
+
+
+class ThreadTests(TestCase):
+    """Tests for bouncing from other threads."""
+
+    def setUp(self):
+        super(ThreadTests, self).setUp()
+        self.worker = Worker()
+        self.addCleanup(self.worker.stop)
+
+    def test_race(self):
+        """
+        Work bounced from another thread just as the trampoline is finishing
+        with the bouncer is run exactly once, whichever of them wins.
+        """
+        runs = []
+        done = threading.Event()
+
+        def work(bouncer, i):
+            runs.append(i)
+            done.set()
+
+        def f(bouncer, i):
+            self.worker.call(bouncer.bounce, work, i)
+
+        for i in range(2000):
+            done.clear()
+            trampoline(f, i)
+            self.assertTrue(done.wait(10))
+        self.assertEqual(runs, list(range(2000)))
+
+    def test_resume_executor(self):
+        """
+        Work bounced from another thread after the trampoline has finished is
+        handed to the resume executor.
+        """
+        handed = []
+        calls = []
+        set_resume_executor(handed.append)
+        self.addCleanup(set_resume_executor, None)
+        bouncers = []
+        trampoline(bouncers.append)
+        finished = threading.Event()
+        self.worker.call(bouncers[0].bounce,
+                         lambda bouncer: calls.append('resumed'))
+        self.worker.call(finished.set)
+        self.assertTrue(finished.wait(10))
+        self.assertEqual(calls, [])
+        handed[0]()
+        self.assertEqual(calls, ['resumed'])
+
+    def test_resume_executor_same_thread(self):
+        """
+        Work bounced from the thread whose trampoline made the bouncer isn't
+        handed to the resume executor.
+        """
+        handed = []
+        calls = []
+        set_resume_executor(handed.append)
+        self.addCleanup(set_resume_executor, None)
+        bouncers = []
+        trampoline(bouncers.append)
+        bouncers[0].bounce(lambda bouncer: calls.append('run'))
+        self.assertEqual((handed, calls), ([], ['run']))
+
+    def test_set_resume_executor(self):
+        """set_resume_executor returns the previous executor."""
+        executor = lambda f: None
+        self.assertIs(set_resume_executor(executor), None)
+        self.assertIs(set_resume_executor(None), executor)
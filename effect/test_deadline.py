@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+from testtools import TestCase
+
+from . import (
+    Effect, ConstantIntent, FuncIntent, default_dispatcher, parallel,
+    perform, sync_perform)
+from ._test_utils import FakeClock
+from .deadline import DeadlineDispatcher, DeadlineExceeded, with_timeout
+
+
+class DeadlineDispatcherTests(TestCase):
+    """Tests for :class:`DeadlineDispatcher`."""
+
+    def setUp(self):
+        super(DeadlineDispatcherTests, self).setUp()
+        self.clock = FakeClock()
+        self.dispatcher = DeadlineDispatcher(default_dispatcher, 10,
+                                             self.clock)
+
+    def test_before_deadline(self):
+        """Intents started before the deadline are performed."""
+        self.clock.now = 9
+        self.assertEqual(self.dispatcher.remaining(), 1)
+        self.assertEqual(
+            sync_perform(Effect(ConstantIntent(1)), self.dispatcher), 1)
+
+    def test_after_deadline(self):
+        """
+        Intents started at or after the deadline fail with DeadlineExceeded,
+        without being performed.
+        """
+        performed = []
+        self.clock.now = 10
+        eff = Effect(FuncIntent(lambda: performed.append(1)))
+        e = self.assertRaises(DeadlineExceeded, sync_perform, eff,
+                              self.dispatcher)
+        self.assertEqual(e.intent, eff.intent)
+        self.assertEqual(performed, [])
+
+    def test_callbacks(self):
+        """Effects returned by callbacks are held to the deadline."""
+        def later(result):
+            self.clock.now = 10
+            return Effect(ConstantIntent(result + 1))
+        eff = Effect(ConstantIntent(1)).on(success=later)
+        self.assertRaises(DeadlineExceeded, sync_perform, eff,
+                          self.dispatcher)
+
+    def test_parallel_children(self):
+        """
+        The children of parallel effects are held to the deadline, even when
+        the dispatcher performs parallel effects itself.
+        """
+        started = []
+
+        def child(i):
+            started.append(i)
+            self.clock.now = 10
+            return i
+        eff = parallel([Effect(FuncIntent(lambda: child(1))),
+                        Effect(FuncIntent(lambda: child(2)))])
+        results = []
+        perform(eff.on(error=results.append), self.dispatcher)
+        self.assertEqual(started, [1])
+        self.assertIs(results[0][0], DeadlineExceeded)
+
+    def test_with_timeout(self):
+        """with_timeout sets the deadline relative to the clock's time."""
+        self.clock.now = 5
+        dispatcher = with_timeout(default_dispatcher, 0.5, self.clock)
+        self.assertEqual(dispatcher.deadline, 5.5)
+        self.assertIs(dispatcher.clock, self.clock)
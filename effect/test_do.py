@@ -0,0 +1,81 @@
+from __future__ import absolute_import
+
+from testtools import TestCase
+from testtools.matchers import raises
+
+from . import Effect, ConstantIntent, sync_perform
+from .do import do, do_return
+from .test_effect import ErrorIntent
+
+
+class DoTests(TestCase):
+    """Tests for :func:`do`."""
+
+    def test_do_return(self):
+        """The value passed to do_return is the result of the Effect."""
+        @do
+        def f(a):
+            b = yield Effect(ConstantIntent(a + 1))
+            yield do_return(b * 2)
+        self.assertEqual(sync_perform(f(1)), 4)
+
+    def test_no_return(self):
+        """When the generator doesn't return anything, the result is None."""
+        @do
+        def f():
+            yield Effect(ConstantIntent('foo'))
+        self.assertIs(sync_perform(f()), None)
+
+    def test_error_raised_into_generator(self):
+        """
+        When a yielded Effect fails, its exception is raised from the yield
+        expression.
+        """
+        @do
+        def f():
+            try:
+                yield Effect(ErrorIntent())
+            except ValueError as e:
+                yield do_return(('caught', str(e)))
+        self.assertEqual(sync_perform(f()), ('caught', 'oh dear'))
+
+    def test_uncaught_error(self):
+        """Uncaught exceptions fail the Effect."""
+        @do
+        def f():
+            yield Effect(ErrorIntent())
+        self.assertThat(lambda: sync_perform(f()),
+                        raises(ValueError('oh dear')))
+
+    def test_yield_non_effect(self):
+        """Yielding something other than an Effect fails with TypeError."""
+        @do
+        def f():
+            yield 'foo'
+        self.assertRaises(TypeError, sync_perform, f())
+
+    def test_perform_twice(self):
+        """
+        A new generator is created each time the Effect is performed, so it
+        can be performed more than once.
+        """
+        @do
+        def f():
+            result = yield Effect(ConstantIntent('foo'))
+            yield do_return(result)
+        eff = f()
+        self.assertEqual(sync_perform(eff), 'foo')
+        self.assertEqual(sync_perform(eff), 'foo')
+
+    def test_many_steps(self):
+        """
+        Generators with many more steps than the recursion limit run in
+        constant stack depth.
+        """
+        @do
+        def f():
+            total = 0
+            for i in range(10000):
+                total += yield Effect(ConstantIntent(i))
+            yield do_return(total)
+        self.assertEqual(sync_perform(f()), sum(range(10000)))
@@ -1,12 +1,19 @@
 from __future__ import print_function, absolute_import
 
+import os
+import subprocess
+import sys
+import threading
+
 from testtools import TestCase
 from testtools.matchers import (MatchesListwise, Is, Equals, MatchesException,
                                 raises)
 
 from . import (Effect, NoEffectHandlerError, perform,
                default_dispatcher, sync_perform, NotSynchronousError,
-               ConstantIntent)
+               ConstantIntent, FuncIntent, parallel)
+from .test_continuation import Worker
+from .testing import SimulatedClock
 
 
 class SelfContainedIntent(object):
@@ -112,6 +119,115 @@ class EffectPerformTests(TestCase):
                           lambda: sync_perform(Effect(ConstantIntent("foo")),
                                                dispatcher=lambda i, box: None))
 
+    def test_sync_perform_late_result(self):
+        """
+        If the result of an asynchronous effect turns up after sync_perform
+        has raised NotSynchronousError, the remaining callbacks are still run,
+        including those of effects they return.
+        """
+        boxes = []
+        results = []
+
+        def dispatcher(intent, box):
+            if intent == 'async':
+                boxes.append(box)
+            else:
+                default_dispatcher(intent, box)
+
+        eff = Effect('async').on(
+            success=lambda r: Effect(ConstantIntent(r + '!'))).on(
+            success=results.append)
+        self.assertRaises(NotSynchronousError, sync_perform, eff, dispatcher)
+        boxes[0].succeed('foo')
+        self.assertEqual(results, ['foo!'])
+
+    def test_sync_perform_result_from_thread(self):
+        """
+        When the result is given from another thread while sync_perform is
+        deciding whether to give up, the callbacks are run exactly once:
+        either by sync_perform, or later, after NotSynchronousError.
+        """
+        worker = Worker()
+        self.addCleanup(worker.stop)
+        results = []
+        done = threading.Event()
+
+        def dispatcher(intent, box):
+            worker.call(box.succeed, intent.result)
+
+        def callback(result):
+            results.append(result)
+            done.set()
+            return result
+
+        for i in range(1000):
+            done.clear()
+            try:
+                sync_perform(Effect(ConstantIntent(i)).on(success=callback),
+                             dispatcher)
+            except NotSynchronousError:
+                pass
+            self.assertTrue(done.wait(10))
+        self.assertEqual(results, list(range(1000)))
+
+    def test_sync_perform_long_chain(self):
+        """
+        sync_perform handles long chains of callbacks returning effects in
+        constant stack depth.
+        """
+        eff = Effect(ConstantIntent(0))
+        for i in range(10000):
+            eff = eff.on(success=lambda r: Effect(ConstantIntent(r + 1)))
+        self.assertEqual(sync_perform(eff), 10000)
+
+    def test_nested_perform_is_queued(self):
+        """
+        When perform is called from inside a performer, the nested effect is
+        run on the same trampoline after the performer returns, rather than
+        recursively.
+        """
+        calls = []
+
+        def nested():
+            perform(Effect(FuncIntent(lambda: calls.append('nested'))))
+            calls.append('outer')
+
+        sync_perform(Effect(FuncIntent(nested)))
+        self.assertEqual(calls, ['outer', 'nested'])
+
+    def test_sync_perform_inside_performer(self):
+        """
+        sync_perform can be used from inside a performer, since it always runs
+        its effect to completion before returning.
+        """
+        self.assertEqual(
+            sync_perform(
+                Effect(FuncIntent(
+                    lambda: sync_perform(Effect(ConstantIntent('inner')))))),
+            'inner')
+
+    def test_sync_perform_parallel_inside_performer(self):
+        """
+        sync_perform runs parallel effects to completion from inside a
+        performer, although their children are scheduled rather than
+        started straight away.
+        """
+        results = []
+        perform(Effect(FuncIntent(lambda: sync_perform(
+            parallel([Effect(ConstantIntent(1)), Effect(ConstantIntent(2))]),
+            SimulatedClock()))).on(success=results.append))
+        self.assertEqual(results, [[1, 2]])
+
+    def test_sync_perform_nested_perform_in_callback(self):
+        """
+        Effects performed by callbacks are run before sync_perform returns.
+        """
+        calls = []
+        sync_perform(Effect(ConstantIntent(None)).on(
+            success=lambda _: perform(Effect(FuncIntent(
+                lambda: calls.append('nested'))))))
+        self.assertEqual(calls, ['nested'])
+
 
 class CallbackTests(TestCase):
     """Tests for callbacks."""
@@ -213,5 +329,37 @@ class CallbackTests(TestCase):
         self.assertEqual(results, ['foo'])
 
 
+class CoreTests(TestCase):
+    """Tests for the core's intents and imports."""
+
+    def test_no_dependencies(self):
+        """The core imports no third-party packages."""
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             'import sys, effect; '
+             'print([m for m in ["six", "characteristic"] '
+             'if m in sys.modules])'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            universal_newlines=True)
+        self.assertEqual(output.strip(), '[]')
+
+    def test_comparison(self):
+        """
+        Intents compare and hash like tuples of their attributes, but only
+        with instances of the same class.
+        """
+        self.assertEqual(ConstantIntent(1), ConstantIntent(1))
+        self.assertNotEqual(ConstantIntent(1), ConstantIntent(2))
+        self.assertNotEqual(ConstantIntent(1), FuncIntent(1))
+        self.assertTrue(ConstantIntent(1) < ConstantIntent(2))
+        self.assertEqual(hash(ConstantIntent(1)), hash(ConstantIntent(1)))
+
+    def test_repr(self):
+        """Intents and effects have a repr showing their attributes."""
+        self.assertEqual(repr(Effect(ConstantIntent(1))),
+                         '<Effect(intent=<ConstantIntent(result=1)>, '
+                         'callbacks=[])>')
+
+
 def raise_(e):
     raise e
@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import threading
+
+from testtools import TestCase
+
+from . import (
+    Effect, ConstantIntent, ParallelEffects, default_dispatcher, parallel,
+    perform, sync_perform)
+from ._test_utils import Later, keeping_dispatcher
+from .fan_out import fan_out
+from .test_effect import ErrorIntent
+
+
+def dispatcher(intent, box):
+    if type(intent) is ParallelEffects:
+        fan_out(intent, dispatcher, box)
+    else:
+        default_dispatcher(intent, box)
+
+
+class FanOutTests(TestCase):
+    """Tests for :func:`fan_out`."""
+
+    def test_results_in_order(self):
+        """The result is a list of the children's results, in order."""
+        eff = parallel([Effect(ConstantIntent(i)) for i in range(5)])
+        self.assertEqual(sync_perform(eff, dispatcher), [0, 1, 2, 3, 4])
+
+    def test_empty(self):
+        """A parallel effect with no children results in an empty list."""
+        self.assertEqual(sync_perform(parallel([]), dispatcher), [])
+
+    def test_children_with_callbacks(self):
+        """Children's callbacks are run, and their results are used."""
+        eff = parallel([
+            Effect(ConstantIntent(1)).on(success=lambda r: r + 1),
+            Effect(ConstantIntent(1)).on(
+                success=lambda r: Effect(ConstantIntent(r + 2))),
+            Effect(ConstantIntent(1))])
+        self.assertEqual(sync_perform(eff, dispatcher), [2, 3, 1])
+
+    def test_performer_results_in_effect(self):
+        """
+        When a child's performer results in an Effect, that Effect is
+        performed to get the child's result.
+        """
+        eff = parallel([Effect(ConstantIntent(Effect(ConstantIntent('a'))))])
+        self.assertEqual(sync_perform(eff, dispatcher), ['a'])
+
+    def test_completed_later(self):
+        """
+        The box isn't given a result until every child has completed, however
+        long they take.
+        """
+        boxes = []
+        results = []
+        perform(parallel([Effect(Later()), Effect(ConstantIntent('b')),
+                          Effect(Later())]).on(success=results.append),
+                keeping_dispatcher(boxes))
+        self.assertEqual(len(boxes), 2)
+        boxes[1].succeed('c')
+        self.assertEqual(results, [])
+        boxes[0].succeed('a')
+        self.assertEqual(results, [['a', 'b', 'c']])
+
+    def test_first_error(self):
+        """
+        The box fails with the first child's error as soon as it fails, and
+        other children's results are ignored.
+        """
+        boxes = []
+        results = []
+        eff = parallel([Effect(Later()), Effect(Later())]).on(
+            success=results.append, error=results.append)
+        perform(eff, keeping_dispatcher(boxes))
+        boxes[1].fail((ValueError, ValueError('b'), None))
+        self.assertEqual(len(results), 1)
+        self.assertIs(results[0][0], ValueError)
+        boxes[0].succeed('a')
+        boxes[0].fail((ValueError, ValueError('a'), None))
+        self.assertEqual(len(results), 1)
+
+    def test_wrap_error(self):
+        """
+        The first error is passed to wrap_error along with the index of the
+        child that failed, and its result is the error of the box.
+        """
+        def wrapping(intent, box):
+            if type(intent) is ParallelEffects:
+                fan_out(intent, wrapping, box,
+                        wrap_error=lambda e, i: (KeyError, KeyError(i), None))
+            else:
+                default_dispatcher(intent, box)
+        eff = parallel([Effect(ConstantIntent(1)), Effect(ErrorIntent())])
+        exc_info = sync_perform(eff.on(error=lambda e: e), wrapping)
+        self.assertIs(exc_info[0], KeyError)
+        self.assertEqual(exc_info[1].args, (1,))
+
+    def test_dispatcher_raises(self):
+        """
+        If the dispatcher raises an exception for one child rather than
+        failing its box, the child fails and the others are still performed.
+        """
+        performed = []
+
+        def raising(intent, box):
+            if type(intent) is ParallelEffects:
+                fan_out(intent, raising, box)
+            elif intent.result == 'bad':
+                raise RuntimeError('bad dispatcher')
+            else:
+                performed.append(intent.result)
+                box.succeed(intent.result)
+        eff = parallel([Effect(ConstantIntent('bad')),
+                        Effect(ConstantIntent('good'))])
+        exc_info = sync_perform(eff.on(error=lambda e: e), raising)
+        self.assertIs(exc_info[0], RuntimeError)
+        self.assertEqual(performed, ['good'])
+
+    def test_deeply_nested(self):
+        """
+        Parallel effects nested far deeper than the recursion limit are
+        performed in constant stack depth.
+        """
+        eff = Effect(ConstantIntent('leaf'))
+        for i in range(10000):
+            eff = parallel([eff, Effect(ConstantIntent(i))])
+        result = sync_perform(eff, dispatcher)
+        for i in reversed(range(10000)):
+            self.assertEqual(result[1], i)
+            result = result[0]
+        self.assertEqual(result, 'leaf')
+
+    def test_completed_concurrently(self):
+        """
+        When children complete in several threads at once, the box gets
+        every result, exactly once.
+        """
+        for _ in range(50):
+            boxes = []
+            results = []
+            perform(parallel([Effect(Later()) for _ in range(40)]).on(
+                success=results.append), keeping_dispatcher(boxes))
+            go = threading.Event()
+
+            def complete(boxes):
+                go.wait(10)
+                for i, box in boxes:
+                    box.succeed(i)
+            numbered = list(enumerate(boxes))
+            threads = [
+                threading.Thread(target=complete, args=(numbered[i::4],))
+                for i in range(4)]
+            for thread in threads:
+                thread.start()
+            go.set()
+            for thread in threads:
+                thread.join(10)
+            self.assertEqual(results, [list(range(40))])
@@ -0,0 +1,180 @@
+from __future__ import absolute_import
+
+import threading
+
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from testtools import TestCase
+
+from . import Effect, ConstantIntent, FuncIntent, parallel, sync_perform
+from .futures import FutureDispatcher, future_to_box, perform_future
+from .test_effect import ErrorIntent
+
+
+class FutureIntent(object):
+    """An intent whose performer returns a given Future."""
+
+    def __init__(self, future):
+        self.future = future
+
+    def perform_effect(self, dispatcher):
+        return self.future
+
+
+class Box(object):
+    """A box which records its result."""
+
+    result = None
+
+    def succeed(self, result):
+        self.result = (False, result)
+
+    def fail(self, exc_info):
+        self.result = (True, exc_info)
+
+
+class FutureToBoxTests(TestCase):
+    """Tests for :func:`future_to_box`."""
+
+    def test_result(self):
+        """The box succeeds with the Future's result."""
+        future = Future()
+        box = Box()
+        future_to_box(future, box)
+        self.assertIs(box.result, None)
+        future.set_result('a')
+        self.assertEqual(box.result, (False, 'a'))
+
+    def test_exception(self):
+        """The box fails with the Future's exception."""
+        future = Future()
+        box = Box()
+        future_to_box(future, box)
+        error = ValueError('oh no')
+        future.set_exception(error)
+        self.assertIs(box.result[1][1], error)
+
+    def test_cancelled(self):
+        """The box fails with CancelledError if the Future is cancelled."""
+        future = Future()
+        box = Box()
+        future_to_box(future, box)
+        future.cancel()
+        self.assertIs(box.result[1][0], CancelledError)
+
+    def test_hand_off(self):
+        """The completion is handed to hand_off."""
+        handed = []
+        future = Future()
+        box = Box()
+        future_to_box(future, box,
+                      hand_off=lambda f, *args: handed.append((f, args)))
+        future.set_result('a')
+        self.assertIs(box.result, None)
+        f, args = handed[0]
+        f(*args)
+        self.assertEqual(box.result, (False, 'a'))
+
+
+class FutureDispatcherTests(TestCase):
+    """Tests for :class:`FutureDispatcher`."""
+
+    def setUp(self):
+        super(FutureDispatcherTests, self).setUp()
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_plain_results(self):
+        """Results that aren't Futures are used directly."""
+        self.assertEqual(
+            sync_perform(Effect(ConstantIntent(1)), FutureDispatcher()), 1)
+
+    def test_done_future(self):
+        """A Future that's already done provides the result synchronously."""
+        future = Future()
+        future.set_result('done')
+        self.assertEqual(
+            sync_perform(Effect(FutureIntent(future)), FutureDispatcher()),
+            'done')
+
+    def test_performers(self):
+        """Performers in the table are used for their intent types."""
+        dispatcher = FutureDispatcher(performers={
+            ConstantIntent: lambda d, i: self.executor.submit(
+                lambda: i.result * 2)})
+        eff = Effect(ConstantIntent(2))
+        self.assertEqual(perform_future(eff, dispatcher).result(10), 4)
+
+    def test_performer_raises(self):
+        """Exceptions raised by performers fail the intent."""
+        future = perform_future(Effect(ErrorIntent()))
+        self.assertRaises(ValueError, future.result, 10)
+
+    def test_worker_threads(self):
+        """
+        Effects are performed with Futures completed in worker threads, and
+        effects returned from callbacks are performed too.
+        """
+        def submit(f):
+            return Effect(FutureIntent(self.executor.submit(f)))
+        eff = submit(lambda: 1).on(
+            success=lambda r: submit(lambda: r + 1)).on(
+                success=lambda r: r * 10)
+        self.assertEqual(perform_future(eff).result(10), 20)
+
+    def test_failed_future(self):
+        """perform_future's Future fails with the effect's exception."""
+        def fail():
+            raise RuntimeError('worker failed')
+        future = perform_future(
+            Effect(FutureIntent(self.executor.submit(fail))))
+        self.assertRaises(RuntimeError, future.result, 10)
+
+    def test_parallel(self):
+        """
+        Parallel children whose Futures complete concurrently in different
+        threads are all gathered, without losing any.
+        """
+        for _ in range(20):
+            go = threading.Event()
+
+            def child(i):
+                go.wait(10)
+                return i
+            eff = parallel([
+                Effect(FutureIntent(self.executor.submit(child, i)))
+                for i in range(4)] + [Effect(ConstantIntent(4))])
+            future = perform_future(eff)
+            go.set()
+            self.assertEqual(future.result(10), [0, 1, 2, 3, 4])
+
+    def test_callbacks_serialized(self):
+        """
+        Callbacks of effects whose Futures complete in different threads
+        never run at the same time.
+        """
+        running = []
+        overlaps = []
+
+        def callback(result):
+            running.append(result)
+            if len(running) > 1:
+                overlaps.append(list(running))
+            threading.Event().wait(0.001)
+            running.remove(result)
+            return result
+
+        dispatcher = FutureDispatcher()
+        futures = [
+            perform_future(
+                Effect(FutureIntent(self.executor.submit(lambda i=i: i))).on(
+                    success=callback),
+                dispatcher)
+            for i in range(50)]
+        self.assertEqual([f.result(10) for f in futures], list(range(50)))
+        self.assertEqual(overlaps, [])
+
+    def test_func_intent(self):
+        """Intents are performed with their perform_effect methods."""
+        self.assertEqual(
+            perform_future(Effect(FuncIntent(lambda: 'f'))).result(10), 'f')
@@ -0,0 +1,420 @@
+from __future__ import absolute_import
+
+import json
+import threading
+
+from functools import partial
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+from testtools import TestCase
+from testtools.matchers import raises
+
+from . import Effect, ParallelEffects, parallel
+from .compose import ComposedDispatcher, TypeDispatcher, parallel_performer
+from .http import (
+    HTTPConnectionPool, HTTPProtocolError, HTTPRequest, HTTPResponse,
+    StreamingHTTPRequest)
+from .loop import EventLoop, perform_parallel, run
+from .priority import HIGH, LOW, with_priority
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in [b'hello ', b'chunked ', b'world']:
+                self.wfile.write(_chunk(chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        elif self.path == '/close':
+            self.send_response(200)
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(b'closed')
+            self.close_connection = True
+        elif self.path.startswith('/lines/'):
+            count = int(self.path.split('/')[2])
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for i in range(count):
+                    line = json.dumps({'n': i}).encode('ascii') + b'\n'
+                    self.wfile.write(_chunk(line))
+                self.wfile.write(b'0\r\n\r\n')
+            except EnvironmentError:
+                self.close_connection = True
+        elif self.path == '/truncated':
+            self.send_response(200)
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.write(b'short')
+            self.close_connection = True
+        elif self.path == '/drop':
+            # Close the connection after responding, without telling the
+            # client, like a server timing out an idle connection.
+            self.respond(b'dropped')
+            self.close_connection = True
+        else:
+            self.respond(self.path.encode('ascii'))
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.respond(self.rfile.read(length))
+
+    def respond(self, body, code=200):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Method', self.command)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _chunk(data):
+    """Encode bytes as a chunk of a chunked response body."""
+    return ('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n'
+
+
+def start_server(test):
+    """Start an HTTP/1.1 server in a thread and return it."""
+    server = _Server(('127.0.0.1', 0), _Handler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class HTTPConnectionPoolTests(TestCase):
+    """Tests for :class:`HTTPConnectionPool`."""
+
+    def setUp(self):
+        super(HTTPConnectionPoolTests, self).setUp()
+        self.server = start_server(self)
+        self.loop = EventLoop()
+        self.pool = HTTPConnectionPool(self.loop, max_per_host=2)
+        self.addCleanup(self.pool.close)
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server.server_address[1], path)
+
+    def run_effect(self, effect):
+        def dispatcher(loop, intent, box):
+            if type(intent) is ParallelEffects:
+                perform_parallel(intent, partial(dispatcher, loop), box)
+            else:
+                self.pool(intent, box)
+        return run(effect, dispatcher, self.loop)
+
+    def test_get(self):
+        """A GET request results in an HTTPResponse."""
+        response = self.run_effect(
+            Effect(HTTPRequest('get', self.url('/foo?bar=1'))))
+        self.assertEqual(
+            (response.code, response.body, response.get_header('x-method')),
+            (200, b'/foo?bar=1', 'GET'))
+
+    def test_post(self):
+        """Request bodies are sent."""
+        response = self.run_effect(
+            Effect(HTTPRequest('post', self.url('/'), data=b'some data')))
+        self.assertEqual(response.body, b'some data')
+
+    def test_chunked(self):
+        """Chunked responses are decoded."""
+        response = self.run_effect(
+            Effect(HTTPRequest('get', self.url('/chunked'))))
+        self.assertEqual(response.body, b'hello chunked world')
+
+    def test_connection_reused(self):
+        """Sequential requests to one host reuse a single connection."""
+        eff = Effect(HTTPRequest('get', self.url('/a'))).on(
+            success=lambda r: Effect(HTTPRequest('get', self.url('/b'))))
+        self.assertEqual(self.run_effect(eff).body, b'/b')
+        self.assertEqual(self.server.connections, 1)
+        stats = self.pool.stats()
+        self.assertEqual(
+            (stats['requests'], stats['connections_opened'], stats['reused'],
+             stats['idle'], stats['active']),
+            (2, 1, 1, 1, 0))
+
+    def test_parallel_per_host_limit(self):
+        """
+        A parallel fan-out to one host opens no more than the per-host limit
+        of connections, and reuses them for the remaining requests.
+        """
+        effects = [Effect(HTTPRequest('get', self.url('/%d' % (i,))))
+                   for i in range(20)]
+        responses = self.run_effect(parallel(effects))
+        self.assertEqual([r.body for r in responses],
+                         [('/%d' % (i,)).encode('ascii') for i in range(20)])
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(self.pool.stats()['reused'], 18)
+
+    def test_priority(self):
+        """
+        Requests waiting for a connection are sent highest priority first,
+        whether the priority is the request's own or given by with_priority.
+        """
+        self.pool.max_per_host = 1
+        order = []
+
+        def request(path, priority):
+            return Effect(HTTPRequest('get', self.url(path),
+                                      priority=priority)).on(
+                success=lambda r: order.append(r.body))
+        self.run_effect(parallel([
+            request('/l0', LOW), request('/l1', LOW), request('/n', None),
+            with_priority(
+                Effect(HTTPRequest('get', self.url('/h0'))), HIGH).on(
+                    success=lambda r: order.append(r.body)),
+            request('/h1', HIGH)]))
+        self.assertEqual(order, [b'/l0', b'/h0', b'/h1', b'/n', b'/l1'])
+
+    def test_invalid_priority(self):
+        """Requests with an invalid priority fail with ValueError."""
+        self.assertThat(
+            lambda: self.run_effect(with_priority(
+                Effect(HTTPRequest('get', self.url('/a'))), 'urgent')),
+            raises(ValueError))
+        self.assertThat(
+            lambda: self.run_effect(
+                Effect(HTTPRequest('get', self.url('/a'), priority=7))),
+            raises(ValueError))
+
+    def test_composed_priority(self):
+        """
+        Requests given a priority with with_priority keep it when the pool is
+        composed with other dispatchers.
+        """
+        self.pool.max_per_host = 1
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({ParallelEffects: parallel_performer}),
+            self.pool])
+        order = []
+
+        def request(path, priority):
+            return with_priority(
+                Effect(HTTPRequest('get', self.url(path))), priority).on(
+                    success=lambda r: order.append(r.body))
+        run(parallel([request('/l0', LOW), request('/l1', LOW),
+                      request('/h0', HIGH)]),
+            lambda loop, intent, box: dispatcher(intent, box), self.loop)
+        self.assertEqual(order, [b'/l0', b'/h0', b'/l1'])
+
+    def test_composed(self):
+        """
+        The pool can be composed with other dispatchers, handling only the
+        HTTP intents.
+        """
+        self.assertIs(self.pool.lookup(ParallelEffects), None)
+        dispatcher = ComposedDispatcher([
+            TypeDispatcher({ParallelEffects: parallel_performer}),
+            self.pool])
+        eff = parallel([Effect(HTTPRequest('get', self.url('/a')))])
+        responses = run(eff, lambda loop, intent, box: dispatcher(intent, box),
+                        self.loop)
+        self.assertEqual([r.body for r in responses], [b'/a'])
+
+    def test_connection_close(self):
+        """Connections the server closes aren't reused."""
+        eff = Effect(HTTPRequest('get', self.url('/close'))).on(
+            success=lambda r: Effect(HTTPRequest('get', self.url('/b'))))
+        self.assertEqual(self.run_effect(eff).body, b'/b')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_stale_connection_retried(self):
+        """
+        If the server closed an idle connection without saying it would, the
+        next request on it is retried on a new connection.
+        """
+        eff = Effect(HTTPRequest('get', self.url('/drop'))).on(
+            success=lambda r: Effect(HTTPRequest('get', self.url('/b'))))
+        self.assertEqual(self.run_effect(eff).body, b'/b')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_stale_connection_not_idempotent(self):
+        """
+        A request that isn't idempotent isn't retried if the connection it
+        was sent on turns out to be closed, since the server may have acted
+        on it.
+        """
+        eff = Effect(HTTPRequest('get', self.url('/drop'))).on(
+            success=lambda r: Effect(HTTPRequest('post', self.url('/b'),
+                                                 data=b'once')))
+        self.assertRaises((HTTPProtocolError, EnvironmentError),
+                          self.run_effect, eff)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_truncated(self):
+        """
+        If the connection is closed before the whole body has been received,
+        the effect fails with HTTPProtocolError.
+        """
+        self.assertThat(
+            lambda: self.run_effect(
+                Effect(HTTPRequest('get', self.url('/truncated')))),
+            raises(HTTPProtocolError))
+
+    def test_unsupported_scheme(self):
+        """Only http URLs are supported."""
+        self.assertThat(
+            lambda: self.run_effect(
+                Effect(HTTPRequest('get', 'https://example.com/'))),
+            raises(ValueError))
+
+    def test_connection_refused(self):
+        """Failing to connect fails the effect."""
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertRaises(
+            EnvironmentError,
+            self.run_effect,
+            Effect(HTTPRequest('get', 'http://127.0.0.1:%d/' % (port,))))
+
+
+class StreamingTests(TestCase):
+    """Tests for :class:`StreamingHTTPRequest` and :class:`BodyStream`."""
+
+    def setUp(self):
+        super(StreamingTests, self).setUp()
+        self.server = start_server(self)
+        self.loop = EventLoop()
+        self.pool = HTTPConnectionPool(self.loop, max_per_host=1,
+                                       high_water=1024)
+        self.addCleanup(self.pool.close)
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server.server_address[1], path)
+
+    def run_effect(self, effect):
+        return run(effect, lambda loop, intent, box: self.pool(intent, box),
+                   self.loop)
+
+    def test_read(self):
+        """
+        The response is available before the body, which is read a chunk at
+        a time until an empty chunk.
+        """
+        def read_all(response, chunks):
+            def got(chunk):
+                if not chunk:
+                    return (response.code, b''.join(chunks))
+                chunks.append(chunk)
+                return read_all(response, chunks)
+            return response.body.read().on(success=got)
+
+        eff = Effect(StreamingHTTPRequest('get', self.url('/chunked'))).on(
+            success=lambda response: read_all(response, []))
+        self.assertEqual(self.run_effect(eff), (200, b'hello chunked world'))
+
+    def test_fold_incremental_json(self):
+        """
+        fold processes the body incrementally, which allows for parsing
+        newline-delimited JSON without holding the whole body.
+        """
+        def parse(state, chunk):
+            partial_line, total = state
+            lines = (partial_line + chunk).split(b'\n')
+            for line in lines[:-1]:
+                total += json.loads(line.decode('ascii'))['n']
+            return (lines[-1], total)
+
+        eff = Effect(StreamingHTTPRequest('get', self.url('/lines/1000'))).on(
+            success=lambda response: response.body.fold(parse, (b'', 0)))
+        self.assertEqual(self.run_effect(eff), (b'', sum(range(1000))))
+
+    def test_backpressure(self):
+        """
+        When more than high_water bytes are waiting to be read, the connection
+        stops being read from until the consumer catches up.
+        """
+        responses = []
+        self.run_effect(
+            Effect(StreamingHTTPRequest('get', self.url('/lines/100000'))).on(
+                success=responses.append))
+        # Nothing is reading the body, so the loop runs out of work once
+        # reading is paused.
+        self.loop.run()
+        stream = responses[0].body
+        self.assertTrue(stream._paused)
+        self.assertTrue(stream._buffered <= 1024 + 65536)
+        lines = self.run_effect(
+            stream.fold(lambda n, chunk: n + chunk.count(b'\n'), 0))
+        self.assertEqual(lines, 100000)
+
+    def test_paused_and_finished(self):
+        """
+        A body which goes over high_water and is complete in the same read
+        from the connection can still be read to the end.
+        """
+        self.pool.high_water = 10
+        path = '/' + 'x' * 99
+        responses = []
+        self.run_effect(
+            Effect(StreamingHTTPRequest('get', self.url(path))).on(
+                success=responses.append))
+        self.loop.run()
+        body = self.run_effect(responses[0].body.fold(
+            lambda body, chunk: body + chunk, b''))
+        self.assertEqual(body, path.encode('ascii'))
+
+    def test_close(self):
+        """
+        Closing a stream before it's been read closes the connection, so the
+        next request uses a new one.
+        """
+        url = self.url('/lines/100000')
+        eff = Effect(StreamingHTTPRequest('get', url)).on(
+            success=lambda response: response.body.close()).on(
+            success=lambda _: Effect(HTTPRequest('get', self.url('/after'))))
+        self.assertEqual(self.run_effect(eff).body, b'/after')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_reuse_after_stream(self):
+        """Connections are reused once a stream has been read to the end."""
+        eff = Effect(StreamingHTTPRequest('get', self.url('/lines/10'))).on(
+            success=lambda response: response.body.fold(
+                lambda a, b: None, None)).on(
+            success=lambda _: Effect(HTTPRequest('get', self.url('/after'))))
+        self.assertEqual(self.run_effect(eff).body, b'/after')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_failure_before_head(self):
+        """If the request fails before the head arrives, the effect fails."""
+        self.assertThat(
+            lambda: self.run_effect(
+                Effect(StreamingHTTPRequest('get', 'https://example.com/'))),
+            raises(ValueError))
+
+
+class HTTPResponseTests(TestCase):
+    """Tests for :class:`HTTPResponse`."""
+
+    def test_get_header(self):
+        """get_header looks up headers case-insensitively."""
+        response = HTTPResponse(200, 'OK', [('Content-Type', 'text/plain')],
+                                b'')
+        self.assertEqual(response.get_header('content-type'), 'text/plain')
+        self.assertIs(response.get_header('x-missing'), None)
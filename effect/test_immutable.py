@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+
+import copy
+import gc
+import pickle
+import threading
+import weakref
+
+from testtools import TestCase
+
+from . import Effect, sync_perform
+from .immutable import immutable
+
+
+@immutable(['a', 'b'], defaults={'b': 'default'})
+class Plain(object):
+    """An immutable intent."""
+
+    def perform_effect(self, dispatcher):
+        return (self.a, self.b)
+
+
+@immutable(['a', 'b'], defaults={'b': 'default'}, intern=True)
+class Interned(object):
+    """An interned intent."""
+
+
+class ImmutableTests(TestCase):
+    """Tests for :func:`immutable`."""
+
+    def test_attributes(self):
+        """Attributes are passed by position or by name, or defaulted."""
+        self.assertEqual((Plain(1, 2).a, Plain(1, 2).b), (1, 2))
+        self.assertEqual(Plain(b=2, a=1).b, 2)
+        self.assertEqual(Plain(1).b, 'default')
+
+    def test_bad_arguments(self):
+        """Missing, unexpected and extra arguments are TypeErrors."""
+        self.assertRaises(TypeError, Plain)
+        self.assertRaises(TypeError, Plain, 1, c=3)
+        self.assertRaises(TypeError, Plain, 1, 2, 3)
+
+    def test_immutable(self):
+        """Attributes can't be set or deleted."""
+        intent = Plain(1)
+        self.assertRaises(AttributeError, setattr, intent, 'a', 2)
+        self.assertRaises(AttributeError, setattr, intent, 'c', 2)
+        self.assertRaises(AttributeError, delattr, intent, 'a')
+        self.assertEqual(intent.a, 1)
+
+    def test_equality(self):
+        """
+        Instances are equal when their classes and attributes are, and hash
+        like tuples of their attributes.
+        """
+        self.assertEqual(Plain(1, 2), Plain(1, 2))
+        self.assertFalse(Plain(1, 2) != Plain(1, 2))
+        self.assertNotEqual(Plain(1, 2), Plain(1, 3))
+        self.assertNotEqual(Plain(1, 2), Interned(1, 2))
+        self.assertEqual(hash(Plain(1, 2)), hash((1, 2)))
+        self.assertEqual({Plain(1, 2): 'x'}[Plain(1, 2)], 'x')
+
+    def test_ordering(self):
+        """Instances order like tuples of their attributes."""
+        self.assertEqual(sorted([Plain(2), Plain(1, 'z'), Plain(1, 'a')]),
+                         [Plain(1, 'a'), Plain(1, 'z'), Plain(2)])
+
+    def test_unhashable(self):
+        """
+        Instances with unhashable attributes can still be made and compared,
+        but hashing them raises TypeError.
+        """
+        self.assertEqual(Plain([1]), Plain([1]))
+        self.assertRaises(TypeError, hash, Plain([1]))
+        self.assertIsNot(Interned([1]), Interned([1]))
+        self.assertEqual(Interned([1]), Interned([1]))
+
+    def test_repr(self):
+        """The repr shows the attributes."""
+        self.assertEqual(repr(Plain(1, 'x')), "<Plain(a=1, b='x')>")
+
+    def test_pickle_and_copy(self):
+        """Instances can be pickled and copied."""
+        self.assertEqual(pickle.loads(pickle.dumps(Plain(1, 2))), Plain(1, 2))
+        self.assertEqual(copy.deepcopy(Plain(1, (2,))), Plain(1, (2,)))
+        self.assertIs(pickle.loads(pickle.dumps(Interned(1))), Interned(1))
+
+    def test_intern(self):
+        """Equal instances of an interned class are the same instance."""
+        self.assertIs(Interned(1), Interned(1, 'default'))
+        self.assertIsNot(Interned(1), Interned(2))
+        self.assertIsNot(Plain(1), Plain(1))
+
+    def test_intern_types(self):
+        """
+        Instances whose attributes are equal, but of different types, aren't
+        the same instance.
+        """
+        one = Interned(1)
+        self.assertIs(type(Interned(True).a), bool)
+        self.assertIs(type(Interned(1.0).a), float)
+        self.assertIs(Interned(1), one)
+
+    def test_intern_nested_types(self):
+        """
+        Items of tuples and frozensets of different types aren't swapped for
+        each other either.
+        """
+        one = Interned((1, (2,)))
+        self.assertIs(type(Interned((1.0, (2,))).a[0]), float)
+        self.assertIs(type(Interned((1, (2.0,))).a[1][0]), float)
+        self.assertIs(Interned((1, (2,))), one)
+        ones = Interned(frozenset([1]))
+        self.assertIs(type(list(Interned(frozenset([1.0])).a)[0]), float)
+        self.assertIs(Interned(frozenset([1])), ones)
+
+    def test_intern_equality(self):
+        """
+        Interned instances whose attributes are equal but of different types
+        are equal, consistently with their hashes and ordering, and with
+        classes that aren't interned.
+        """
+        one, one_float = Interned(1), Interned(1.0)
+        self.assertIsNot(one, one_float)
+        self.assertEqual(one, one_float)
+        self.assertFalse(one != one_float)
+        self.assertEqual(hash(one), hash(one_float))
+        self.assertTrue(one <= one_float and one >= one_float)
+        self.assertEqual(Plain(1), Plain(1.0))
+        self.assertNotEqual(one, Interned(2))
+
+    def test_intern_threads(self):
+        """
+        Instances made at the same time in different threads are interned
+        as one.
+        """
+        made = [[] for _ in range(8)]
+        start = threading.Event()
+
+        def make(instances):
+            start.wait()
+            for i in range(500):
+                instances.append(Interned('threads', i))
+        threads = [threading.Thread(target=make, args=(instances,))
+                   for instances in made]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        for instances in made[1:]:
+            self.assertTrue(all(a is b for a, b in zip(made[0], instances)))
+
+    def test_intern_weak(self):
+        """Interned instances are forgotten once nothing refers to them."""
+        ref = weakref.ref(Interned('weak'))
+        gc.collect()
+        self.assertIs(ref(), None)
+        self.assertEqual(Interned('weak').a, 'weak')
+
+    def test_subclass_not_interned(self):
+        """Subclasses of an interned class aren't interned with it."""
+        class Sub(Interned):
+            pass
+        self.assertIsNot(Sub(1), Interned(1))
+        self.assertNotEqual(Sub(1), Interned(1))
+        self.assertEqual(Sub(1), Sub(1))
+
+    def test_perform(self):
+        """Immutable intents are performed like any other."""
+        self.assertEqual(sync_perform(Effect(Plain(1))), (1, 'default'))
@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+
+import socket
+
+from testtools import TestCase
+from testtools.matchers import raises
+
+from . import Effect, ConstantIntent, Delay, FuncIntent, parallel
+from ._test_utils import FakeClock
+from .loop import EventLoop, WaitReadable, WaitWritable, perform, run
+from .test_effect import ErrorIntent
+
+
+class EventLoopTests(TestCase):
+    """Tests for :class:`EventLoop`."""
+
+    def test_call_soon(self):
+        """Calls queued with call_soon are run in order by run."""
+        loop = EventLoop()
+        calls = []
+        loop.call_soon(calls.append, 1)
+        loop.call_soon(calls.append, 2)
+        loop.run()
+        self.assertEqual(calls, [1, 2])
+
+    def test_call_later_order(self):
+        """Timers fire in order of their deadline."""
+        loop = EventLoop()
+        calls = []
+        loop.call_later(0.02, calls.append, 'late')
+        loop.call_later(0.01, calls.append, 'early')
+        loop.run()
+        self.assertEqual(calls, ['early', 'late'])
+
+    def test_cancel(self):
+        """Cancelled timers don't fire."""
+        loop = EventLoop()
+        calls = []
+        loop.call_later(0, calls.append, 'cancelled').cancel()
+        loop.call_later(0, calls.append, 'fired')
+        loop.run()
+        self.assertEqual(calls, ['fired'])
+
+    def test_reader(self):
+        """Readers are called when their file object is readable."""
+        loop = EventLoop()
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        calls = []
+
+        def readable():
+            calls.append(a.recv(10))
+            loop.remove_reader(a)
+
+        loop.add_reader(a, readable)
+        loop.call_later(0.01, b.send, b'hi')
+        loop.run()
+        self.assertEqual(calls, [b'hi'])
+
+
+class PerformTests(TestCase):
+    """Tests for :func:`perform` and :func:`run`."""
+
+    def test_run(self):
+        """run returns the result of the effect."""
+        self.assertEqual(
+            run(Effect(ConstantIntent('foo')).on(success=lambda r: r + '!')),
+            'foo!')
+
+    def test_run_error(self):
+        """run raises the error that the effect failed with."""
+        self.assertThat(lambda: run(Effect(ErrorIntent())),
+                        raises(ValueError('oh dear')))
+
+    def test_delay(self):
+        """Delay intents are performed with a timer and result in None."""
+        clock = FakeClock()
+        loop = EventLoop(clock=clock)
+        calls = []
+        perform(loop, Effect(Delay(5)).on(success=calls.append))
+        loop._run_once()
+        self.assertEqual(calls, [])
+        clock.now = 5
+        loop._run_once()
+        self.assertEqual(calls, [None])
+
+    def test_parallel(self):
+        """
+        Parallel effects are performed concurrently, and result in a list of
+        their results in order.
+        """
+        calls = []
+        eff = parallel([
+            Effect(Delay(0.02)).on(success=lambda r: calls.append('a') or 'a'),
+            Effect(Delay(0.01)).on(success=lambda r: calls.append('b') or 'b'),
+        ])
+        self.assertEqual(run(eff), ['a', 'b'])
+        self.assertEqual(calls, ['b', 'a'])
+
+    def test_parallel_empty(self):
+        """A parallel effect with no children results in an empty list."""
+        self.assertEqual(run(parallel([])), [])
+
+    def test_parallel_error(self):
+        """A failing child fails the whole parallel effect."""
+        eff = parallel([Effect(ConstantIntent('a')), Effect(ErrorIntent())])
+        self.assertThat(lambda: run(eff), raises(ValueError('oh dear')))
+
+    def test_deeply_nested_parallel(self):
+        """Deeply nested parallel effects are performed in constant stack."""
+        eff = Effect(Delay(0))
+        for i in range(10000):
+            eff = parallel([eff]).on(success=lambda r: r[0])
+        self.assertIs(run(eff), None)
+
+    def test_many_effects(self):
+        """Many effect trees can be run concurrently on one loop."""
+        loop = EventLoop()
+        results = []
+        for i in range(10):
+            perform(loop, Effect(Delay(0.01 * (10 - i))).on(
+                success=lambda r, i=i: results.append(i)))
+        loop.run()
+        self.assertEqual(results, list(reversed(range(10))))
+
+    def test_wait_readable_writable(self):
+        """
+        WaitReadable and WaitWritable result in None when their file object
+        becomes ready.
+        """
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        a.setblocking(False)
+        b.setblocking(False)
+        eff = parallel([
+            Effect(WaitReadable(a)).on(success=lambda r: a.recv(10)),
+            Effect(WaitWritable(b)).on(
+                success=lambda r: Effect(FuncIntent(lambda: b.send(b'hi')))),
+        ])
+        self.assertEqual(run(eff), [b'hi', 2])
+
+    def test_wait_readable_twice(self):
+        """
+        Every WaitReadable intent waiting for the same file object results in
+        None once it becomes readable, not just the last one performed.
+        """
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        b.send(b'hi')
+        eff = parallel([Effect(WaitReadable(a)), Effect(WaitReadable(a)),
+                        Effect(WaitReadable(a.fileno()))])
+        self.assertEqual(run(eff), [None, None, None])
+
+    def test_wait_readable_and_writable(self):
+        """
+        WaitReadable and WaitWritable on the same file object each wait for
+        their own event.
+        """
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        eff = parallel([
+            Effect(WaitReadable(a)).on(success=lambda r: a.recv(10)),
+            Effect(WaitWritable(a)).on(
+                success=lambda r: Effect(FuncIntent(lambda: b.send(b'hi')))),
+        ])
+        self.assertEqual(run(eff), [b'hi', 2])
@@ -0,0 +1,208 @@
+from __future__ import absolute_import
+
+from testtools import TestCase
+
+from . import (
+    Effect, ConstantIntent, ParallelEffects, default_dispatcher, parallel,
+    perform, sync_perform)
+from ._test_utils import Later, keeping_dispatcher
+from .fan_out import fan_out
+from .priority import (
+    BoundedDispatcher, HIGH, LOW, NORMAL, PriorityQueue, WithPriority,
+    priority_of, with_priority)
+
+
+class PriorityOfTests(TestCase):
+    """Tests for :func:`priority_of` and :func:`with_priority`."""
+
+    def test_default(self):
+        """Intents without a priority are NORMAL."""
+        self.assertEqual(priority_of(ConstantIntent(1)), NORMAL)
+        self.assertEqual(priority_of(Later('a')), NORMAL)
+
+    def test_attribute(self):
+        """An intent's priority attribute is its priority class."""
+        self.assertEqual(priority_of(Later('a', HIGH)), HIGH)
+
+    def test_invalid(self):
+        """Priorities that aren't priority classes are rejected."""
+        for priority in ['urgent', 3, -1, 1.0, True]:
+            self.assertRaises(ValueError, priority_of, Later('a', priority))
+
+    def test_with_priority(self):
+        """
+        with_priority wraps the intent, keeping the effect's callbacks, and
+        dispatchers that don't know about priority perform the wrapped intent.
+        """
+        eff = with_priority(
+            Effect(ConstantIntent(1)).on(success=lambda r: r + 1), LOW)
+        self.assertEqual(eff.intent, WithPriority(ConstantIntent(1), LOW))
+        self.assertEqual(sync_perform(eff), 2)
+
+
+class PriorityQueueTests(TestCase):
+    """Tests for :class:`PriorityQueue`."""
+
+    def pop_all(self, queue):
+        items = []
+        while queue:
+            items.append(queue.pop())
+        return items
+
+    def test_highest_first(self):
+        """
+        Items are taken highest priority first, and in the order they were
+        pushed within a priority class.
+        """
+        queue = PriorityQueue()
+        queue.push('n1')
+        queue.push('l1', LOW)
+        queue.push('h1', HIGH)
+        queue.push('n2', NORMAL)
+        queue.push('h2', HIGH)
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(queue.lengths(), [2, 2, 1])
+        self.assertEqual(self.pop_all(queue), ['h1', 'h2', 'n1', 'n2', 'l1'])
+
+    def test_push_front(self):
+        """push_front puts an item at the front of its priority class."""
+        queue = PriorityQueue()
+        queue.push('n1')
+        queue.push_front('n0')
+        queue.push_front('l0', LOW)
+        self.assertEqual(self.pop_all(queue), ['n0', 'n1', 'l0'])
+
+    def test_empty(self):
+        """Popping from an empty queue raises IndexError."""
+        self.assertRaises(IndexError, PriorityQueue().pop)
+
+    def test_invalid_priority(self):
+        """Items can only be pushed with one of the priority classes."""
+        queue = PriorityQueue()
+        self.assertRaises(ValueError, queue.push, 'a', -1)
+        self.assertRaises(ValueError, queue.push_front, 'a', 'urgent')
+        self.assertEqual(len(queue), 0)
+
+    def test_starvation(self):
+        """
+        Once starvation_limit items have been taken ahead of a waiting item of
+        a lower class, one item of that class is taken.
+        """
+        queue = PriorityQueue(starvation_limit=2)
+        for i in range(6):
+            queue.push('h%d' % (i,), HIGH)
+        queue.push('n0')
+        queue.push('n1')
+        queue.push('l0', LOW)
+        self.assertEqual(
+            self.pop_all(queue),
+            ['h0', 'h1', 'n0', 'l0', 'h2', 'h3', 'n1', 'h4', 'h5'])
+
+    def test_starvation_only_while_waiting(self):
+        """Items taken while a class has nothing waiting don't count."""
+        queue = PriorityQueue(starvation_limit=2)
+        for i in range(3):
+            queue.push('h%d' % (i,), HIGH)
+        self.assertEqual(self.pop_all(queue), ['h0', 'h1', 'h2'])
+        queue.push('h3', HIGH)
+        queue.push('h4', HIGH)
+        queue.push('l0', LOW)
+        self.assertEqual(self.pop_all(queue), ['h3', 'h4', 'l0'])
+
+
+class BoundedDispatcherTests(TestCase):
+    """Tests for :class:`BoundedDispatcher`."""
+
+    def setUp(self):
+        super(BoundedDispatcherTests, self).setUp()
+        self.boxes = []
+        self.names = []
+        self.bounded = BoundedDispatcher(self.keeping, 2)
+        self.keep = keeping_dispatcher(self.boxes)
+
+    def keeping(self, intent, box):
+        if type(intent) is Later:
+            self.names.append(intent.name)
+        self.keep(intent, box)
+
+    def dispatcher(self, intent, box):
+        if type(intent) is ParallelEffects:
+            fan_out(intent, self.dispatcher, box)
+        else:
+            self.bounded(intent, box)
+
+    def started(self):
+        return self.names
+
+    def test_limit(self):
+        """
+        No more than the limit of intents are performed at once; the rest
+        start as others finish, highest priority first.
+        """
+        results = []
+        eff = parallel([
+            Effect(Later('n0')), Effect(Later('l0', LOW)),
+            with_priority(Effect(Later('l1')), LOW), Effect(Later('n1')),
+            Effect(Later('h0', HIGH)), Effect(Later('n2'))])
+        perform(eff.on(success=results.append), self.dispatcher)
+        self.assertEqual(self.started(), ['n0', 'l0'])
+        self.assertEqual(self.bounded.active, 2)
+        self.assertEqual(len(self.bounded.queue), 4)
+        self.boxes[0].succeed('n0')
+        self.assertEqual(self.started(), ['n0', 'l0', 'h0'])
+        self.boxes[1].fail((ValueError, ValueError(), None))
+        self.assertEqual(self.started(), ['n0', 'l0', 'h0', 'n1'])
+        self.assertEqual(self.bounded.active, 2)
+
+    def test_results(self):
+        """Results and errors are passed through."""
+        bounded = BoundedDispatcher(default_dispatcher, 1)
+        self.assertEqual(sync_perform(Effect(ConstantIntent(1)), bounded), 1)
+        self.assertEqual(bounded.active, 0)
+
+    def test_invalid_priority(self):
+        """
+        Intents with a priority that isn't a priority class fail with
+        ValueError, without taking a place.
+        """
+        results = []
+        perform(parallel([
+            Effect(Later('a', 'urgent')),
+            with_priority(Effect(Later('b')), 5)]).on(
+                error=results.append), self.dispatcher)
+        self.assertIs(results[0][0], ValueError)
+        self.assertEqual((self.started(), self.bounded.active), ([], 0))
+
+    def test_completed_twice(self):
+        """A box completed twice frees only one place."""
+        perform(Effect(Later('a')), self.dispatcher)
+        self.boxes[0].succeed(None)
+        self.boxes[0].succeed(None)
+        self.assertEqual(self.bounded.active, 0)
+
+    def test_dispatcher_raises(self):
+        """
+        If the dispatcher raises an exception, the intent fails and its place
+        is freed.
+        """
+        def raising(intent, box):
+            raise RuntimeError('bad dispatcher')
+        bounded = BoundedDispatcher(raising, 1)
+        eff = Effect(ConstantIntent(1)).on(error=lambda e: e[0])
+        self.assertIs(sync_perform(eff, bounded), RuntimeError)
+        self.assertEqual(bounded.active, 0)
+
+    def test_synchronous_queue(self):
+        """
+        A long queue of intents that complete synchronously is drained without
+        growing the stack.
+        """
+        self.bounded.limit = 1
+        results = []
+        perform(parallel([Effect(Later('first'))] + [
+            Effect(ConstantIntent(i)) for i in range(5000)]).on(
+                success=results.append),
+            self.dispatcher)
+        self.assertEqual(len(self.bounded.queue), 5000)
+        self.boxes[0].succeed('first')
+        self.assertEqual(results, [['first'] + list(range(5000))])
@@ -0,0 +1,177 @@
+from __future__ import absolute_import
+
+from functools import partial
+
+from testtools import TestCase
+
+from . import Effect, ConstantIntent, guard, perform, sync_perform
+from ._test_utils import FakeClock
+from .profiling import (
+    CallbackProfiler, callback_name, disable_profiling, enable_profiling,
+    get_profiler)
+from .stats import prometheus_text
+
+
+def parse(result):
+    return result
+
+
+class Parser(object):
+    def parse(self, result):
+        return result
+
+
+class CallbackNameTests(TestCase):
+    """Tests for :func:`callback_name`."""
+
+    def test_function(self):
+        """Functions are named by their module and name."""
+        self.assertEqual(callback_name(parse), 'effect.test_profiling.parse')
+
+    def test_method(self):
+        """Methods are named by their class too."""
+        self.assertEqual(callback_name(Parser().parse),
+                         'effect.test_profiling.Parser.parse')
+
+    def test_lambda(self):
+        """Lambdas are told apart by their line number."""
+        first = lambda r: r
+        second = lambda r: r
+        self.assertNotEqual(callback_name(first), callback_name(second))
+        self.assertIn('<lambda>:', callback_name(first))
+
+    def test_partial(self):
+        """Partials are named after the function they call."""
+        self.assertEqual(callback_name(partial(parse, 1)),
+                         'effect.test_profiling.parse')
+
+    def test_builtin(self):
+        """Builtins are named too."""
+        self.assertIn('append', callback_name([].append))
+
+
+class CallbackProfilerTests(TestCase):
+    """Tests for :class:`CallbackProfiler`."""
+
+    def setUp(self):
+        super(CallbackProfilerTests, self).setUp()
+        self.slow = []
+        self.clock = FakeClock()
+        self.cpu_clock = FakeClock()
+        self.profiler = CallbackProfiler(
+            threshold=0.5, on_slow=lambda *args: self.slow.append(args),
+            clock=self.clock, cpu_clock=self.cpu_clock)
+
+    def parse(self, result):
+        """A callback which takes 0.1s, of which 0.05s is CPU time."""
+        self.clock.now += 0.1
+        self.cpu_clock.now += 0.05
+        return result
+
+    def test_call(self):
+        """Calls are timed, and counted by the callback's name."""
+        self.assertEqual(self.profiler.call(self.parse, (1,), {}), 1)
+        self.profiler.call(self.parse, (2,), {})
+        stats = self.profiler.callbacks[callback_name(self.parse)]
+        self.assertEqual(stats.calls, 2)
+        self.assertAlmostEqual(stats.wall, 0.2)
+        self.assertAlmostEqual(stats.cpu, 0.1)
+        self.assertAlmostEqual(stats.max_wall, 0.1)
+        self.assertEqual((stats.slow, self.slow), (0, []))
+
+    def test_raises(self):
+        """Calls that raise are timed too."""
+        self.assertRaises(ZeroDivisionError, self.profiler.call,
+                          lambda: 1 / 0, (), {})
+        self.assertEqual(
+            [stats.calls for stats in self.profiler.callbacks.values()], [1])
+
+    def test_slow(self):
+        """
+        Calls that take longer than the threshold are counted, kept and
+        passed to on_slow.
+        """
+        self.profiler.record(parse, 0.6, 0.4)
+        self.profiler.record(parse, 0.2, 0.1)
+        name = 'effect.test_profiling.parse'
+        self.assertEqual(self.profiler.callbacks[name].slow, 1)
+        self.assertEqual(list(self.profiler.slow_calls), [(name, 0.6, 0.4)])
+        self.assertEqual(self.slow, [(name, 0.6, 0.4)])
+
+    def test_top_and_report(self):
+        """
+        Callbacks are ranked by the total wall clock time spent in them, and
+        reported as a table.
+        """
+        self.profiler.record(parse, 0.1, 0.1)
+        self.profiler.record(Parser().parse, 0.3, 0.1)
+        self.assertEqual([stats.name for stats in self.profiler.top()],
+                         ['effect.test_profiling.Parser.parse',
+                          'effect.test_profiling.parse'])
+        self.assertEqual(len(self.profiler.top(1)), 1)
+        report = self.profiler.report().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertTrue(report[1].endswith('Parser.parse'))
+
+    def test_export(self):
+        """The totals can be exported like runtime statistics."""
+        self.profiler.record(parse, 0.25, 0.125)
+        text = self.profiler.export(prometheus_text)
+        self.assertIn(
+            'effect_callback_wall_seconds_total'
+            '{callback="effect.test_profiling.parse"} 0.25', text)
+        self.assertIn(
+            'effect_callback_calls_total'
+            '{callback="effect.test_profiling.parse"} 1', text)
+
+    def test_reset(self):
+        """reset forgets everything recorded."""
+        self.profiler.record(parse, 0.6, 0.4)
+        self.profiler.reset()
+        self.assertEqual((self.profiler.callbacks,
+                          list(self.profiler.slow_calls)), ({}, []))
+
+
+class ProfilingTests(TestCase):
+    """Tests for profiling the callbacks the interpreter runs."""
+
+    def setUp(self):
+        super(ProfilingTests, self).setUp()
+        self.addCleanup(disable_profiling)
+
+    def test_disabled(self):
+        """Profiling is off unless it's enabled."""
+        self.assertIs(get_profiler(), None)
+        self.assertEqual(guard(parse, 1), (False, 1))
+
+    def test_enable(self):
+        """enable_profiling makes a profiler with the given arguments."""
+        profiler = enable_profiling(threshold=2)
+        self.assertIs(get_profiler(), profiler)
+        self.assertEqual(profiler.threshold, 2)
+        disable_profiling()
+        self.assertIs(get_profiler(), None)
+
+    def test_guard(self):
+        """guard records the functions it runs, even when they raise."""
+        profiler = enable_profiling()
+        self.assertEqual(guard(parse, 1), (False, 1))
+        is_error, exc_info = guard(lambda: 1 / 0)
+        self.assertEqual((is_error, exc_info[0]), (True, ZeroDivisionError))
+        self.assertEqual(
+            profiler.callbacks['effect.test_profiling.parse'].calls, 1)
+        self.assertEqual(len(profiler.callbacks), 2)
+
+    def test_callbacks(self):
+        """The callbacks of performed effects are profiled."""
+        profiler = enable_profiling()
+        parser = Parser()
+        eff = Effect(ConstantIntent(1)).on(success=parse).on(
+            success=parser.parse)
+        self.assertEqual(sync_perform(eff), 1)
+        perform(eff)
+        self.assertEqual(
+            sorted((name, stats.calls)
+                   for name, stats in profiler.callbacks.items()),
+            [('effect.test_profiling.Parser.parse', 2),
+             ('effect.test_profiling.parse', 2)])
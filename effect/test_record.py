@@ -0,0 +1,176 @@
+from __future__ import absolute_import
+
+import os
+import pickle
+import tempfile
+
+from testtools import TestCase
+from testtools.matchers import raises
+
+from . import (Effect, ConstantIntent, ErrorIntent, FuncIntent,
+               default_dispatcher, parallel, perform, sync_perform)
+from . import record as record_module
+from .record import (
+    NotRecordedError, RecordedError, RecordingDispatcher, ReplayDispatcher,
+    read_log)
+
+
+class NeedsArgs(Exception):
+    """An exception which can be pickled, but not unpickled."""
+
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class RaiseNeedsArgs(object):
+    """An intent which fails with a :class:`NeedsArgs`."""
+
+    def perform_effect(self, dispatcher):
+        raise NeedsArgs(3, 'gone')
+
+
+class RecordReplayTests(TestCase):
+    """Tests for :class:`RecordingDispatcher` and :class:`ReplayDispatcher`."""
+
+    def setUp(self):
+        super(RecordReplayTests, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def record(self, *effects):
+        """Perform effects with a recording dispatcher, return the results."""
+        results = []
+        with open(self.path, 'ab') as log_file:
+            dispatcher = RecordingDispatcher(log_file, default_dispatcher)
+            for effect in effects:
+                try:
+                    results.append(sync_perform(effect, dispatcher))
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def replay(self):
+        dispatcher = ReplayDispatcher(self.path)
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_replay_success(self):
+        """Recorded results are replayed without performing the intent."""
+        self.record(Effect(ConstantIntent('foo')))
+        self.assertEqual(
+            sync_perform(Effect(ConstantIntent('foo')), self.replay()),
+            'foo')
+
+    def test_replay_error(self):
+        """Recorded exceptions are replayed as failures."""
+        self.record(Effect(ErrorIntent(ValueError('oh no'))))
+        self.assertThat(
+            lambda: sync_perform(Effect(ErrorIntent(ValueError('oh no'))),
+                                 self.replay()),
+            raises(ValueError('oh no')))
+
+    def test_repeated_intents(self):
+        """
+        Outcomes of an intent that was performed several times are replayed
+        in the order they were recorded.
+        """
+        self.record(Effect(ConstantIntent('a')), Effect(ConstantIntent('b')),
+                    Effect(ConstantIntent('a')))
+        replay = self.replay()
+        self.assertEqual(
+            [sync_perform(Effect(ConstantIntent(x)), replay)
+             for x in ['a', 'b', 'a']],
+            ['a', 'b', 'a'])
+        self.assertThat(
+            lambda: sync_perform(Effect(ConstantIntent('a')), replay),
+            raises(NotRecordedError))
+
+    def test_parallel(self):
+        """
+        The children of parallel effects are recorded and replayed one by
+        one.
+        """
+        def effects():
+            return parallel([
+                Effect(ConstantIntent('a')).on(success=lambda r: r + '!'),
+                Effect(ConstantIntent('b'))])
+        self.assertEqual(self.record(effects()), [['a!', 'b']])
+        self.assertEqual(sorted(r.intent for r in read_log(self.path)),
+                         [ConstantIntent('a'), ConstantIntent('b')])
+        self.assertEqual(sync_perform(effects(), self.replay()), ['a!', 'b'])
+
+    def test_not_recorded(self):
+        """Intents that aren't in the log fail with NotRecordedError."""
+        self.record(Effect(ConstantIntent('foo')))
+        self.assertThat(
+            lambda: sync_perform(Effect(ConstantIntent('bar')),
+                                 self.replay()),
+            raises(NotRecordedError))
+
+    def test_unpicklable(self):
+        """Unpicklable intents are performed, but not recorded."""
+        self.assertEqual(self.record(Effect(FuncIntent(lambda: 'foo'))),
+                         ['foo'])
+        self.assertEqual(read_log(self.path), [])
+
+    def test_unpicklable_error(self):
+        """
+        Exceptions that can't be unpickled are recorded as RecordedErrors
+        describing them.
+        """
+        self.record(Effect(RaiseNeedsArgs()))
+        results = []
+        perform(Effect(RaiseNeedsArgs()).on(
+            error=results.append), self.replay())
+        [(exc_type, exc, _)] = results
+        self.assertIs(exc_type, RecordedError)
+        self.assertEqual(
+            (exc.type_name, exc.description),
+            ('effect.test_record.NeedsArgs', repr(NeedsArgs(3, 'gone'))))
+        self.assertEqual(read_log(self.path)[0].result.description,
+                         repr(NeedsArgs(3, 'gone')))
+
+    def test_unloadable_outcome(self):
+        """
+        When a logged outcome can't be unpickled, replaying it fails with the
+        exception raised trying, and read_log returns that exception.
+        """
+        self.patch(record_module, '_dump_error', pickle.dumps)
+        self.record(Effect(RaiseNeedsArgs()))
+        results = []
+        perform(Effect(RaiseNeedsArgs()).on(
+            error=results.append), self.replay())
+        self.assertIs(results[0][0], TypeError)
+        [record] = read_log(self.path)
+        self.assertEqual((record.is_error, type(record.result)),
+                         (True, TypeError))
+
+    def test_append(self):
+        """Records are appended to an existing log."""
+        self.record(Effect(ConstantIntent('a')))
+        self.record(Effect(ConstantIntent('b')))
+        self.assertEqual([r.intent for r in read_log(self.path)],
+                         [ConstantIntent('a'), ConstantIntent('b')])
+
+    def test_read_log(self):
+        """read_log returns the outcome and timing of every record."""
+        times = iter([10, 13])
+        with open(self.path, 'ab') as log_file:
+            sync_perform(
+                Effect(ConstantIntent('foo')),
+                RecordingDispatcher(log_file, default_dispatcher,
+                                    clock=lambda: next(times)))
+        [record] = read_log(self.path)
+        self.assertEqual(
+            (record.intent, record.is_error, record.result, record.start,
+             record.duration),
+            (ConstantIntent('foo'), False, 'foo', 10, 3))
+
+    def test_truncated_record(self):
+        """A partly-written record at the end of the log is ignored."""
+        self.record(Effect(ConstantIntent('a')), Effect(ConstantIntent('b')))
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        self.assertEqual([r.result for r in read_log(self.path)], ['a'])
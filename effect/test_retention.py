@@ -0,0 +1,177 @@
+"""
+Tests that nothing keeps results, or the effects and callbacks that produced
+them, alive once they've been delivered, even when the dispatcher keeps the
+boxes it was given.
+"""
+
+from __future__ import absolute_import
+
+import gc
+import sys
+import weakref
+
+from unittest import skipIf
+
+from testtools import TestCase
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from . import (
+    Effect, ConstantIntent, NotSynchronousError, parallel, perform,
+    sync_perform)
+from ._test_utils import Later, keeping_dispatcher
+
+
+class Big(object):
+    """A result that can be referred to weakly."""
+
+
+class BigError(Exception):
+    """An exception that can be referred to weakly."""
+
+
+class RetentionTests(TestCase):
+    """
+    Tests that results, intermediate effects and callbacks can be collected
+    as soon as they've been used.
+    """
+
+    def setUp(self):
+        super(RetentionTests, self).setUp()
+        self.boxes = []
+        self.dispatcher = keeping_dispatcher(self.boxes, keep_all=True)
+
+    def test_asynchronous_result(self):
+        """
+        A result given to a kept box after the trampoline has finished is
+        released once the callbacks have run.
+        """
+        seen = []
+        perform(Effect(Later()).on(success=lambda r: seen.append(1)),
+                self.dispatcher)
+        result = Big()
+        ref = weakref.ref(result)
+        self.boxes[0].succeed(result)
+        del result
+        self.assertEqual(seen, [1])
+        self.assertIs(ref(), None)
+
+    def test_synchronous_result(self):
+        """
+        A result given to a kept box while the trampoline is running is
+        released once the callbacks have run.
+        """
+        result = Big()
+        ref = weakref.ref(result)
+        perform(Effect(ConstantIntent(result)).on(success=lambda r: None),
+                self.dispatcher)
+        del result
+        self.assertIs(ref(), None)
+
+    def test_callbacks(self):
+        """
+        A kept box doesn't keep the callbacks of its effect once it's been
+        given a result.
+        """
+        def callback(result):
+            pass
+        ref = weakref.ref(callback)
+        perform(Effect(Later()).on(success=callback), self.dispatcher)
+        del callback
+        self.assertIsNot(ref(), None)
+        self.boxes[0].succeed('a')
+        self.assertIs(ref(), None)
+
+    def test_intermediate_effects(self):
+        """
+        Effects returned by callbacks, and their results, are released once
+        they've been performed.
+        """
+        refs = []
+
+        def next_effect(result):
+            eff = Effect(ConstantIntent(Big()))
+            refs.append(weakref.ref(eff))
+            refs.append(weakref.ref(eff.intent.result))
+            return eff
+
+        perform(Effect(Later()).on(success=next_effect).on(
+            success=lambda r: None), self.dispatcher)
+        self.boxes[0].succeed('a')
+        self.assertEqual([ref() for ref in refs], [None, None])
+
+    def test_error(self):
+        """
+        An exception given to a kept box is released once the callbacks have
+        run, although its traceback may need the cycle collector.
+        """
+        perform(Effect(Later()).on(error=lambda e: None), self.dispatcher)
+        try:
+            raise BigError()
+        except BigError as e:
+            ref = weakref.ref(e)
+            self.boxes[0].fail(sys.exc_info())
+        gc.collect()
+        self.assertIs(ref(), None)
+
+    def test_parallel(self):
+        """
+        The results of parallel children are released once the parallel
+        effect's callbacks have run.
+        """
+        refs = []
+        perform(parallel([Effect(Later()), Effect(Later())]).on(
+            success=lambda r: None), self.dispatcher)
+        for box in self.boxes[1:]:
+            result = Big()
+            refs.append(weakref.ref(result))
+            box.succeed(result)
+        del result
+        self.assertEqual([ref() for ref in refs], [None, None])
+
+    def test_parallel_failure(self):
+        """
+        When a parallel child fails, the results of those that succeeded are
+        released, although the others are still running.
+        """
+        perform(parallel([Effect(Later()) for _ in range(3)]).on(
+            error=lambda e: None), self.dispatcher)
+        result = Big()
+        ref = weakref.ref(result)
+        self.boxes[1].succeed(result)
+        del result
+        self.boxes[2].fail((ValueError, ValueError(), None))
+        self.assertIs(ref(), None)
+
+    def test_sync_perform_late_result(self):
+        """
+        A result that turns up after sync_perform has given up on it is
+        released once the rest of the callbacks have run.
+        """
+        self.assertRaises(
+            NotSynchronousError, sync_perform,
+            Effect(Later()).on(success=lambda r: None), self.dispatcher)
+        result = Big()
+        ref = weakref.ref(result)
+        self.boxes[0].succeed(result)
+        del result
+        self.assertIs(ref(), None)
+
+    @skipIf(tracemalloc is None, "tracemalloc is needed.")
+    def test_memory(self):
+        """
+        The memory taken by many large results is freed as they're delivered,
+        even though all of their boxes are kept.
+        """
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        for _ in range(50):
+            perform(Effect(Later()).on(success=len), self.dispatcher)
+        before = tracemalloc.get_traced_memory()[0]
+        for box in self.boxes:
+            box.succeed(b'x' * 1000000)
+        after = tracemalloc.get_traced_memory()[0]
+        self.assertTrue(after - before < 1000000, after - before)
@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+from functools import partial
+
+from testtools import TestCase
+from testtools.matchers import raises
+
+from . import (Effect, ConstantIntent, ErrorIntent, FuncIntent,
+               ParallelEffects, parallel)
+from .loop import EventLoop, perform, perform_parallel, run
+from .rpc import ConnectionLost, RPCDispatcher, parse_address
+
+
+def start_worker(test):
+    """
+    Start a worker process listening on a Unix socket, and return the
+    socket's path.
+    """
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'worker.sock')
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'effect.rpc', path],
+        stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    test.addCleanup(worker.wait)
+    test.addCleanup(worker.stdout.close)
+    test.addCleanup(worker.kill)
+    test.assertEqual(worker.stdout.readline().strip(), b'listening')
+    return path, worker
+
+
+class RPCDispatcherTests(TestCase):
+    """Tests for :class:`RPCDispatcher` and :func:`serve`."""
+
+    def setUp(self):
+        super(RPCDispatcherTests, self).setUp()
+        self.address, self.worker = start_worker(self)
+        self.rpc = None
+
+    def run_remote(self, effect, connections=4):
+        """
+        Run an effect with an RPCDispatcher, performing ParallelEffects
+        locally so that their children are sent to the worker.
+        """
+        loop = EventLoop()
+        self.rpc = RPCDispatcher(loop, self.address, connections)
+        self.addCleanup(self.rpc.close)
+
+        def dispatcher(loop, intent, box):
+            if type(intent) is ParallelEffects:
+                perform_parallel(intent, partial(dispatcher, loop), box)
+            else:
+                self.rpc(intent, box)
+        return run(effect, dispatcher, loop)
+
+    def test_success(self):
+        """Intents are performed by the worker, and its result returned."""
+        self.assertEqual(self.run_remote(Effect(ConstantIntent('foo'))),
+                         'foo')
+
+    def test_error(self):
+        """Exceptions raised by the worker fail the effect."""
+        self.assertThat(
+            lambda: self.run_remote(Effect(ErrorIntent(ValueError('oh no')))),
+            raises(ValueError('oh no')))
+
+    def test_unpicklable_intent(self):
+        """Intents that can't be pickled fail locally."""
+        self.assertRaises(
+            Exception,
+            self.run_remote, Effect(FuncIntent(lambda: 'foo')))
+
+    def test_pipelining(self):
+        """
+        Many requests can be outstanding on a single connection, and their
+        results are delivered to the right effects.
+        """
+        effects = [Effect(ConstantIntent(i)) for i in range(200)]
+        self.assertEqual(self.run_remote(parallel(effects), connections=1),
+                         list(range(200)))
+        self.assertEqual(len(self.rpc._connections), 1)
+
+    def test_pool(self):
+        """Up to the maximum number of connections are opened."""
+        effects = [Effect(ConstantIntent(i)) for i in range(200)]
+        self.assertEqual(self.run_remote(parallel(effects), connections=3),
+                         list(range(200)))
+        self.assertEqual(len(self.rpc._connections), 3)
+
+    def test_connection_reused(self):
+        """Connections are reused for later requests."""
+        self.assertEqual(
+            self.run_remote(
+                Effect(ConstantIntent('a')).on(
+                    success=lambda a: Effect(ConstantIntent(a + 'b')))),
+            'ab')
+        self.assertEqual(len(self.rpc._connections), 1)
+
+    def test_connection_lost(self):
+        """
+        When the worker goes away, outstanding requests fail with
+        ConnectionLost.
+        """
+        loop = EventLoop()
+        rpc = RPCDispatcher(loop, self.address)
+        self.addCleanup(rpc.close)
+        results = []
+        perform(loop,
+                Effect(ConstantIntent('foo')).on(error=results.append),
+                dispatcher=lambda loop, intent, box: rpc(intent, box))
+        self.worker.kill()
+        self.worker.wait()
+        loop.run()
+        self.assertEqual(len(results), 1)
+        self.assertTrue(issubclass(results[0][0],
+                                   (ConnectionLost, IOError, OSError)))
+
+
+class DroppedConnectionTests(TestCase):
+    """Tests for workers that go away while a request is being sent."""
+
+    def test_dropped_while_sending(self):
+        """
+        If the worker closes the connection while a large request is still
+        being sent, the request fails, and the loop carries on.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'worker.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(path)
+        listener.listen(1)
+
+        def drop():
+            sock, _ = listener.accept()
+            sock.recv(10)
+            sock.close()
+        thread = threading.Thread(target=drop)
+        thread.daemon = True
+        thread.start()
+
+        loop = EventLoop()
+        rpc = RPCDispatcher(loop, path)
+        self.addCleanup(rpc.close)
+        results = []
+        perform(loop,
+                Effect(ConstantIntent(b'x' * 8000000)).on(
+                    error=results.append),
+                dispatcher=lambda loop, intent, box: rpc(intent, box))
+        loop.run()
+        thread.join()
+        self.assertEqual(len(results), 1)
+        self.assertTrue(issubclass(results[0][0],
+                                   (ConnectionLost, IOError, OSError)))
+        self.assertEqual(rpc._connections, [])
+
+
+class ParseAddressTests(TestCase):
+    """Tests for :func:`parse_address`."""
+
+    def test_tcp(self):
+        self.assertEqual(parse_address('127.0.0.1:8000'), ('127.0.0.1', 8000))
+
+    def test_unix(self):
+        self.assertEqual(parse_address('/tmp/worker.sock'), '/tmp/worker.sock')
@@ -0,0 +1,242 @@
+from __future__ import absolute_import
+
+from functools import partial
+
+from testtools import TestCase
+
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
+
+from . import (
+    Effect, ConstantIntent, Delay, NotSynchronousError, parallel, perform,
+    sync_perform)
+from . import loop, twisted
+from ._test_utils import FakeClock, Later, keeping_dispatcher
+from .stats import (
+    RuntimeStats, Sample, disable_stats, enable_stats, get_stats,
+    prometheus_text)
+from .test_effect import ErrorIntent
+
+
+class StatsTestCase(TestCase):
+
+    def setUp(self):
+        super(StatsTestCase, self).setUp()
+        self.stats = enable_stats()
+        self.addCleanup(disable_stats)
+
+
+class EnableTests(TestCase):
+    """Tests for :func:`enable_stats` and :func:`disable_stats`."""
+
+    def test_disabled_by_default(self):
+        """Statistics aren't recorded unless they're enabled."""
+        self.assertIs(get_stats(), None)
+        self.assertEqual(sync_perform(Effect(ConstantIntent(1))), 1)
+
+    def test_enable(self):
+        """
+        enable_stats records into the given RuntimeStats, or a new one, until
+        disable_stats is called.
+        """
+        stats = RuntimeStats()
+        self.addCleanup(disable_stats)
+        self.assertIs(enable_stats(stats), stats)
+        self.assertIs(get_stats(), stats)
+        self.assertIsInstance(enable_stats(), RuntimeStats)
+        self.assertIsNot(get_stats(), stats)
+        disable_stats()
+        self.assertIs(get_stats(), None)
+
+
+class InterpreterTests(StatsTestCase):
+    """Tests for the statistics recorded by the interpreter."""
+
+    def test_perform(self):
+        """
+        Performing effects counts them as started and completed, and failed
+        if they end with an error.
+        """
+        perform(Effect(ConstantIntent(1)).on(
+            success=lambda r: Effect(ConstantIntent(r + 1))))
+        perform(Effect(ErrorIntent()))
+        self.assertEqual(
+            (self.stats.effects_started, self.stats.effects_completed,
+             self.stats.effects_failed),
+            (2, 2, 1))
+        self.assertEqual(self.stats.in_flight,
+                         {ConstantIntent: 0, ErrorIntent: 0})
+
+    def test_waiting(self):
+        """
+        Intents whose results arrive after their dispatcher returns are in
+        flight, and waiting, until they do.
+        """
+        boxes = []
+        perform(Effect(Later()), keeping_dispatcher(boxes))
+        perform(Effect(Later()), keeping_dispatcher(boxes))
+        self.assertEqual(self.stats.in_flight, {Later: 2})
+        self.assertEqual(self.stats.waiting, 2)
+        self.assertEqual(self.stats.effects_completed, 0)
+        boxes[0].succeed(None)
+        boxes[1].fail((ValueError, ValueError(), None))
+        self.assertEqual(self.stats.in_flight, {Later: 0})
+        self.assertEqual(self.stats.waiting, 0)
+        self.assertEqual(self.stats.effects_completed, 2)
+        self.assertEqual(self.stats.effects_failed, 1)
+
+    def test_sync_perform(self):
+        """sync_perform records the same statistics."""
+        sync_perform(Effect(ConstantIntent(1)).on(
+            success=lambda r: Effect(ConstantIntent(r + 1))))
+        self.assertRaises(ValueError, sync_perform, Effect(ErrorIntent()))
+        self.assertEqual(
+            (self.stats.effects_started, self.stats.effects_completed,
+             self.stats.effects_failed),
+            (2, 2, 1))
+        self.assertEqual(self.stats.in_flight,
+                         {ConstantIntent: 0, ErrorIntent: 0})
+
+    def test_sync_perform_late_result(self):
+        """
+        When sync_perform gives up on a result, the intent is waiting until
+        the result turns up.
+        """
+        boxes = []
+        self.assertRaises(NotSynchronousError, sync_perform,
+                          Effect(Later()), keeping_dispatcher(boxes))
+        self.assertEqual(self.stats.in_flight, {Later: 1})
+        self.assertEqual(self.stats.waiting, 1)
+        boxes[0].succeed(None)
+        self.assertEqual(self.stats.in_flight, {Later: 0})
+        self.assertEqual(self.stats.waiting, 0)
+        self.assertEqual(self.stats.effects_completed, 1)
+
+
+class TwistedTests(StatsTestCase):
+    """Tests for the statistics recorded by :mod:`effect.twisted`."""
+
+    def test_delay(self):
+        """Delay timers are pending until they fire."""
+        clock = Clock()
+        twisted.perform(clock, Effect(Delay(1)))
+        self.assertEqual(self.stats.delays_pending, 1)
+        clock.advance(1)
+        self.assertEqual(self.stats.delays_pending, 0)
+
+    def _parallel(self, lightweight_errors):
+        pending = [Deferred(), Deferred()]
+        eff = parallel([Effect(ConstantIntent(d)) for d in pending])
+        twisted.perform(
+            None, eff,
+            dispatcher=twisted.TwistedDispatcher(
+                None, lightweight_errors=lightweight_errors))
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (1, 2))
+        pending[0].callback(None)
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (1, 1))
+        pending[1].callback(None)
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (0, 0))
+
+    def test_parallel(self):
+        """Parallel effects and their children are counted while in flight."""
+        self._parallel(False)
+
+    def test_parallel_lightweight(self):
+        """
+        Parallel effects and their children are counted while in flight with
+        ``lightweight_errors`` too.
+        """
+        self._parallel(True)
+
+
+class LoopTests(StatsTestCase):
+    """Tests for the statistics recorded by :mod:`effect.loop`."""
+
+    def test_delay(self):
+        """Delay timers are pending until they fire."""
+        clock = FakeClock()
+        event_loop = loop.EventLoop(clock=clock)
+        loop.perform(event_loop, Effect(Delay(1)))
+        event_loop._run_once()
+        self.assertEqual(self.stats.delays_pending, 1)
+        clock.now = 1
+        event_loop.run()
+        self.assertEqual(self.stats.delays_pending, 0)
+
+    def test_parallel(self):
+        """Parallel effects and their children are counted while in flight."""
+        boxes = []
+        event_loop = loop.EventLoop()
+
+        def dispatcher(event_loop, intent, box):
+            if type(intent) is Later:
+                boxes.append(box)
+            else:
+                loop.perform_parallel(
+                    intent, partial(dispatcher, event_loop), box)
+        loop.perform(event_loop,
+                     parallel([Effect(Later()), Effect(Later())]),
+                     dispatcher=dispatcher)
+        event_loop.run()
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (1, 2))
+        boxes[0].fail((ValueError, ValueError(), None))
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (0, 1))
+        boxes[1].succeed(None)
+        self.assertEqual(
+            (self.stats.parallel_groups, self.stats.parallel_children),
+            (0, 0))
+
+
+class ExportTests(TestCase):
+    """Tests for exporting statistics."""
+
+    def test_export(self):
+        """export passes the samples to the exporter."""
+        stats = RuntimeStats()
+        stats.effects_started = 3
+        samples = stats.export(lambda samples: samples)
+        self.assertEqual(samples[0].name, 'effects_started_total')
+        self.assertEqual(samples[0].value, 3)
+
+    def test_in_flight_by_name(self):
+        """Intents in flight are labelled by their type's name."""
+        stats = RuntimeStats()
+        stats.intent_started(ConstantIntent)
+        stats.intent_started(ConstantIntent)
+        stats.intent_started(Later)
+        self.assertEqual(
+            [(s.labels, s.value) for s in stats.samples()
+             if s.name == 'intents_in_flight'],
+            [({'intent': 'ConstantIntent'}, 2), ({'intent': 'Later'}, 1)])
+
+    def test_prometheus_text(self):
+        """
+        prometheus_text renders samples in the Prometheus text format, with
+        help and type lines for each metric.
+        """
+        samples = [
+            Sample('started_total', 'counter', 'Things started.', 2),
+            Sample('in_flight', 'gauge', 'Things in flight.', 1,
+                   {'intent': 'A'}),
+            Sample('in_flight', 'gauge', 'Things in flight.', 0,
+                   {'intent': 'B"\n'}),
+        ]
+        self.assertEqual(
+            prometheus_text(samples, prefix='x_'),
+            '# HELP x_started_total Things started.\n'
+            '# TYPE x_started_total counter\n'
+            'x_started_total 2\n'
+            '# HELP x_in_flight Things in flight.\n'
+            '# TYPE x_in_flight gauge\n'
+            'x_in_flight{intent="A"} 1\n'
+            'x_in_flight{intent="B\\"\\n"} 0\n')
@@ -0,0 +1,269 @@
+from __future__ import absolute_import
+
+from testtools import TestCase
+from testtools.matchers import MatchesException, raises
+
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from . import Effect, default_dispatcher, perform, sync_perform
+from ._test_utils import Later, keeping_dispatcher
+from .compose import ComposedDispatcher
+from .stream import Channel, Stream, from_iterable, stream_dispatcher
+from .twisted import TwistedDispatcher
+
+
+dispatcher = ComposedDispatcher([stream_dispatcher, default_dispatcher])
+
+
+class Producer(object):
+    """
+    A producer which records the credit it's given, and emits only when the
+    test tells it to.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.cancelled = False
+        self.channel = Channel(self.requests.append, self.cancel)
+        self.next = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def emit(self, count):
+        for _ in range(count):
+            self.channel.emit(self.next)
+            self.next += 1
+
+
+class StreamTests(TestCase):
+    """Tests for :class:`Stream`, with synchronous producers."""
+
+    def test_collect(self):
+        """collect results in every value of the stream, in order."""
+        self.assertEqual(
+            sync_perform(from_iterable(range(50)).collect(window=7),
+                         dispatcher),
+            list(range(50)))
+
+    def test_empty(self):
+        """An empty stream results in no values."""
+        self.assertEqual(
+            sync_perform(from_iterable([]).collect(), dispatcher), [])
+
+    def test_map_filter(self):
+        """Streams can be mapped and filtered, in order."""
+        stream = from_iterable(range(20)).filter(
+            lambda x: x % 3 == 0).map(lambda x: x * 10).filter(
+                lambda x: x != 30)
+        self.assertEqual(sync_perform(stream.collect(window=4), dispatcher),
+                         [0, 60, 90, 120, 150, 180])
+
+    def test_filter_everything(self):
+        """A stream whose values are all filtered out is empty."""
+        stream = from_iterable(range(100)).filter(lambda x: False)
+        self.assertEqual(sync_perform(stream.collect(window=3), dispatcher),
+                         [])
+
+    def test_fold(self):
+        """fold folds every value into an accumulator."""
+        eff = from_iterable(range(100000)).fold(lambda a, v: a + v, 0)
+        self.assertEqual(sync_perform(eff, dispatcher), 4999950000)
+
+    def test_fold_effects(self):
+        """
+        When the folding function returns an effect, its result is the new
+        accumulator.
+        """
+        eff = from_iterable(range(5)).fold(
+            lambda a, v: Effect(Constant(a + [v])), [])
+        self.assertEqual(sync_perform(eff, dispatcher), [0, 1, 2, 3, 4])
+
+    def test_for_each(self):
+        """for_each calls a function with each value, and results in None."""
+        seen = []
+        self.assertIs(
+            sync_perform(from_iterable('abc').for_each(seen.append),
+                         dispatcher),
+            None)
+        self.assertEqual(seen, ['a', 'b', 'c'])
+
+    def test_streaming_intent(self):
+        """An intent can result in a stream, which is then consumed."""
+        eff = Effect(Constant(from_iterable([1, 2, 3]))).on(
+            success=lambda stream: stream.map(str).collect())
+        self.assertEqual(sync_perform(eff, dispatcher), ['1', '2', '3'])
+
+    def test_iterator_fails(self):
+        """An exception raised by the producer fails the stream."""
+        def values():
+            yield 1
+            raise ValueError('bad row')
+        self.assertThat(
+            lambda: sync_perform(from_iterable(values()).collect(),
+                                 dispatcher),
+            raises(ValueError('bad row')))
+
+
+class Constant(object):
+    """An intent whose result is given."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def perform_effect(self, dispatcher):
+        return self.result
+
+
+class BackpressureTests(TestCase):
+    """Tests for the credit given to producers."""
+
+    def setUp(self):
+        super(BackpressureTests, self).setUp()
+        self.producer = Producer()
+        self.stream = Stream(self.producer.channel)
+        self.boxes = []
+        self.results = []
+        self.dispatcher = keeping_dispatcher(self.boxes, dispatcher)
+
+    def test_credit(self):
+        """
+        The producer is only given as much credit as the window allows, and
+        more as values are consumed.
+        """
+        channel = self.producer.channel
+        perform(self.stream.collect(window=4).on(self.results.append),
+                self.dispatcher)
+        self.assertEqual(self.producer.requests, [4])
+        self.producer.emit(3)
+        # Three were consumed, so it may produce three more.
+        self.assertEqual((sum(self.producer.requests), channel.credit),
+                         (7, 4))
+        self.producer.emit(4)
+        self.assertEqual((sum(self.producer.requests), channel.credit),
+                         (11, 4))
+        channel.end()
+        self.assertEqual(self.results, [list(range(7))])
+
+    def test_slow_consumer(self):
+        """
+        While the folding function's effect is in progress, the producer is
+        given no more credit, and values it emits wait in the channel.
+        """
+        channel = self.producer.channel
+        folded = []
+
+        def fold(accumulator, value):
+            folded.append(value)
+            return Effect(Later())
+
+        perform(self.stream.fold(fold, None, window=2), self.dispatcher)
+        self.producer.emit(1)
+        self.assertEqual(folded, [0])
+        self.assertEqual(channel.credit, 2)
+        self.producer.emit(2)
+        self.assertEqual((channel.credit, sum(self.producer.requests)),
+                         (0, 3))
+        self.boxes[0].succeed(None)
+        self.assertEqual(folded, [0, 1])
+        self.assertEqual((channel.credit, sum(self.producer.requests)),
+                         (2, 5))
+        self.boxes[1].succeed(None)
+        self.assertEqual(folded, [0, 1, 2])
+
+    def test_fail_after_values(self):
+        """
+        When the producer fails, the values it emitted first are still
+        consumed, and then the stream fails.
+        """
+        seen = []
+        perform(self.stream.for_each(seen.append).on(
+            error=self.results.append), self.dispatcher)
+        self.producer.emit(2)
+        self.producer.channel.fail((ValueError, ValueError('gone'), None))
+        self.assertEqual(seen, [0, 1])
+        self.assertThat(self.results[0],
+                        MatchesException(ValueError('gone')))
+
+    def test_consumer_fails(self):
+        """When consuming fails, the producer is cancelled."""
+        def fold(accumulator, value):
+            raise ZeroDivisionError()
+        perform(self.stream.fold(fold, None).on(error=self.results.append),
+                self.dispatcher)
+        self.producer.emit(1)
+        self.assertTrue(self.producer.cancelled)
+        self.assertIs(self.results[0][0], ZeroDivisionError)
+        self.producer.emit(1)
+
+    def test_cancel(self):
+        """
+        Cancelling the stream cancels the producer, drops the values not
+        yet consumed, and ends the stream.
+        """
+        perform(self.stream.pull(window=4).on(self.results.append),
+                self.dispatcher)
+        self.producer.emit(1)
+        perform(self.stream.pull(window=4).on(self.results.append),
+                self.dispatcher)
+        self.stream.cancel()
+        self.assertTrue(self.producer.cancelled)
+        self.assertEqual(self.results, [[0], []])
+
+    def test_pulled_twice(self):
+        """A stream can't be pulled again until the last pull completes."""
+        perform(self.stream.pull(), self.dispatcher)
+        perform(self.stream.pull().on(error=self.results.append),
+                self.dispatcher)
+        self.assertIs(self.results[0][0], RuntimeError)
+
+
+class TwistedStreamTests(SynchronousTestCase):
+    """Tests for streams whose producers emit from Deferreds."""
+
+    def test_pages(self):
+        """
+        A producer fetching pages asynchronously is consumed with Twisted.
+        """
+        clock = Clock()
+        pages = {0: [1, 2, 3], 1: [4, 5], 2: []}
+
+        def fetch(page):
+            d = Deferred()
+            clock.callLater(1, d.callback, pages[page])
+            return d
+
+        def paginated():
+            state = {'page': 0, 'fetching': False}
+
+            def on_request(n):
+                if not state['fetching']:
+                    state['fetching'] = True
+                    fetch(state['page']).addCallback(got_page)
+
+            def got_page(values):
+                state['fetching'] = False
+                state['page'] += 1
+                if not values:
+                    channel.end()
+                    return
+                for value in values:
+                    channel.emit(value)
+                if channel.credit > 0:
+                    on_request(channel.credit)
+
+            channel = Channel(on_request)
+            return Stream(channel)
+
+        results = []
+        perform(
+            paginated().map(lambda x: x * 2).collect(window=2).on(
+                results.append),
+            ComposedDispatcher([stream_dispatcher, TwistedDispatcher(clock)]))
+        clock.advance(1)
+        clock.advance(1)
+        self.assertEqual(results, [])
+        clock.advance(1)
+        self.assertEqual(results, [[2, 4, 6, 8, 10]])
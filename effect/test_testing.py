@@ -6,8 +6,13 @@ from testtools import TestCase
 from testtools.matchers import (MatchesListwise, Equals, MatchesException,
                                 raises)
 
-from . import Effect, ConstantIntent, FuncIntent, ErrorIntent, parallel
-from .testing import resolve_effect, fail_effect, resolve_stubs, StubIntent
+from . import (
+    Effect, ConstantIntent, Delay, FuncIntent, ErrorIntent,
+    NotSynchronousError, parallel, perform)
+from .deadline import DeadlineDispatcher, DeadlineExceeded
+from .retry import retry
+from .testing import (
+    SimulatedClock, resolve_effect, fail_effect, resolve_stubs, StubIntent)
 
 
 Constant = lambda x: Effect(StubIntent(ConstantIntent(x)))
@@ -202,5 +207,113 @@ class ResolveStubsTests(TestCase):
         self.assertEqual(resolve_stubs(p_eff), 2)
 
 
+class SimulatedClockTests(TestCase):
+    """Tests for :class:`SimulatedClock`."""
+
+    def setUp(self):
+        super(SimulatedClockTests, self).setUp()
+        self.clock = SimulatedClock(now=100)
+        self.log = []
+
+    def after(self, delay, name):
+        """An effect which logs its name and the time after a delay."""
+        return Effect(Delay(delay)).on(
+            success=lambda _: self.log.append((name, self.clock.now)) or name)
+
+    def test_advance(self):
+        """
+        Delays finish when the clock is advanced past them, in order, with
+        the clock reading the time each one finished.
+        """
+        perform(self.after(5, 'b'), self.clock)
+        perform(self.after(2, 'a'), self.clock)
+        self.assertEqual(self.clock.pending(), 2)
+        self.clock.advance(1)
+        self.assertEqual(self.log, [])
+        self.clock.advance(9)
+        self.assertEqual(self.log, [('a', 102), ('b', 105)])
+        self.assertEqual(self.clock.seconds(), 110)
+        self.assertEqual(self.clock.pending(), 0)
+
+    def test_ties(self):
+        """Delays that finish at once do so in the order they started."""
+        for name in 'abc':
+            perform(self.after(1, name), self.clock)
+        self.clock.advance(1)
+        self.assertEqual([name for name, _ in self.log], ['a', 'b', 'c'])
+
+    def test_run(self):
+        """
+        run moves the clock on just far enough for the effect to have a
+        result, and returns it.
+        """
+        eff = self.after(3, 'a').on(success=lambda _: self.after(4, 'b'))
+        self.assertEqual(self.clock.run(eff), 'b')
+        self.assertEqual(self.clock.now, 107)
+
+    def test_run_error(self):
+        """run raises the effect's exception."""
+        eff = self.after(3, 'a').on(
+            success=lambda _: Effect(ErrorIntent(ValueError('late'))))
+        self.assertThat(lambda: self.clock.run(eff),
+                        raises(ValueError('late')))
+
+    def test_run_not_delay(self):
+        """
+        run raises NotSynchronousError if the effect is left waiting for
+        something other than a delay.
+        """
+        boxes = []
+        clock = SimulatedClock(dispatcher=lambda i, box: boxes.append(box))
+        self.assertRaises(NotSynchronousError, clock.run, Effect(object()))
+
+    def test_parallel(self):
+        """
+        Children of parallel effects wait concurrently, and finish in time
+        order.
+        """
+        eff = parallel([self.after(3, 'a'), self.after(1, 'b'),
+                        self.after(2, 'c').on(
+                            success=lambda _: self.after(2, 'd'))])
+        self.assertEqual(self.clock.run(eff), ['a', 'b', 'd'])
+        self.assertEqual(self.log, [('b', 101), ('c', 102), ('a', 103),
+                                    ('d', 104)])
+
+    def test_other_intents(self):
+        """Other intents are performed with the given dispatcher."""
+        self.assertEqual(self.clock.run(Effect(ConstantIntent(1))), 1)
+
+    def test_retry_backoff(self):
+        """
+        Thousands of retries with exponential backoff run in simulated time.
+        """
+        attempts = []
+
+        def attempt():
+            attempts.append(self.clock.now)
+            if len(attempts) < 2000:
+                raise RuntimeError('try again')
+            return 'done'
+
+        def should_retry(exc_info):
+            return Effect(Delay(min(2 ** len(attempts), 60))).on(
+                success=lambda _: True)
+        result = self.clock.run(retry(Effect(FuncIntent(attempt)),
+                                      should_retry))
+        self.assertEqual(result, 'done')
+        self.assertEqual(attempts[:4], [100, 102, 106, 114])
+        self.assertEqual(self.clock.now, 100 + 2 + 4 + 8 + 16 + 32 + 60 * 1994)
+
+    def test_deadline(self):
+        """The clock can be used for deadlines."""
+        dispatcher = DeadlineDispatcher(self.clock, 103, self.clock.seconds)
+        results = []
+        eff = parallel([self.after(5, 'a').on(
+            success=lambda _: Effect(ConstantIntent('late')))])
+        perform(eff.on(error=results.append), dispatcher)
+        self.clock.advance(5)
+        self.assertIs(results[0][0], DeadlineExceeded)
+
+
 def _raise(e):
     raise e
@@ -0,0 +1,150 @@
+from __future__ import absolute_import
+
+import random
+
+from twisted.internet.task import Clock
+from twisted.trial.unittest import SynchronousTestCase
+
+from . import Effect, Delay
+from .stats import disable_stats, enable_stats
+from .timer_wheel import TimerWheel
+from .twisted import TwistedDispatcher, perform
+
+
+class TimerWheelTests(SynchronousTestCase):
+    """Tests for :class:`TimerWheel`."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.advance(1000)
+        self.fired = []
+
+    def fire(self, name):
+        self.fired.append((name, self.clock.seconds()))
+
+    def step(self, seconds, interval=0.5):
+        """Advance the clock a little at a time."""
+        for _ in range(int(seconds / interval)):
+            self.clock.advance(interval)
+
+    def test_fires_after_delay(self):
+        """
+        Timers fire at the first tick at or after their time, never before.
+        """
+        wheel = TimerWheel(self.clock, resolution=0.5)
+        wheel.call_later(1.2, self.fire, 'a')
+        wheel.call_later(0.5, self.fire, 'b')
+        self.assertEqual(len(wheel), 2)
+        self.step(1)
+        self.assertEqual(self.fired, [('b', 1000.5)])
+        self.step(1)
+        self.assertEqual(self.fired, [('b', 1000.5), ('a', 1001.5)])
+        self.assertEqual(len(wheel), 0)
+
+    def test_one_delayed_call(self):
+        """
+        The reactor has a single DelayedCall for the whole wheel, which is
+        moved earlier when an earlier timer is added.
+        """
+        wheel = TimerWheel(self.clock, resolution=0.5, wheel_size=4)
+        for delay in [20, 3, 40, 10]:
+            wheel.call_later(delay, self.fire, delay)
+        calls = self.clock.getDelayedCalls()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(calls[0].getTime() <= 1003)
+
+    def test_cancel(self):
+        """Cancelled timers don't fire."""
+        wheel = TimerWheel(self.clock, resolution=0.5)
+        timer = wheel.call_later(1, self.fire, 'a')
+        wheel.call_later(1, self.fire, 'b')
+        timer.cancel()
+        timer.cancel()
+        self.assertEqual(len(wheel), 1)
+        self.step(2)
+        self.assertEqual(self.fired, [('b', 1001)])
+
+    def test_levels(self):
+        """
+        Timers too far away for the first level, and too far away for the
+        whole wheel, are cascaded down and fire on time.
+        """
+        wheel = TimerWheel(self.clock, resolution=0.5, wheel_size=4,
+                           levels=2)
+        delays = [random.Random(i).uniform(0, 60) for i in range(200)]
+        for delay in delays:
+            wheel.call_later(delay, self.fire, delay)
+        self.step(61)
+        self.assertEqual(sorted(d for d, _ in self.fired), sorted(delays))
+        for delay, when in self.fired:
+            self.assertTrue(1000 + delay <= when < 1000 + delay + 0.5,
+                            (delay, when))
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_big_steps(self):
+        """
+        When the reactor is late, every timer that's due fires, and none that
+        isn't.
+        """
+        wheel = TimerWheel(self.clock, resolution=0.5, wheel_size=4)
+        for delay in [1, 7, 30, 31, 200]:
+            wheel.call_later(delay, self.fire, delay)
+        self.clock.advance(30)
+        self.assertEqual([d for d, _ in self.fired], [1, 7, 30])
+        self.clock.advance(200)
+        self.assertEqual([d for d, _ in self.fired], [1, 7, 30, 31, 200])
+
+    def test_scheduled_while_firing(self):
+        """Timers can be added by timers that fire."""
+        wheel = TimerWheel(self.clock, resolution=0.5)
+        wheel.call_later(
+            1, lambda: wheel.call_later(1, self.fire, 'second'))
+        self.step(3)
+        self.assertEqual(self.fired, [('second', 1002)])
+
+    def test_idle(self):
+        """A wheel left idle for a long time still fires timers on time."""
+        wheel = TimerWheel(self.clock, resolution=0.5)
+        self.clock.advance(1e6)
+        wheel.call_later(1, self.fire, 'a')
+        self.step(1)
+        self.assertEqual(self.fired, [('a', 1001001)])
+
+    def test_wheel_size(self):
+        """The wheel size must be a power of two."""
+        self.assertRaises(ValueError, TimerWheel, self.clock, wheel_size=100)
+
+
+class PerformDelayTests(SynchronousTestCase):
+    """Tests for :meth:`TimerWheel.perform_delay`."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = TimerWheel(self.clock, resolution=0.5)
+        self.dispatcher = TwistedDispatcher(
+            self.clock, performers={Delay: self.wheel.perform_delay})
+
+    def test_delay(self):
+        """Delay intents succeed with None once the delay is over."""
+        d = perform(self.clock, Effect(Delay(1)), dispatcher=self.dispatcher)
+        self.clock.advance(0.5)
+        self.assertNoResult(d)
+        self.clock.advance(0.5)
+        self.assertIs(self.successResultOf(d), None)
+
+    def test_cancel(self):
+        """Cancelling the Deferred cancels the timer."""
+        d = self.wheel.perform_delay(self.dispatcher, Delay(1))
+        d.cancel()
+        self.assertEqual(len(self.wheel), 0)
+        self.clock.advance(1)
+        self.failureResultOf(d)
+
+    def test_stats(self):
+        """Delay timers are counted as pending until they fire."""
+        runtime = enable_stats()
+        self.addCleanup(disable_stats)
+        perform(self.clock, Effect(Delay(1)), dispatcher=self.dispatcher)
+        self.assertEqual(runtime.delays_pending, 1)
+        self.clock.advance(1)
+        self.assertEqual(runtime.delays_pending, 0)
@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+
+import sys
+import traceback
+import weakref
+
+from unittest import skipIf
+
+from testtools import TestCase
+
+from . import Effect, ConstantIntent, FuncIntent, sync_perform
+from .retry import retry
+from .tracebacks import (
+    clear_locals, full, set_traceback_policy, trimmed)
+
+
+class Payload(object):
+    """Something large that a frame might refer to."""
+
+
+def fail_with(payload):
+    inner()
+
+
+def inner():
+    raise ValueError("oh dear")
+
+
+def capture(f, *args):
+    try:
+        f(*args)
+    except:
+        return sys.exc_info()
+
+
+def frame_names(tb):
+    names = []
+    while tb is not None:
+        names.append(tb.tb_frame.f_code.co_name)
+        tb = tb.tb_next
+    return names
+
+
+needs_clear_frames = skipIf(not hasattr(traceback, 'clear_frames'),
+                            "Frames can't be cleared on this Python")
+
+
+class PolicyTests(TestCase):
+    """Tests for the traceback policies."""
+
+    def test_full(self):
+        """:func:`full` leaves the traceback alone."""
+        exc_info = capture(fail_with, None)
+        self.assertIs(full(exc_info), exc_info)
+        self.assertEqual(frame_names(exc_info[2]),
+                         ['capture', 'fail_with', 'inner'])
+
+    def test_trimmed(self):
+        """
+        :func:`trimmed` keeps only the innermost frames, in the exc_info tuple
+        and on the exception.
+        """
+        exc_info = trimmed(2)(capture(fail_with, None))
+        self.assertEqual(frame_names(exc_info[2]), ['fail_with', 'inner'])
+        self.assertIs(exc_info[1].__traceback__, exc_info[2])
+
+    @needs_clear_frames
+    def test_trimmed_releases_dropped_frames(self):
+        """
+        The local variables of the frames that are dropped are released, even
+        though the frames that are kept refer to them.
+        """
+        payload = Payload()
+        ref = weakref.ref(payload)
+        exc_info = trimmed(1)(capture(fail_with, payload))
+        del payload
+        self.assertEqual(frame_names(exc_info[2]), ['inner'])
+        self.assertIs(ref(), None)
+
+    def test_trimmed_more_than_depth(self):
+        """Trimming to more frames than there are keeps them all."""
+        exc_info = trimmed(10)(capture(fail_with, None))
+        self.assertEqual(frame_names(exc_info[2]),
+                         ['capture', 'fail_with', 'inner'])
+
+    def test_trimmed_to_nothing(self):
+        """Trimming to no frames drops the traceback."""
+        exc_info = trimmed(0)(capture(fail_with, None))
+        self.assertIs(exc_info[2], None)
+        self.assertIs(exc_info[1].__traceback__, None)
+
+    def test_trimmed_context(self):
+        """
+        The traceback of the exception that another was raised while
+        handling is trimmed too.
+        """
+        def reraise():
+            try:
+                fail_with(None)
+            except ValueError:
+                raise RuntimeError()
+        exc_info = trimmed(1)(capture(reraise))
+        self.assertEqual(frame_names(exc_info[2]), ['reraise'])
+        self.assertEqual(
+            frame_names(exc_info[1].__context__.__traceback__), ['inner'])
+
+    @needs_clear_frames
+    def test_clear_locals(self):
+        """
+        :func:`clear_locals` keeps every frame, but their local variables are
+        released.
+        """
+        payload = Payload()
+        ref = weakref.ref(payload)
+        exc_info = clear_locals(capture(fail_with, payload))
+        del payload
+        self.assertEqual(frame_names(exc_info[2]),
+                         ['capture', 'fail_with', 'inner'])
+        self.assertIs(ref(), None)
+
+
+class SetTracebackPolicyTests(TestCase):
+    """Tests for :func:`set_traceback_policy`."""
+
+    def use_policy(self, policy):
+        old = set_traceback_policy(policy)
+        self.addCleanup(set_traceback_policy, old)
+
+    def test_returns_previous(self):
+        """set_traceback_policy returns the policy it replaced."""
+        self.assertIs(set_traceback_policy(clear_locals), full)
+        self.assertIs(set_traceback_policy(full), clear_locals)
+
+    def test_performer_errors(self):
+        """The policy is applied to errors raised by performers."""
+        self.use_policy(trimmed(0))
+        eff = Effect(FuncIntent(lambda: fail_with(None)))
+        exc_info = sync_perform(eff.on(error=lambda e: e))
+        self.assertIs(exc_info[2], None)
+
+    def test_callback_errors(self):
+        """The policy is applied to errors raised by callbacks."""
+        self.use_policy(trimmed(1))
+        eff = Effect(ConstantIntent(None)).on(
+            success=lambda r: fail_with(None)).on(error=lambda e: e)
+        self.assertEqual(frame_names(sync_perform(eff)[2]), ['inner'])
+
+    @needs_clear_frames
+    def test_retry_releases_locals(self):
+        """
+        Under :func:`clear_locals`, the errors kept by a retry loop don't keep
+        the local variables of the failed attempts alive.
+        """
+        self.use_policy(clear_locals)
+        refs = []
+        errors = []
+
+        def attempt():
+            payload = Payload()
+            refs.append(weakref.ref(payload))
+            fail_with(payload)
+
+        def should_retry(e):
+            errors.append(e)
+            return Effect(ConstantIntent(len(errors) < 3))
+
+        eff = retry(Effect(FuncIntent(attempt)), should_retry)
+        self.assertRaises(ValueError, sync_perform, eff)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual([ref() for ref in refs], [None, None, None])
@@ -1,18 +1,19 @@
 from __future__ import absolute_import
 
+import gc
 import sys
 
-from functools import partial
-
 from testtools import TestCase
 from testtools.matchers import MatchesListwise, Equals, MatchesException
 
 from twisted.trial.unittest import SynchronousTestCase
-from twisted.internet.defer import succeed, fail
+from twisted.internet.defer import Deferred, FirstError, succeed, fail
 from twisted.internet.task import Clock
 
-from . import Effect, parallel, ConstantIntent, Delay
-from .twisted import perform, twisted_dispatcher, exc_info_to_failure
+from . import Effect, parallel, ConstantIntent, Delay, FuncIntent
+from .deadline import DeadlineExceeded
+from .twisted import (
+    TwistedDispatcher, perform, twisted_dispatcher, exc_info_to_failure)
 from .test_effect import SelfContainedIntent, ErrorIntent
 
 
@@ -29,6 +30,47 @@ class ParallelTests(SynchronousTestCase):
                       Effect(ConstantIntent('b'))]))
         self.assertEqual(self.successResultOf(d), ['a', 'b'])
 
+    def test_deeply_nested_parallel(self):
+        """
+        Parallel effects nested far deeper than the recursion limit are
+        performed without growing the stack, even when every Deferred has
+        already fired.
+        """
+        eff = Effect(ConstantIntent(succeed('leaf')))
+        for i in range(10000):
+            eff = parallel([eff]).on(success=lambda r: r[0])
+        d = perform(None, eff)
+        self.assertEqual(self.successResultOf(d), 'leaf')
+
+    def test_deeply_nested_parallel_in_callbacks(self):
+        """
+        Parallel effects returned from callbacks of effects inside other
+        parallel effects are performed in constant stack depth.
+        """
+        eff = Effect(ConstantIntent(succeed(0)))
+        for i in range(10000):
+            eff = parallel([
+                Effect(ConstantIntent(succeed(None))).on(
+                    success=lambda r, eff=eff: eff)
+            ]).on(success=lambda r: r[0] + 1)
+        d = perform(None, eff)
+        self.assertEqual(self.successResultOf(d), 10000)
+
+    def test_deeply_nested_parallel_fired_later(self):
+        """
+        When the innermost result of a deeply nested tree arrives
+        asynchronously, the completions cascade up the tree in constant stack
+        depth.
+        """
+        inner = Deferred()
+        eff = Effect(ConstantIntent(inner))
+        for i in range(10000):
+            eff = parallel([eff]).on(success=lambda r: r[0])
+        d = perform(None, eff)
+        self.assertNoResult(d)
+        inner.callback('leaf')
+        self.assertEqual(self.successResultOf(d), 'leaf')
+
 
 class DelayTests(SynchronousTestCase):
     """Tess for :class:`Delay`."""
@@ -78,11 +120,56 @@ class TwistedPerformTests(SynchronousTestCase, TestCase):
         e = Effect(SelfContainedIntent())
         d = perform("reactor", e)
         result = self.successResultOf(d)
-        # this is hella white-box
         self.assertEqual(result[0], 'Self-result')
-        self.assertIs(type(result[1]), partial)
-        self.assertEqual(result[1].args, ('reactor',))
-        self.assertEqual(result[1].func, twisted_dispatcher)
+        self.assertIs(type(result[1]), TwistedDispatcher)
+        self.assertEqual(result[1].reactor, 'reactor')
+
+    def test_dispatcher_function(self):
+        """
+        A function taking the reactor, an intent and a box can still be passed
+        as the dispatcher, and has the reactor curried in.
+        """
+        e = Effect(SelfContainedIntent())
+        d = perform("reactor", e, dispatcher=twisted_dispatcher)
+        self.assertEqual(self.successResultOf(d)[0], 'Self-result')
+
+        calls = []
+
+        def dispatcher(reactor, intent, box):
+            calls.append((reactor, intent))
+            box.succeed('custom')
+        intent = ConstantIntent('foo')
+        d = perform("reactor", Effect(intent), dispatcher=dispatcher)
+        self.assertEqual(self.successResultOf(d), 'custom')
+        self.assertEqual(calls, [("reactor", intent)])
+
+    def test_fired_deferred_fast_path(self):
+        """
+        When a performer returns a Deferred that has already succeeded, its
+        result is taken without attaching any callbacks, and the Deferred is
+        left with a result of None.
+        """
+        class NoCallbacks(Deferred):
+            def addCallbacks(self, *args, **kwargs):
+                raise AssertionError("Callbacks attached")
+        d = NoCallbacks()
+        d.callback('foo')
+        result = perform(None, Effect(ConstantIntent(d)))
+        self.assertEqual(self.successResultOf(result), 'foo')
+        self.assertIs(d.result, None)
+
+    def test_paused_deferred(self):
+        """
+        A Deferred that has been called but is waiting on another Deferred
+        is not mistaken for one that has a result.
+        """
+        inner = Deferred()
+        d = succeed(None)
+        d.addCallback(lambda _: inner)
+        result = perform(None, Effect(ConstantIntent(d)))
+        self.assertNoResult(result)
+        inner.callback('foo')
+        self.assertEqual(self.successResultOf(result), 'foo')
 
     def test_deferred_effect(self):
         """
@@ -113,6 +200,240 @@ class TwistedPerformTests(SynchronousTestCase, TestCase):
         self.assertIs(result[1][2], None)
 
 
+class TwistedDispatcherTests(SynchronousTestCase):
+    """Tests for :class:`TwistedDispatcher`."""
+
+    def test_performers(self):
+        """
+        Performers passed to the dispatcher are looked up by intent type, and
+        are passed the dispatcher and the intent.
+        """
+        dispatcher = TwistedDispatcher(
+            'reactor',
+            {ConstantIntent: lambda d, i: (d.reactor, i.result)})
+        d = perform('reactor', Effect(ConstantIntent('foo')),
+                    dispatcher=dispatcher)
+        self.assertEqual(self.successResultOf(d), ('reactor', 'foo'))
+
+    def test_performer_error(self):
+        """
+        An exception raised by a performer fails the effect.
+        """
+        def raise_(dispatcher, intent):
+            raise ValueError('oh dear')
+        dispatcher = TwistedDispatcher(None, {ConstantIntent: raise_})
+        d = perform(None, Effect(ConstantIntent('foo')),
+                    dispatcher=dispatcher)
+        self.assertEqual(str(self.failureResultOf(d, ValueError).value),
+                         'oh dear')
+
+    def test_parallel_children_use_dispatcher(self):
+        """
+        The children of a parallel effect are performed with the same
+        dispatcher as the parallel effect itself.
+        """
+        dispatcher = TwistedDispatcher(
+            None, {ConstantIntent: lambda d, i: i.result * 2})
+        eff = parallel([Effect(ConstantIntent(1)), Effect(ConstantIntent(2))])
+        d = perform(None, eff, dispatcher=dispatcher)
+        self.assertEqual(self.successResultOf(d), [2, 4])
+
+
+class LightweightErrorTests(SynchronousTestCase):
+    """
+    Tests for :class:`TwistedDispatcher` with ``lightweight_errors``.
+    """
+
+    def perform_error(self, eff, lightweight_errors):
+        return self.successResultOf(perform(
+            None, eff.on(error=lambda e: e),
+            dispatcher=TwistedDispatcher(
+                None, lightweight_errors=lightweight_errors)))
+
+    def test_traceback_kept_by_default(self):
+        """
+        Without ``lightweight_errors``, errors raised by performers keep their
+        tracebacks.
+        """
+        exc_info = self.perform_error(Effect(ErrorIntent()), False)
+        self.assertIsNot(exc_info[2], None)
+
+    def test_traceback_dropped(self):
+        """
+        With ``lightweight_errors``, errors raised by performers have their
+        tracebacks dropped, from the exception too.
+        """
+        exc_info = self.perform_error(Effect(ErrorIntent()), True)
+        self.assertIs(exc_info[0], ValueError)
+        self.assertIs(exc_info[2], None)
+        self.assertIs(getattr(exc_info[1], '__traceback__', None), None)
+
+    def test_failed_deferred_traceback_dropped(self):
+        """
+        With ``lightweight_errors``, the tracebacks of failed Deferreds
+        returned by performers are dropped.
+        """
+        try:
+            raise ValueError('foo')
+        except ValueError:
+            d = fail()
+        exc_info = self.perform_error(Effect(ConstantIntent(d)), True)
+        self.assertIs(exc_info[0], ValueError)
+        self.assertIs(exc_info[2], None)
+        self.assertIs(getattr(exc_info[1], '__traceback__', None), None)
+
+    def test_parallel_error(self):
+        """
+        Without ``lightweight_errors``, a parallel effect with a failing child
+        fails with a FirstError, and the child's error isn't logged as
+        unhandled.
+        """
+        eff = parallel([Effect(ConstantIntent(1)), Effect(ErrorIntent())])
+        exc_info = self.perform_error(eff, False)
+        self.assertIs(exc_info[0], FirstError)
+        self.assertIs(exc_info[1].subFailure.type, ValueError)
+        gc.collect()
+        self.assertEqual(self.flushLoggedErrors(ValueError), [])
+
+    def test_parallel_error_lightweight(self):
+        """
+        With ``lightweight_errors``, a parallel effect with a failing child
+        fails with that child's exception.
+        """
+        eff = parallel([Effect(ConstantIntent(1)), Effect(ErrorIntent()),
+                        Effect(ErrorIntent())])
+        exc_info = self.perform_error(eff, True)
+        self.assertIs(exc_info[0], ValueError)
+        self.assertIs(exc_info[2], None)
+
+    def test_parallel_lightweight(self):
+        """
+        With ``lightweight_errors``, parallel effects still result in a list
+        of their children's results, in order.
+        """
+        d = perform(
+            None,
+            parallel([Effect(ConstantIntent(succeed('a'))),
+                      Effect(ConstantIntent('b'))]),
+            dispatcher=TwistedDispatcher(None, lightweight_errors=True))
+        self.assertEqual(self.successResultOf(d), ['a', 'b'])
+        d = perform(None, parallel([]),
+                    dispatcher=TwistedDispatcher(None,
+                                                 lightweight_errors=True))
+        self.assertEqual(self.successResultOf(d), [])
+
+    def test_perform_failure(self):
+        """
+        With ``lightweight_errors``, the Deferred returned by perform fails
+        with the original exception.
+        """
+        d = perform(None, Effect(ErrorIntent()),
+                    dispatcher=TwistedDispatcher(None,
+                                                 lightweight_errors=True))
+        f = self.failureResultOf(d, ValueError)
+        self.assertEqual(str(f.value), 'oh dear')
+
+
+class DeadlineTests(SynchronousTestCase):
+    """Tests for the deadlines of :class:`TwistedDispatcher`."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.clock.advance(100)
+
+    def test_no_deadline(self):
+        """Without a deadline, Deferreds may take as long as they like."""
+        d = perform(self.clock, Effect(Delay(1000)))
+        self.clock.advance(1000)
+        self.assertIs(self.successResultOf(d), None)
+
+    def test_started_after_deadline(self):
+        """
+        Intents started after the deadline fail with DeadlineExceeded,
+        without being performed.
+        """
+        performed = []
+        self.clock.advance(1)
+        d = perform(self.clock,
+                    Effect(FuncIntent(lambda: performed.append(1))),
+                    deadline=101)
+        f = self.failureResultOf(d, DeadlineExceeded)
+        self.assertIsInstance(f.value.intent, FuncIntent)
+        self.assertEqual(performed, [])
+
+    def test_cancelled_at_deadline(self):
+        """
+        Deferreds still pending at the deadline are cancelled, and their
+        intents fail with DeadlineExceeded.
+        """
+        cancelled = []
+        pending = Deferred(cancelled.append)
+        d = perform(self.clock, Effect(ConstantIntent(pending)),
+                    deadline=101)
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        self.assertEqual(cancelled, [pending])
+        self.failureResultOf(d, DeadlineExceeded)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_timer_cancelled(self):
+        """
+        The deadline's timer is cancelled when the Deferred fires before it.
+        """
+        pending = Deferred()
+        d = perform(self.clock, Effect(ConstantIntent(pending)),
+                    deadline=101)
+        pending.callback('done')
+        self.assertEqual(self.successResultOf(d), 'done')
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_parallel_children(self):
+        """
+        The deadline applies to the children of parallel effects and the
+        effects returned by callbacks: pending ones are cancelled, and later
+        ones never start.
+        """
+        started = []
+        eff = parallel([
+            Effect(Delay(5)),
+            Effect(Delay(0.5)).on(success=lambda _: Effect(
+                FuncIntent(lambda: started.append(1)))).on(
+                    success=lambda _: Effect(Delay(1)))])
+        d = perform(self.clock, eff, deadline=101)
+        self.clock.advance(0.5)
+        self.assertEqual(started, [1])
+        self.clock.advance(0.5)
+        self.failureResultOf(d, FirstError)
+        self.assertEqual(started, [1])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_parallel_lightweight(self):
+        """
+        With ``lightweight_errors``, parallel effects fail with
+        DeadlineExceeded itself.
+        """
+        dispatcher = TwistedDispatcher(self.clock, lightweight_errors=True)
+        d = perform(self.clock, parallel([Effect(Delay(5))]),
+                    dispatcher=dispatcher, deadline=101)
+        self.clock.advance(1)
+        self.failureResultOf(d, DeadlineExceeded)
+        self.assertIs(dispatcher.deadline, None)
+
+    def test_dispatcher_function(self):
+        """
+        A dispatcher function is held to the deadline for starting intents.
+        """
+        def dispatcher(reactor, intent, box):
+            twisted_dispatcher(reactor, intent, box)
+        d = perform(self.clock,
+                    Effect(ConstantIntent(1)).on(success=lambda r: Effect(
+                        Delay(2))).on(success=lambda r: Effect(
+                            ConstantIntent(3))),
+                    dispatcher=dispatcher, deadline=101)
+        self.clock.advance(2)
+        self.failureResultOf(d, DeadlineExceeded)
+
+
 class ExcInfoToFailureTests(TestCase):
     """Tests for :func:`exc_info_to_failure`."""
 
@@ -4,11 +4,15 @@ Various functions for inspecting and restructuring effects.
 
 from __future__ import print_function
 
+import heapq
 import sys
 
 from characteristic import attributes
 
-from . import Effect, guard, ParallelEffects
+from . import (
+    Effect, Delay, NotSynchronousError, ParallelEffects, default_dispatcher,
+    guard, perform)
+from .fan_out import fan_out
 
 import six
 
@@ -121,3 +125,94 @@ def resolve_stubs(effect):
             break
 
     return effect
+
+
+class SimulatedClock(object):
+    """
+    A dispatcher which performs :obj:`effect.Delay` intents in simulated
+    time, so that code which waits, backs off and retries can be tested
+    without waiting for real.
+
+    Delays are only over once the clock is moved on past them, with
+    :meth:`advance`, or by :meth:`run`, which moves it straight to the next
+    delay to finish until the effect has a result. Delays that finish at the
+    same time do so in the order they were started, and the children of
+    parallel effects are started in order, so tests are deterministic::
+
+        clock = SimulatedClock()
+        eff = Effect(Delay(5)).on(success=lambda _: clock.seconds())
+        assert clock.run(eff) == 5
+
+    Any number of effects can be performed with the same clock at once, with
+    :func:`effect.perform`. Parallel effects are performed with
+    :func:`effect.fan_out.fan_out`, with this dispatcher, and other intents
+    with the given dispatcher. :meth:`seconds` is a clock function, for code
+    that takes one, like :class:`effect.deadline.DeadlineDispatcher`.
+    """
+
+    def __init__(self, now=0, dispatcher=default_dispatcher):
+        """
+        :param now: The time to start at.
+        :param dispatcher: The dispatcher to perform intents other than Delay
+            and ParallelEffects with.
+        """
+        self.now = now
+        self.dispatcher = dispatcher
+        self._timers = []
+        self._started = 0
+
+    def seconds(self):
+        """Return the current simulated time."""
+        return self.now
+
+    def pending(self):
+        """Return the number of delays that haven't finished."""
+        return len(self._timers)
+
+    def __call__(self, intent, box):
+        if type(intent) is Delay:
+            self._started += 1
+            heapq.heappush(self._timers,
+                           (self.now + intent.delay, self._started, box))
+        elif type(intent) is ParallelEffects:
+            fan_out(intent, self, box)
+        else:
+            self.dispatcher(intent, box)
+
+    def advance(self, seconds):
+        """
+        Move the clock on, finishing the delays that are over, in order. The
+        clock reads the time each delay finishes while its callbacks run.
+        """
+        until = self.now + seconds
+        while self._timers and self._timers[0][0] <= until:
+            self._fire()
+        self.now = until
+
+    def _fire(self):
+        when, _, box = heapq.heappop(self._timers)
+        self.now = max(self.now, when)
+        box.succeed(None)
+
+    def run(self, effect):
+        """
+        Perform an effect with this dispatcher, moving the clock on as far as
+        it takes for the effect to have a result, and return the result, or
+        raise its exception.
+
+        :raise NotSynchronousError: If the effect is still waiting for
+            something other than a delay when there are no delays left.
+        """
+        results = []
+        perform(effect.on(success=lambda r: results.append((False, r)),
+                          error=lambda e: results.append((True, e))),
+                self)
+        while not results and self._timers:
+            self._fire()
+        if not results:
+            raise NotSynchronousError(
+                "%r is waiting for something other than a Delay" % (effect,))
+        is_error, result = results[0]
+        if is_error:
+            six.reraise(*result)
+        return result
@@ -0,0 +1,235 @@
+"""
+A hierarchical timer wheel, for performing very many :obj:`effect.Delay`
+intents with Twisted.
+
+:class:`effect.twisted.TwistedDispatcher` performs each Delay with
+:func:`twisted.internet.task.deferLater`, which gives the reactor one
+DelayedCall per delay. That's fine for a few, but with a hundred thousand
+sleeping retries or pollers every delay scheduled or cancelled is an
+O(log n) operation on the reactor's timer heap.
+
+A :class:`TimerWheel` rounds times up to ticks of a fixed resolution, and
+keeps its timers in buckets by tick, so scheduling and cancelling a timer is
+O(1). The reactor only has a single DelayedCall for the whole wheel, for the
+next tick that might have timers to fire. Use it as the performer for Delay::
+
+    wheel = TimerWheel(reactor, resolution=0.01)
+    dispatcher = TwistedDispatcher(
+        reactor, performers={Delay: wheel.perform_delay})
+
+Timers never fire early, but fire up to one ``resolution`` late.
+
+The wheel is hierarchical: the first level has a bucket for each of the next
+``wheel_size`` ticks, the second a bucket for each of the next
+``wheel_size`` runs of ``wheel_size`` ticks, and so on. Whenever a level
+comes round to a new bucket, its timers are moved down into the finer level
+below ("cascaded"). Timers further away than the top level can reach are
+cascaded until they're due.
+"""
+
+from __future__ import absolute_import
+
+from twisted.internet.defer import Deferred
+
+from . import stats
+
+
+class _Timer(object):
+    """A timer in a :class:`TimerWheel`."""
+
+    __slots__ = ('expires', 'level', 'f', 'args', 'wheel')
+
+    def __init__(self, wheel, f, args):
+        self.wheel = wheel
+        self.expires = None
+        self.level = None
+        self.f = f
+        self.args = args
+
+    def cancel(self, deferred=None):
+        """
+        Stop the timer from firing. It's left in its bucket, to be discarded
+        when the bucket's tick comes round. This is the canceller of the
+        Deferreds returned by :meth:`TimerWheel.perform_delay`, so it accepts
+        and ignores a Deferred.
+        """
+        if self.f is None:
+            return
+        self.f = self.args = None
+        self.wheel._counts[self.level] -= 1
+        self.wheel._length -= 1
+
+
+class TimerWheel(object):
+    """
+    A hierarchical timer wheel, driven by a reactor.
+    """
+
+    def __init__(self, reactor, resolution=0.01, wheel_size=256, levels=4):
+        """
+        :param reactor: An ``IReactorTime`` provider.
+        :param float resolution: The length of a tick, in seconds.
+        :param int wheel_size: The number of buckets in each level, which
+            must be a power of two.
+        :param int levels: The number of levels. The wheel can hold timers up
+            to ``resolution * wheel_size ** levels`` seconds away without
+            cascading them more than once per level.
+        """
+        if wheel_size & (wheel_size - 1):
+            raise ValueError("wheel_size must be a power of two, not %r"
+                             % (wheel_size,))
+        self.reactor = reactor
+        self.resolution = resolution
+        self._bits = wheel_size.bit_length() - 1
+        self._mask = wheel_size - 1
+        self._levels = [[[] for _ in range(wheel_size)]
+                        for _ in range(levels)]
+        self._counts = [0] * levels
+        self._limit = wheel_size ** levels - 1
+        self._length = 0
+        self._tick = self._now()
+        self._call = None
+        self._wake = None
+
+    def __len__(self):
+        """Return the number of timers waiting to fire."""
+        return self._length
+
+    def _now(self):
+        return int(self.reactor.seconds() / self.resolution)
+
+    def call_later(self, delay, f, *args):
+        """
+        Call ``f(*args)`` after ``delay`` seconds.
+
+        :return: A timer, with a ``cancel`` method.
+        """
+        timer = _Timer(self, f, args)
+        self._add(timer, delay)
+        return timer
+
+    def perform_delay(self, dispatcher, delay):
+        """
+        Perform a :obj:`effect.Delay`, returning a Deferred which fires with
+        None when it's over. Cancelling the Deferred cancels the timer.
+
+        This is a performer for :class:`effect.twisted.TwistedDispatcher`.
+        """
+        timer = _Timer(self, None, (None,))
+        d = Deferred(timer.cancel)
+        timer.f = d.callback
+        self._add(timer, delay.delay)
+        runtime = stats.current
+        if runtime is not None:
+            runtime.delays_pending += 1
+            d.addBoth(_finished, runtime)
+        return d
+
+    def _add(self, timer, delay):
+        if not self._length:
+            # Nothing's waiting, so there's no need to step through the
+            # ticks that went by since the wheel was last used.
+            self._tick = max(self._tick, self._now())
+        seconds = self.reactor.seconds() + delay
+        # Round up, so that timers never fire early.
+        expires = -int(-seconds // self.resolution)
+        timer.expires = max(expires, self._tick + 1)
+        self._insert(timer)
+        self._length += 1
+        self._schedule()
+
+    def _insert(self, timer):
+        diff = min(timer.expires - self._tick, self._limit)
+        bits = self._bits
+        level = 0
+        while diff >> (bits * (level + 1)):
+            level += 1
+        slot = ((self._tick + diff) >> (bits * level)) & self._mask
+        timer.level = level
+        self._levels[level][slot].append(timer)
+        self._counts[level] += 1
+
+    def _next_tick(self):
+        """
+        Return the next tick at which something might happen: the next tick,
+        if the first level has timers, or else the next time the lowest level
+        that has timers cascades.
+        """
+        for level, count in enumerate(self._counts):
+            if count:
+                span = 1 << (self._bits * level)
+                return (self._tick // span + 1) * span
+        return None
+
+    def _schedule(self):
+        """Make sure the reactor calls us back in time for the next tick."""
+        tick = self._next_tick()
+        if tick is None or (self._wake is not None and self._wake <= tick):
+            return
+        delay = max(0, tick * self.resolution - self.reactor.seconds())
+        if self._call is not None and self._call.active():
+            self._call.reset(delay)
+        else:
+            self._call = self.reactor.callLater(delay, self._woken)
+        self._wake = tick
+
+    def _woken(self):
+        # The reactor may call us a hair before the tick's time by floating
+        # point, but never before the tick we asked for.
+        target = max(self._now(), self._wake)
+        self._call = self._wake = None
+        self.advance(target)
+        self._schedule()
+
+    def advance(self, target):
+        """
+        Process every tick up to and including ``target``, firing the timers
+        that are due. Ticks in which nothing can happen are skipped.
+        """
+        while self._tick < target:
+            tick = self._next_tick()
+            if tick is None or tick > target:
+                self._tick = target
+                return
+            self._tick = tick
+            self._process(tick)
+
+    def _process(self, tick):
+        mask = self._mask
+        index = tick & mask
+        if not index:
+            for level in range(1, len(self._levels)):
+                slot = (tick >> (self._bits * level)) & mask
+                self._cascade(level, slot)
+                if slot:
+                    break
+        bucket = self._levels[0][index]
+        if not bucket:
+            return
+        self._levels[0][index] = []
+        for timer in bucket:
+            if timer.f is None:
+                continue
+            self._counts[0] -= 1
+            if timer.expires > tick:
+                self._insert(timer)
+                continue
+            self._length -= 1
+            f, args = timer.f, timer.args
+            timer.f = timer.args = None
+            f(*args)
+
+    def _cascade(self, level, slot):
+        bucket = self._levels[level][slot]
+        if not bucket:
+            return
+        self._levels[level][slot] = []
+        for timer in bucket:
+            if timer.f is not None:
+                self._counts[level] -= 1
+                self._insert(timer)
+
+
+def _finished(result, runtime):
+    runtime.delays_pending -= 1
+    return result
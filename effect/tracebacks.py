@@ -0,0 +1,114 @@
+"""
+Controlling how much of a traceback is kept alive by failed effects.
+
+Errors are passed to error callbacks as exc_info tuples, and every traceback
+refers to the frames the exception passed through, along with all of their
+local variables. In long chains of error handlers (such as
+:func:`effect.retry.retry` loops) that keep errors around, this can pin a
+lot of memory, such as large response bodies.
+
+A traceback policy is a function which takes an exc_info tuple and returns
+one. The policy in effect is applied to every exception raised by a
+performer or a callback, as soon as it's caught::
+
+    from effect.tracebacks import set_traceback_policy, trimmed
+    set_traceback_policy(trimmed(5))
+
+The policies are:
+
+- :func:`full`, the default, which keeps tracebacks as they are;
+- :func:`trimmed`, which keeps only the innermost frames;
+- :func:`clear_locals`, which keeps every frame (so the traceback can still
+  be printed) but clears their local variables.
+
+Policies also apply to the exceptions that the exception was raised while
+handling, or was caused by.
+"""
+
+from __future__ import absolute_import
+
+
+def full(exc_info):
+    """Keep the whole traceback, and every local variable in it."""
+    return exc_info
+
+
+def trimmed(frames):
+    """
+    Return a policy which keeps only the innermost ``frames`` frames of a
+    traceback -- those closest to where the exception was raised.
+
+    The frames that are dropped are still referred to by the frames they
+    called, so on Python 3 their local variables are cleared as well.
+    """
+    def trim(exc_info):
+        for value in _chain(exc_info[1]):
+            value.__traceback__ = _trim(value.__traceback__, frames)
+        return (exc_info[0], exc_info[1], _trim(exc_info[2], frames))
+    return trim
+
+
+def _trim(tb, frames):
+    depth = 0
+    t = tb
+    while t is not None:
+        depth += 1
+        t = t.tb_next
+    for _ in range(depth - frames):
+        _clear_frame(tb.tb_frame)
+        tb = tb.tb_next
+    return tb
+
+
+def _clear_frame(frame):
+    try:
+        frame.clear()
+    except (AttributeError, RuntimeError):
+        # Python 2, or the frame is still executing.
+        pass
+
+
+def clear_locals(exc_info):
+    """
+    Keep the whole traceback, but clear the local variables of all of its
+    frames that have finished executing.
+
+    This only has an effect on Python 3.
+    """
+    import traceback
+    clear_frames = getattr(traceback, 'clear_frames', None)
+    if clear_frames is not None:
+        if exc_info[2] is not None:
+            clear_frames(exc_info[2])
+        for value in _chain(exc_info[1]):
+            clear_frames(value.__traceback__)
+    return exc_info
+
+
+def _chain(value):
+    """
+    Yield an exception, and every exception it was raised while handling or
+    was caused by, that has a traceback.
+    """
+    seen = set()
+    while value is not None and id(value) not in seen:
+        seen.add(id(value))
+        if getattr(value, '__traceback__', None) is not None:
+            yield value
+        value = getattr(value, '__cause__', None) or getattr(
+            value, '__context__', None)
+
+
+policy = full
+
+
+def set_traceback_policy(new_policy):
+    """
+    Set the traceback policy applied to every exception raised by a performer
+    or callback from now on, in all threads.
+
+    :return: The previous policy.
+    """
+    global policy
+    old, policy = policy, new_policy
+    return old
@@ -9,89 +9,300 @@ does.
 The main useful thing you should be concerned with is the :func:`perform`
 function, which is like effect.perform except that it returns a Deferred with
 the final result, and also sets up Twisted/Deferred specific effect handling
-by using its default effect dispatcher, twisted_dispatcher.
+by using its default effect dispatcher, :class:`TwistedDispatcher`.
 """
 
 from __future__ import absolute_import
 
+from copy import copy
 from functools import partial
 
 import sys
 
-from twisted.internet.defer import Deferred, maybeDeferred, gatherResults
+from twisted.internet.defer import (
+    Deferred, FirstError, maybeDeferred, gatherResults)
 from twisted.python.failure import Failure
 from twisted.internet.task import deferLater
 
-from . import dispatch_method, perform as base_perform, Delay
+from . import dispatch_method, perform as base_perform, stats, Delay
 from effect import ParallelEffects
+from .deadline import DeadlineDispatcher, DeadlineExceeded, deadline_exceeded
+from .fan_out import fan_out
 
 
 def deferred_to_box(d, box):
     """
     Make a Deferred pass its success or fail events on to the given box.
     """
-    d.addCallbacks(box.succeed, lambda f: box.fail((f.type, f.value, f.tb)))
+    d.addBoth(_to_box, box, False)
 
 
-def twisted_dispatcher(reactor, intent, box):
+def _to_box(result, box, lightweight_errors):
+    # A module-level function with arguments, rather than a bound method and
+    # a closure, to keep the callbacks of many pending Deferreds small.
+    if isinstance(result, Failure):
+        exc_info = (result.type, result.value, result.tb)
+        if lightweight_errors:
+            exc_info = _without_traceback(exc_info)
+        box.fail(exc_info)
+    else:
+        box.succeed(result)
+
+
+def _without_traceback(exc_info):
     """
-    Very similar to :func:`effect.default_dispatcher`, with two differences:
+    Drop the traceback from an exc_info tuple, and from the exception itself,
+    so that none of the frames it refers to are kept alive.
+    """
+    value = exc_info[1]
+    if getattr(value, '__traceback__', None) is not None:
+        value.__traceback__ = None
+    return (exc_info[0], value, None)
+
+
+def _perform_parallel(dispatcher, parallel):
+    children = [maybeDeferred(_perform, dispatcher, e)
+                for e in parallel.effects]
+    runtime = stats.current
+    if runtime is None:
+        return gatherResults(children, consumeErrors=True)
+    runtime.parallel_groups += 1
+    runtime.parallel_children += len(children)
+    for d in children:
+        d.addBoth(_finished, runtime, 'parallel_children')
+    return gatherResults(children, consumeErrors=True).addBoth(
+        _finished, runtime, 'parallel_groups')
+
+
+def _perform_delay(dispatcher, delay):
+    d = deferLater(dispatcher.reactor, delay.delay, lambda: None)
+    runtime = stats.current
+    if runtime is not None:
+        runtime.delays_pending += 1
+        d.addBoth(_finished, runtime, 'delays_pending')
+    return d
+
+
+def _finished(result, runtime, gauge):
+    """Decrement a gauge in the runtime statistics, and pass on result."""
+    setattr(runtime, gauge, getattr(runtime, gauge) - 1)
+    return result
+
+
+def _returning(performer):
+    """
+    Adapt a performer which returns a result or a Deferred to one which is
+    passed a box.
+    """
+    def perform_into_box(dispatcher, intent, box):
+        try:
+            result = performer(dispatcher, intent)
+        except:
+            dispatcher._fail(box, sys.exc_info())
+        else:
+            dispatcher._deliver(result, box)
+    return perform_into_box
+
+
+def _first_error(exc_info, index):
+    """
+    Wrap the error of the first child of a parallel effect to fail in a
+    FirstError, as gatherResults would.
+    """
+    error = FirstError(exc_info_to_failure(exc_info), index)
+    return (FirstError, error, None)
+
+
+def _fan_out(dispatcher, parallel, box):
+    fan_out(parallel, dispatcher, box,
+            wrap_error=None if dispatcher.lightweight_errors else _first_error)
+
+
+class TwistedDispatcher(object):
+    """
+    A dispatcher bound to a reactor, which is very similar to
+    :func:`effect.default_dispatcher`, with two differences:
 
     - Deferred results from effect handlers are used to provide the effect
       results
-    - parallel intents are handled with :func:`perform_parallel`.
-    """
-    # TODO: Allow Twisted-specific effect performers to have the reactor passed
-    #       to them. ALTERNATIVELY, rely on application writers to curry in
-    #       the reactor they desire to their effect performers...
-    dispatcher = partial(twisted_dispatcher, reactor)
-    if type(intent) is ParallelEffects:
-        func = partial(perform_parallel, intent, reactor)
-    elif type(intent) is Delay:
-        func = partial(perform_delay, intent, reactor)
-    else:
-        func = partial(dispatch_method, intent, dispatcher)
+    - parallel intents are handled with :func:`effect.fan_out.fan_out`, and
+      :obj:`Delay` intents with the reactor.
 
-    try:
-        result = func()
-    except:
-        box.fail(sys.exc_info())
-    else:
-        if isinstance(result, Deferred):
-            deferred_to_box(result, box)
+    Performers are looked up by the exact type of the intent in a table built
+    once, when the dispatcher is created; intents without an entry are
+    performed with their ``perform_effect`` method, which is passed this
+    dispatcher.
+
+    With ``lightweight_errors``, errors are made cheap to pass around, for
+    applications that fail many effects (e.g. when shedding load):
+
+    - the tracebacks of errors raised by performers, or of failed Deferreds
+      returned by them, are dropped as soon as they're caught, so no frames
+      are kept alive;
+    - parallel effects fail with the first child's exception itself, rather
+      than a :class:`twisted.internet.defer.FirstError` wrapping a Failure.
+
+    Only the Deferred returned by :func:`perform` is given a Failure.
+
+    With a ``deadline``, intents that would be started after it fail with
+    :class:`effect.deadline.DeadlineExceeded` instead, and Deferreds returned
+    by performers that haven't fired by then are cancelled, failing their
+    intents with DeadlineExceeded too. The deadline applies to everything
+    performed with the dispatcher, including the children of parallel
+    effects.
+    """
+
+    def __init__(self, reactor, performers=None, lightweight_errors=False,
+                 deadline=None):
+        """
+        :param reactor: The reactor used for :obj:`Delay` intents.
+        :param performers: An optional dict mapping intent types to functions
+            which take this dispatcher and an intent, and return a result or
+            a Deferred. These take precedence over the default performers.
+        :param lightweight_errors: Whether to drop tracebacks and avoid
+            Failures, as described above.
+        :param deadline: The reactor time after which nothing more is
+            performed, or None.
+        """
+        self.reactor = reactor
+        self.lightweight_errors = lightweight_errors
+        self.deadline = deadline
+        self._performers = {
+            ParallelEffects: _fan_out,
+            Delay: _returning(_perform_delay)}
+        if performers is not None:
+            for intent_type, performer in performers.items():
+                self._performers[intent_type] = _returning(performer)
+
+    def with_deadline(self, deadline):
+        """
+        Return a dispatcher like this one, but with the given deadline.
+        """
+        dispatcher = copy(self)
+        dispatcher.deadline = deadline
+        return dispatcher
+
+    def __call__(self, intent, box):
+        if self.deadline is not None:
+            if self.reactor.seconds() >= self.deadline:
+                box.fail(deadline_exceeded(intent))
+                return
+        performer = self._performers.get(type(intent))
+        if performer is not None:
+            performer(self, intent, box)
+            return
+        try:
+            result = dispatch_method(intent, self)
+        except:
+            self._fail(box, sys.exc_info())
         else:
+            self._deliver(result, box)
+
+    def _fail(self, box, exc_info):
+        if self.lightweight_errors:
+            exc_info = _without_traceback(exc_info)
+        box.fail(exc_info)
+
+    def _deliver(self, result, box):
+        """
+        Pass the result of a performer on to the box. If it's a Deferred that
+        has already succeeded, its result is taken directly (leaving None in
+        its place, as a callback returning nothing would) rather than
+        attaching callbacks to it.
+        """
+        if not isinstance(result, Deferred):
             box.succeed(result)
+            return
+        fired = result.called and not result.paused
+        if fired and not isinstance(result.result, Failure):
+            value, result.result = result.result, None
+            box.succeed(value)
+            return
+        if self.deadline is not None and not result.called:
+            result.addTimeout(
+                max(0, self.deadline - self.reactor.seconds()), self.reactor,
+                onTimeoutCancel=_timed_out)
+        result.addBoth(_to_box, box, self.lightweight_errors)
+
+
+def _timed_out(result, timeout):
+    """
+    Replace the CancelledError of a Deferred cancelled at the deadline with
+    DeadlineExceeded.
+    """
+    return Failure(DeadlineExceeded())
+
+
+def twisted_dispatcher(reactor, intent, box):
+    """
+    Perform an intent with a :class:`TwistedDispatcher` for the given
+    reactor.
+
+    This is kept for compatibility with code that curries the reactor in
+    itself; it builds a new dispatcher for every intent, so prefer creating a
+    :class:`TwistedDispatcher` once.
+    """
+    TwistedDispatcher(reactor)(intent, box)
 
 
 def perform_parallel(parallel, reactor):
     """
     Perform a ParallelEffects intent by using the Deferred gatherResults
-    function.
+    function, returning a Deferred of the list of results.
+
+    :class:`TwistedDispatcher` doesn't use this, but the more compact
+    :func:`effect.fan_out.fan_out`, which needs no Deferred per child.
+
+    The children are queued on the trampoline that is performing the parallel
+    effect rather than each being run in a new, nested trampoline, so
+    arbitrarily deep trees of parallel effects (and Deferreds that have
+    already fired) are performed in constant stack depth.
     """
-    return gatherResults(
-        [maybeDeferred(perform, reactor, e, dispatcher=twisted_dispatcher)
-         for e in parallel.effects])
+    return _perform_parallel(TwistedDispatcher(reactor), parallel)
 
 
 def perform_delay(delay, reactor):
     return deferLater(reactor, delay.delay, lambda: None)
 
 
-def perform(reactor, effect, dispatcher=twisted_dispatcher):
-    """
-    Perform an effect, handling Deferred results and returning a Deferred
-    that will fire with the effect's ultimate result.
-
-    Defaults to using the twisted_dispatcher as the dispatcher.
-    """
+def _perform(dispatcher, effect):
     d = Deferred()
     eff = effect.on(
         success=d.callback,
         error=lambda e: d.errback(exc_info_to_failure(e)))
-    base_perform(eff, dispatcher=partial(dispatcher, reactor))
+    base_perform(eff, dispatcher=dispatcher)
     return d
 
 
+def perform(reactor, effect, dispatcher=None, deadline=None):
+    """
+    Perform an effect, handling Deferred results and returning a Deferred
+    that will fire with the effect's ultimate result.
+
+    :param dispatcher: A :class:`TwistedDispatcher`, which is used as it is,
+        or a function taking the reactor, an intent and a box, which has the
+        reactor curried in. Defaults to a :class:`TwistedDispatcher` for the
+        given reactor.
+    :param deadline: An optional reactor time after which the effect, and
+        all the effects performed for it, fail with
+        :class:`effect.deadline.DeadlineExceeded`. A TwistedDispatcher also
+        cancels the Deferreds still pending when it passes; other dispatchers
+        are wrapped in a :class:`effect.deadline.DeadlineDispatcher`, which
+        only stops new intents being started.
+    """
+    if dispatcher is None or dispatcher is twisted_dispatcher:
+        dispatcher = TwistedDispatcher(reactor)
+    elif not isinstance(dispatcher, TwistedDispatcher):
+        dispatcher = partial(dispatcher, reactor)
+        if deadline is not None:
+            dispatcher = DeadlineDispatcher(dispatcher, deadline,
+                                            reactor.seconds)
+            deadline = None
+    if deadline is not None:
+        dispatcher = dispatcher.with_deadline(deadline)
+    return _perform(dispatcher, effect)
+
+
 def exc_info_to_failure(exc_info):
     """Convert an exc_info tuple to a :class:`Failure`."""
     return Failure(exc_info[1], exc_info[0], exc_info[2])